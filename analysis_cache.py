@@ -0,0 +1,117 @@
+import logging
+from functools import lru_cache
+
+from health_analyzer import analysis_key, FOOD_PLANS, EXERCISE_PLANS
+from recommendations import generate_recommendations
+
+logger = logging.getLogger(__name__)
+
+# Distinct analyses kept in memory; a key is a handful of bands, the score,
+# meditation time and insight texts, so the output space is small
+ANALYSIS_CACHE_SIZE = 4096
+
+
+class FrozenDict(dict):
+    """A dict that can't be modified, so one instance can be shared by every caller"""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Recursively turn dicts into FrozenDicts and lists into tuples"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _analysis_for_key(key):
+    """Build the shared analysis for an analysis key"""
+    (activity_level, calorie_burn, fitness_score, overall_fitness,
+     insights, meditation_time, food_plan, exercise_plan) = key
+    return freeze({
+        "activity_level": activity_level,
+        "calorie_burn": calorie_burn,
+        "fitness_score": fitness_score,
+        "insights": insights,
+        "meditation_time": meditation_time,
+        "overall_fitness": overall_fitness,
+        "food_recommendations": FOOD_PLANS[food_plan],
+        "exercise_recommendations": EXERCISE_PLANS[exercise_plan]
+    })
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _recommendations_for_key(key):
+    """Build the shared recommendations for an analysis key"""
+    # Bypass the analysis cache so its statistics only count callers' lookups
+    return freeze(generate_recommendations(_analysis_for_key.__wrapped__(key)))
+
+
+def cached_analysis(fitness_data):
+    """
+    Analyze fitness data, sharing the result between equal analyses.
+
+    Args:
+        fitness_data (dict or FitnessRecord): Fitness metrics to analyze
+
+    Returns:
+        FrozenDict: The analysis results of analyze_health_metrics without
+        "raw_data", which differs per entry. Callers must not modify it.
+    """
+    return _analysis_for_key(analysis_key(fitness_data))
+
+
+def cached_recommendations(fitness_data):
+    """
+    Generate recommendations for fitness data, sharing the result between equal analyses.
+
+    Args:
+        fitness_data (dict or FitnessRecord): Fitness metrics to analyze
+
+    Returns:
+        FrozenDict: The recommendations of generate_recommendations
+    """
+    return _recommendations_for_key(analysis_key(fitness_data))
+
+
+def cached_analysis_and_recommendations(fitness_data):
+    """Return the cached analysis and recommendations for fitness data, computing the key once"""
+    key = analysis_key(fitness_data)
+    return _analysis_for_key(key), _recommendations_for_key(key)
+
+
+def _stats(info):
+    """Turn lru_cache statistics into a dict with a hit rate"""
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else None
+    }
+
+
+def cache_info():
+    """Return hit and miss counts of the analysis and recommendation caches"""
+    return {
+        "analysis": _stats(_analysis_for_key.cache_info()),
+        "recommendations": _stats(_recommendations_for_key.cache_info())
+    }
+
+
+def clear_cache():
+    """Empty both caches, e.g. after the health rules changed"""
+    _analysis_for_key.cache_clear()
+    _recommendations_for_key.cache_clear()
+    logger.info("Analysis cache cleared")
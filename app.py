@@ -14,8 +14,10 @@ load_dotenv()
 # Import custom modules with error handling
 try:
     from image_processor import extract_fitness_data_from_image
-    from health_analyzer import analyze_health_metrics
+    from health_analyzer import analyze_record
+    from records import HistoryEntry
     from recommendations import generate_recommendations
+    from upload_validator import validate_upload
 except ImportError as e:
     st.error(f"Error importing modules: {e}")
     st.stop()
@@ -126,6 +128,12 @@ if page == "📸 Upload Image":
     
     if uploaded_file is not None:
         try:
+            # Check format and dimensions from the header before decoding anything
+            validation = validate_upload(uploaded_file)
+            if not validation["valid"]:
+                st.error(f"📏 {validation['message']}")
+                st.stop()
+            
             # Display the uploaded image
             image = Image.open(uploaded_file)
             
@@ -144,11 +152,6 @@ if page == "📸 Upload Image":
             # Process button
             if st.button("🚀 Analyze Image", type="primary", use_container_width=True):
                 with st.spinner("🤖 Processing image with AI... This may take a moment..."):
-                    # Check image dimensions and size
-                    if max(image.size) < 200:
-                        st.error("📏 Image is too small. Please upload a larger image with clear text.")
-                        st.stop()
-                    
                     # Create a progress bar
                     progress_bar = st.progress(0)
                     status_text = st.empty()
@@ -169,7 +172,8 @@ if page == "📸 Upload Image":
                         status_text.text("📊 Analyzing your health metrics...")
                         progress_bar.progress(50)
                         
-                        analysis_results = analyze_health_metrics(fitness_data)
+                        analysis = analyze_record(fitness_data)
+                        analysis_results = analysis.to_dict()
                         
                         # Step 3: Generate recommendations
                         status_text.text("💡 Generating personalized recommendations...")
@@ -187,12 +191,12 @@ if page == "📸 Upload Image":
                         st.session_state.recommendations = recommendations
                         
                         # Add to history
-                        st.session_state.history.append({
-                            "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                            "fitness_data": fitness_data,
-                            "analysis_results": analysis_results,
-                            "recommendations": recommendations
-                        })
+                        st.session_state.history.append(HistoryEntry(
+                            datetime.now().strftime("%Y-%m-%d %H:%M"),
+                            analysis.fitness,
+                            analysis,
+                            recommendations
+                        ))
                         
                         # Clear progress
                         progress_bar.empty()
@@ -241,7 +245,7 @@ elif page == "📊 Dashboard":
     if st.session_state.fitness_data and st.session_state.analysis_results and st.session_state.recommendations:
         # Display date of analysis
         if st.session_state.history:
-            latest_date = st.session_state.history[-1]["date"]
+            latest_date = st.session_state.history[-1].date
             st.caption(f"📅 Latest analysis: {latest_date}")
         
         # Key metrics in columns
@@ -338,23 +342,23 @@ elif page == "📈 History":
         st.write(f"📊 Total analyses: **{len(st.session_state.history)}**")
         
         for i, entry in enumerate(reversed(st.session_state.history)):
-            with st.expander(f"📅 Analysis from {entry['date']}", expanded=(i==0)):
+            with st.expander(f"📅 Analysis from {entry.date}", expanded=(i==0)):
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.write("**🔢 Fitness Data:**")
-                    for metric, value in entry["fitness_data"].items():
+                    for metric, value in entry.fitness.to_dict().items():
                         st.write(f"• {metric.replace('_', ' ').title()}: {value}")
                 
                 with col2:
                     st.write("**🎯 Analysis Results:**")
-                    for category, level in entry["analysis_results"].items():
+                    for category, level in entry.analysis.to_dict().items():
                         if category not in ["raw_data", "insights"]:
                             st.write(f"• {category.replace('_', ' ').title()}: {level}")
                 
                 # Show a preview of recommendations
                 st.write("**💡 Recommendations Preview:**")
-                for category, rec in entry["recommendations"].items():
+                for category, rec in entry.recommendations.items():
                     preview = rec[:100] + "..." if len(rec) > 100 else rec
                     st.write(f"**{category.title()}:** {preview}")
     else:
@@ -409,7 +413,7 @@ elif page == "ℹ️ About":
         
         with col2:
             # Calculate average steps if available
-            steps_data = [entry["fitness_data"].get("steps", 0) for entry in st.session_state.history if entry["fitness_data"].get("steps")]
+            steps_data = [entry.fitness.steps for entry in st.session_state.history if entry.fitness.steps]
             avg_steps = sum(steps_data) / len(steps_data) if steps_data else 0
             st.metric("👣 Avg Daily Steps", f"{avg_steps:,.0f}")
         
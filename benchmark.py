@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the analysis and storage paths.
+
+Usage: python benchmark.py <benchmark> [--size N]
+"""
+import sys
+import json
+import time
+import tracemalloc
+import random
+import argparse
+import os
+import sqlite3
+import tempfile
+import multiprocessing
+from datetime import datetime, timedelta
+
+
+def _timed(func, *args, repeat=3):
+    """Run a function a few times and return its result and best time in seconds"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def make_history(size, seed=42):
+    """Generate a realistic history of daily entries, oldest first"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, 20, 0)
+    history = []
+    for i in range(size):
+        fitness_data = {"steps": rng.randint(1500, 16000)}
+        if rng.random() < 0.8:
+            fitness_data["calories"] = rng.randint(80, 800)
+        if rng.random() < 0.6:
+            fitness_data["distance"] = round(rng.uniform(0.5, 12), 1)
+        if rng.random() < 0.4:
+            fitness_data["active_minutes"] = rng.randint(5, 120)
+        history.append({
+            "id": i + 1,
+            "date": (start + timedelta(days=i)).isoformat(),
+            "fitness_data": fitness_data
+        })
+    return history
+
+
+def bench_trends(size):
+    """Trend engine over a history of the given size"""
+    from trend_engine import HistoryStore, compute_trends
+
+    history = make_history(size)
+    store, build_time = _timed(HistoryStore.from_records, history, repeat=1)
+    trends, trend_time = _timed(compute_trends, store)
+
+    print(f"History entries:        {size:,}")
+    print(f"Build columnar store:   {build_time * 1000:.1f} ms")
+    print(f"Compute all trends:     {trend_time * 1000:.1f} ms")
+    print(f"Steps trend:            {trends['steps']}")
+
+
+def _traced_size(build):
+    """Build an object and return it with the bytes allocated while building it"""
+    tracemalloc.start()
+    try:
+        result = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def bench_records(size):
+    """Memory of history held as slotted records versus plain dicts"""
+    from health_analyzer import analyze_health_metrics, analyze_record
+    from records import HistoryEntry, FitnessRecord
+
+    history = make_history(size)
+
+    def build_dicts():
+        return [{
+            "date": entry["date"],
+            "fitness_data": dict(entry["fitness_data"]),
+            "analysis_results": analyze_health_metrics(dict(entry["fitness_data"])),
+            "recommendations": None
+        } for entry in history]
+
+    def build_records():
+        entries = []
+        for entry in history:
+            analysis = analyze_record(entry["fitness_data"])
+            entries.append(HistoryEntry(entry["date"], analysis.fitness, analysis, None))
+        return entries
+
+    dicts, dict_bytes = _traced_size(build_dicts)
+    records, record_bytes = _traced_size(build_records)
+
+    payloads = [FitnessRecord.to_json(entry.fitness) for entry in records]
+    _, dict_json_time = _timed(lambda: [json.loads(payload) for payload in payloads])
+    _, record_json_time = _timed(lambda: [FitnessRecord.from_json(payload) for payload in payloads])
+
+    print(f"History entries:        {size:,}")
+    print(f"Dicts:                  {dict_bytes / 2**20:.1f} MiB ({dict_bytes / size:.0f} B per entry)")
+    print(f"Slotted records:        {record_bytes / 2**20:.1f} MiB ({record_bytes / size:.0f} B per entry)")
+    print(f"Saved:                  {(1 - record_bytes / dict_bytes) * 100:.0f}%")
+    print(f"Fitness data from JSON: dict {dict_json_time * 1000:.1f} ms, record {record_json_time * 1000:.1f} ms")
+
+
+def bench_recommendations(size):
+    """Per-entry versus batched recommendation generation"""
+    from health_analyzer import analyze_health_metrics
+    from recommendations import generate_recommendations, generate_recommendations_batch
+
+    analyses = [analyze_health_metrics(entry["fitness_data"]) for entry in make_history(size)]
+
+    single, single_time = _timed(lambda: [generate_recommendations(analysis) for analysis in analyses])
+    batch, batch_time = _timed(generate_recommendations_batch, analyses)
+    assert single == batch
+
+    print(f"Analyses:               {size:,}")
+    print(f"Distinct results:       {len({id(result) for result in batch}):,}")
+    print(f"One at a time:          {single_time * 1000:.1f} ms")
+    print(f"Batched:                {batch_time * 1000:.1f} ms ({single_time / batch_time:.1f}x)")
+
+
+def bench_percentiles(size):
+    """Percentile ranks from a KLL sketch versus sorting the exact values"""
+    from bisect import bisect_right
+    from quantile_sketch import KLLSketch
+    from health_analyzer import HealthAnalyzer
+
+    values = [entry["fitness_data"]["steps"] for entry in make_history(size)]
+
+    def build():
+        # One sketch per month, merged into the cohort like the API does
+        months = [KLLSketch() for _ in range(12)]
+        for i, value in enumerate(values):
+            months[i % 12].update(value)
+        cohort = KLLSketch()
+        for month in months:
+            cohort.merge(month)
+        return cohort
+
+    sketch, build_time = _timed(build, repeat=1)
+    analyzer = HealthAnalyzer({"steps": sketch})
+    queries = list(range(1500, 16000, 50))
+
+    def sketch_ranks():
+        return [analyzer.percentile_rank("steps", query) for query in queries]
+
+    def exact_ranks():
+        # Sorting all history on each request, as a plain implementation would
+        return [bisect_right(sorted(values), query) / len(values) * 100 for query in queries[:10]]
+
+    estimated, sketch_time = _timed(sketch_ranks)
+    _, exact_time = _timed(exact_ranks, repeat=1)
+    exact_sorted = sorted(values)
+    errors = [abs(rank - bisect_right(exact_sorted, query) / len(values) * 100) for rank, query in zip(estimated, queries)]
+
+    print(f"Values:                 {size:,}")
+    print(f"Build 12 month sketches and merge: {build_time * 1000:.1f} ms")
+    print(f"Sketch items kept:      {sketch.size:,}")
+    print(f"Rank query, sketch:     {sketch_time / len(queries) * 1e6:.1f} us")
+    print(f"Rank query, exact sort: {exact_time / 10 * 1e6:.1f} us")
+    print(f"Max rank error:         {max(errors):.2f} percentile points")
+
+
+def _populate_db(path, size, start):
+    """Create a database at path holding size entries of the default user, 90 s apart"""
+    import storage
+
+    storage.DATABASE_PATH = path
+    storage.init_db()
+    with storage.transaction() as cursor:
+        for entry in make_history(size):
+            date = (start + timedelta(seconds=entry["id"] * 90)).isoformat()
+            cursor.execute(
+                'INSERT INTO history (date, fitness_data, analysis_results, recommendations, user_id) VALUES (?, ?, ?, ?, ?)',
+                (date, json.dumps(entry["fitness_data"]), '{"fitness_score": 50}', '{}', storage.DEFAULT_USER_ID)
+            )
+            cursor.execute(storage.INSERT_METRICS, storage.metric_row(
+                cursor.lastrowid, storage.DEFAULT_USER_ID, date, entry["fitness_data"], 50
+            ))
+
+
+def bench_summary(size):
+    """Metrics summary from the typed metrics table versus decoding every history row"""
+    import storage
+    from records import FitnessRecord
+
+    start = datetime(2023, 1, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        _populate_db(os.path.join(directory, "benchmark.db"), size, start)
+        last_month = (start + timedelta(seconds=size * 90 - 30 * 86400)).isoformat()
+
+        def decode_history():
+            # What the summary did before: decode every row's JSON in Python
+            points = {"steps": [], "calories": [], "distance": []}
+            for entry in storage.get_history_from_db(render=False):
+                record = FitnessRecord.from_dict(entry["fitness_data"])
+                if record.steps is not None:
+                    points["steps"].append({"date": entry["date"], "value": record.steps})
+                if record.calories:
+                    points["calories"].append({"date": entry["date"], "value": record.calories})
+                if record.distance is not None:
+                    points["distance"].append({"date": entry["date"], "value": record.distance})
+            return points
+
+        _, legacy_time = _timed(decode_history, repeat=1)
+        days, day_time = _timed(storage.get_metric_buckets_from_db, storage.DEFAULT_USER_ID, "day")
+        _, month_time = _timed(storage.get_metric_buckets_from_db, storage.DEFAULT_USER_ID, "month")
+        recent, recent_time = _timed(storage.get_metric_buckets_from_db, storage.DEFAULT_USER_ID, "day", last_month)
+        storage.close_connection()
+
+    print(f"Entries:                {size:,}")
+    print(f"Decode all history:     {legacy_time * 1000:.0f} ms ({size:,} points per metric)")
+    print(f"SQL, per day:           {day_time * 1000:.0f} ms ({len(days['steps']):,} points)")
+    print(f"SQL, per month:         {month_time * 1000:.0f} ms")
+    print(f"SQL, last 30 days:      {recent_time * 1000:.1f} ms ({len(recent['steps'])} points)")
+
+
+def bench_history(size):
+    """History pages by keyset versus OFFSET, at increasing depth"""
+    import storage
+
+    fields = ("date", "steps", "calories", "activity_level")
+    with tempfile.TemporaryDirectory() as directory:
+        _populate_db(os.path.join(directory, "benchmark.db"), size, datetime(2023, 1, 1))
+        cursor = storage.get_connection().cursor()
+
+        def offset_page(offset):
+            cursor.execute(
+                'SELECT id, date FROM history WHERE user_id = ? ORDER BY id DESC LIMIT 50 OFFSET ?',
+                (storage.DEFAULT_USER_ID, offset)
+            )
+            return cursor.fetchall()
+
+        print(f"Entries:                {size:,}, pages of 50")
+        for depth in (0, size // 10, size // 2, size - 50):
+            # Entries are numbered 1..size, newest last
+            before_id = size - depth + 1
+            _, keyset_time = _timed(lambda: storage.get_history_from_db(
+                limit=50, before_id=before_id, fields=fields))
+            _, offset_time = _timed(offset_page, depth)
+            print(f"Page at {depth:>9,}:      keyset {keyset_time * 1000:.2f} ms, OFFSET {offset_time * 1000:.2f} ms")
+        _, count_time = _timed(storage.count_history_in_db)
+        _, full_time = _timed(storage.get_history_from_db, repeat=1)
+        storage.close_connection()
+
+    print(f"X-Total-Count:          {count_time * 1000:.1f} ms")
+    print(f"Whole history:          {full_time * 1000:.0f} ms")
+
+
+def _peak_memory(func):
+    """Run a function and return its result, peak traced allocation in bytes and time in seconds"""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def bench_export(size):
+    """Peak memory of a streamed NDJSON export versus building the whole JSON response"""
+    import storage
+    from history_export import export_history
+
+    with tempfile.TemporaryDirectory() as directory:
+        _populate_db(os.path.join(directory, "benchmark.db"), size, datetime(2023, 1, 1))
+
+        def whole_response():
+            return len(json.dumps(storage.get_history_from_db()))
+
+        def streamed(export_format):
+            return sum(len(line) for line in export_history(export_format))
+
+        whole_bytes, whole_peak, whole_time = _peak_memory(whole_response)
+        ndjson_bytes, ndjson_peak, ndjson_time = _peak_memory(lambda: streamed("ndjson"))
+        csv_bytes, csv_peak, csv_time = _peak_memory(lambda: streamed("csv"))
+        storage.close_connection()
+
+    print(f"Entries:                {size:,}")
+    print(f"One JSON list:          {whole_peak / 2**20:.1f} MiB peak, {whole_time:.1f} s, {whole_bytes / 2**20:.0f} MiB out")
+    print(f"Streamed NDJSON:        {ndjson_peak / 2**20:.1f} MiB peak, {ndjson_time:.1f} s, {ndjson_bytes / 2**20:.0f} MiB out")
+    print(f"Streamed CSV:           {csv_peak / 2**20:.1f} MiB peak, {csv_time:.1f} s, {csv_bytes / 2**20:.0f} MiB out")
+
+
+def bench_snapshot(size):
+    """Loading history for analytics: NDJSON export versus Parquet and memory-mapped Arrow snapshots"""
+    import pandas as pd
+    import storage
+    from history_export import export_history
+    from history_snapshot import write_snapshot, load_snapshot, snapshot_trends
+
+    with tempfile.TemporaryDirectory() as directory:
+        _populate_db(os.path.join(directory, "benchmark.db"), size, datetime(2023, 1, 1))
+        ndjson_path = os.path.join(directory, "history.ndjson")
+        with open(ndjson_path, "w") as f:
+            f.writelines(export_history("ndjson", render=False))
+
+        print(f"Entries:                {size:,}")
+        for snapshot_format in ("parquet", "arrow"):
+            path = os.path.join(directory, snapshot_format)
+            _, write_time = _timed(write_snapshot, path, snapshot_format, True, repeat=1)
+            files = [os.path.join(root, name) for root, _, names in os.walk(path) for name in names]
+            print(f"Write {snapshot_format + ':':<18}{write_time * 1000:.0f} ms, "
+                  f"{sum(os.path.getsize(name) for name in files) / 2**20:.1f} MiB")
+
+        _, json_time = _timed(lambda: pd.json_normalize(pd.read_json(ndjson_path, lines=True)["fitness_data"]), repeat=1)
+        _, parquet_time = _timed(lambda: load_snapshot(os.path.join(directory, "parquet")).to_pandas())
+        _, arrow_time = _timed(load_snapshot, os.path.join(directory, "arrow"))
+        _, trends_time = _timed(snapshot_trends, os.path.join(directory, "arrow"), storage.DEFAULT_USER_ID)
+        storage.close_connection()
+
+    print(f"pandas from NDJSON:     {json_time * 1000:.0f} ms")
+    print(f"pandas from Parquet:    {parquet_time * 1000:.0f} ms")
+    print(f"Arrow, memory-mapped:   {arrow_time * 1000:.1f} ms")
+    print(f"Trends from snapshot:   {trends_time * 1000:.0f} ms")
+
+
+def bench_payloads(size):
+    """Database size with analyses and recommendations inline versus content-addressed"""
+    import storage
+    from records import FitnessRecord
+    from analysis_cache import cached_analysis_and_recommendations
+    from recommendations import recommendation_ids
+
+    entries = []
+    for entry in make_history(size):
+        shared_analysis, _ = cached_analysis_and_recommendations(FitnessRecord.from_dict(entry["fitness_data"]))
+        analysis_results = dict(shared_analysis, raw_data=entry["fitness_data"], anomalies={})
+        entries.append({
+            "date": entry["date"],
+            "fitness_data": entry["fitness_data"],
+            "analysis_results": analysis_results,
+            "recommendations": recommendation_ids(analysis_results)
+        })
+
+    sizes = {}
+    read_times = {}
+    ids = random.Random(0).sample(range(1, size + 1), min(size, 1000))
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("inline", "payloads"):
+            path = os.path.join(directory, f"{mode}.db")
+            storage.DATABASE_PATH = path
+            storage.init_db()
+            with storage.transaction() as cursor:
+                for entry in entries:
+                    if mode == "inline":
+                        analysis, recommendations = (json.dumps(entry["analysis_results"]),
+                                                     json.dumps(entry["recommendations"]))
+                    else:
+                        analysis = storage.store_payloads(cursor, entry["analysis_results"],
+                                                          storage.ENTRY_ANALYSIS_FIELDS)
+                        recommendations = storage.store_payloads(cursor, entry["recommendations"])
+                    cursor.execute(
+                        'INSERT INTO history (date, fitness_data, analysis_results, recommendations, user_id) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (entry["date"], json.dumps(entry["fitness_data"]), analysis, recommendations,
+                         storage.DEFAULT_USER_ID)
+                    )
+            distinct = storage.get_connection().execute('SELECT COUNT(*) FROM payloads').fetchone()[0]
+            _, read_times[mode] = _timed(lambda: [storage.get_entry_from_db(entry_id) for entry_id in ids])
+            storage.get_connection().execute("VACUUM")
+            storage.close_connection()
+            sizes[mode] = os.path.getsize(path)
+
+    print(f"Entries:                {size:,}")
+    print(f"Distinct payloads:      {distinct:,}")
+    print(f"Inline:                 {sizes['inline'] / 2 ** 20:.1f} MiB")
+    print(f"Content-addressed:      {sizes['payloads'] / 2 ** 20:.1f} MiB "
+          f"({(1 - sizes['payloads'] / sizes['inline']) * 100:.0f}% smaller)")
+    print(f"Read entry:             inline {read_times['inline'] / len(ids) * 1e6:.0f} us, "
+          f"content-addressed {read_times['payloads'] / len(ids) * 1e6:.0f} us")
+
+
+# Share of storage benchmark operations that add an entry; the rest read one
+STORAGE_WRITE_RATIO = 0.2
+STORAGE_WORKERS = 4
+
+
+def _legacy_add_entry(path, entry):
+    """add_entry_to_db as it was: a new connection with default journaling per call"""
+    import storage
+
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO history (date, fitness_data, analysis_results, recommendations, user_id) VALUES (?, ?, ?, ?, ?)',
+            (entry["date"], json.dumps(entry["fitness_data"]), "{}", "{}", storage.DEFAULT_USER_ID)
+        )
+        storage.update_aggregates(cursor, storage.DEFAULT_USER_ID, entry["date"], entry["fitness_data"])
+        storage.update_sketches(cursor, entry["date"], entry["fitness_data"])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _legacy_get_entry(path, entry_id):
+    """get_entry_from_db as it was"""
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, date, fitness_data, analysis_results, recommendations FROM history WHERE id = ?', (entry_id,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def _storage_worker(mode, path, operations, seed):
+    """Run a mix of reads and writes from one process; returns (errors, seconds)"""
+    import storage
+
+    storage.DATABASE_PATH = path
+    rng = random.Random(seed)
+    entries = make_history(operations, seed=seed)
+    errors = 0
+    start = time.perf_counter()
+    for entry in entries:
+        write = rng.random() < STORAGE_WRITE_RATIO
+        entry_id = rng.randint(1, 1000)
+        if mode == "legacy":
+            try:
+                if write:
+                    _legacy_add_entry(path, entry)
+                else:
+                    _legacy_get_entry(path, entry_id)
+            except sqlite3.OperationalError:
+                errors += 1
+        elif write:
+            entry = {"date": entry["date"], "fitness_data": entry["fitness_data"],
+                     "analysis_results": {}, "recommendations": {}}
+            errors += storage.add_entry_to_db(entry) is None
+        else:
+            storage.get_entry_from_db(entry_id)
+    return errors, time.perf_counter() - start
+
+
+def bench_storage(size):
+    """Concurrent reads and writes: connection per call versus the storage module"""
+    import storage
+
+    print(f"Workers:                {STORAGE_WORKERS} processes, {size:,} operations each, "
+          f"{STORAGE_WRITE_RATIO:.0%} writes")
+    for mode in ("legacy", "storage"):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.db")
+            storage.DATABASE_PATH = path
+            storage.init_db()
+            for entry in make_history(1000, seed=0):
+                storage.add_entry_to_db(dict(entry, analysis_results={}, recommendations={}))
+            if mode == "legacy":
+                storage.get_connection().execute("PRAGMA journal_mode = DELETE")
+            storage.close_connection()
+
+            jobs = [(mode, path, size, seed) for seed in range(1, STORAGE_WORKERS + 1)]
+            start = time.perf_counter()
+            with multiprocessing.Pool(STORAGE_WORKERS) as pool:
+                results = pool.starmap(_storage_worker, jobs)
+            elapsed = time.perf_counter() - start
+
+        errors = sum(result[0] for result in results)
+        label = "Connection per call:" if mode == "legacy" else "Storage module:"
+        print(f"{label:<24}{STORAGE_WORKERS * size / elapsed:,.0f} ops/s, {errors} lock errors")
+
+
+BENCHMARKS = {
+    "trends": (bench_trends, 100_000),
+    "records": (bench_records, 100_000),
+    "recommendations": (bench_recommendations, 100_000),
+    "percentiles": (bench_percentiles, 1_000_000),
+    "storage": (bench_storage, 2_000),
+    "summary": (bench_summary, 1_000_000),
+    "history": (bench_history, 1_000_000),
+    "export": (bench_export, 200_000),
+    "snapshot": (bench_snapshot, 1_000_000),
+    "payloads": (bench_payloads, 100_000),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI Fitness Health Analyzer benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='Benchmark to run')
+    parser.add_argument('--size', type=int, help='Number of records to benchmark with')
+    args = parser.parse_args()
+
+    func, default_size = BENCHMARKS[args.benchmark]
+    func(args.size or default_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
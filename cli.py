@@ -11,9 +11,9 @@ from PIL import Image
 load_dotenv()
 
 # Import core functionality
-from image_processor import extract_fitness_data_from_image, extract_from_image_path
+from image_processor import extract_fitness_data_from_image, extract_from_image_path, extract_from_video_path, VIDEO_EXTENSIONS
 from health_analyzer import analyze_health_metrics
-from recommendations import generate_recommendations
+from recommendations import generate_recommendations_batch
 
 def display_fitness_data(data):
     """Display extracted fitness data in a formatted way"""
@@ -66,66 +66,121 @@ def display_recommendations(recommendations):
     main_wellness = main_wellness.replace("###", "").replace("- ", "• ")
     print(main_wellness)
 
-def save_results(filename, fitness_data, analysis, recommendations):
-    """Save results to a JSON file"""
-    results = {
+def make_result(fitness_data, analysis, recommendations):
+    """Build the saved result of one image"""
+    return {
         "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "fitness_data": fitness_data,
         "analysis": analysis,
         "recommendations": recommendations
     }
+
+def save_results(filename, results):
+    """Save results to a JSON file; a single result is saved on its own, several as a list"""
+    if len(results) == 1:
+        results = results[0]
     
     with open(filename, 'w') as f:
         json.dump(results, f, indent=2)
     
     print(f"\nResults saved to {filename}")
 
+def export(export_format, filename=None, user_id=None):
+    """Stream the saved history from the database to a file, or to stdout"""
+    from storage import DEFAULT_USER_ID
+    from history_export import export_history
+    from history_snapshot import SNAPSHOT_FORMATS, write_snapshot
+    
+    # Columnar snapshots hold every user and are appended to on each run
+    if export_format in SNAPSHOT_FORMATS:
+        directory = filename or 'history_snapshot'
+        written = write_snapshot(directory, export_format)
+        print(f"Added {written} entries to the {export_format} snapshot in {directory}")
+        return
+    
+    lines = export_history(export_format, user_id or DEFAULT_USER_ID)
+    if filename:
+        with open(filename, 'w', newline='') as f:
+            f.writelines(lines)
+        print(f"History exported to {filename}")
+    else:
+        sys.stdout.writelines(lines)
+
+def extract_fitness_data(path):
+    """Extract fitness data from an image, or from the keyframes of a screen recording"""
+    if os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+        return extract_from_video_path(path)
+    return extract_from_image_path(path)
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='AI Fitness Health Analyzer CLI')
-    parser.add_argument('image_path', help='Path to the fitness tracker image')
+    parser.add_argument('image_path', nargs='*', help='Path to one or more fitness tracker images or screen recordings')
     parser.add_argument('--save', help='Save results to specified JSON file')
+    parser.add_argument('--export', choices=['ndjson', 'csv', 'parquet', 'arrow'],
+                        help='Export the saved history instead of analyzing images. parquet and arrow '
+                             'add new entries of all users to a columnar snapshot directory')
+    parser.add_argument('--output', help='File to write the export to (default: stdout), '
+                                         'or the snapshot directory (default: history_snapshot)')
+    parser.add_argument('--user', help='User whose history to export')
     args = parser.parse_args()
     
+    if args.export:
+        export(args.export, args.output, args.user)
+        return
+    if not args.image_path:
+        parser.error('image_path is required unless --export is given')
+    
     # Check if Gemini API key is set
     if not os.environ.get("GEMINI_API_KEY"):
         print("Error: GEMINI_API_KEY environment variable not set.")
         print("Please set it in a .env file or export it in your terminal.")
         sys.exit(1)
     
-    # Check if the image file exists
-    if not os.path.exists(args.image_path):
-        print(f"Error: Image file not found: {args.image_path}")
-        sys.exit(1)
-    
-    print(f"Processing image: {args.image_path}")
-    print("This may take a moment...")
-    
-    # Extract fitness data from the image
-    fitness_data = extract_from_image_path(args.image_path)
-    
-    # Display extracted data
-    display_fitness_data(fitness_data)
+    # Check if the image files exist
+    for image_path in args.image_path:
+        if not os.path.exists(image_path):
+            print(f"Error: Image file not found: {image_path}")
+            sys.exit(1)
+    
+    # Extract and analyze every image first, so recommendations can be generated in one batch
+    extracted = []
+    for image_path in args.image_path:
+        print(f"Processing image: {image_path}")
+        print("This may take a moment...")
+        
+        fitness_data = extract_fitness_data(image_path)
+        if not fitness_data:
+            display_fitness_data(fitness_data)
+            print(f"\nNo fitness data could be extracted from {image_path}. Please try another image.")
+            continue
+        
+        extracted.append((image_path, fitness_data, analyze_health_metrics(fitness_data)))
     
-    if not fitness_data:
-        print("\nNo fitness data could be extracted. Please try another image.")
+    if not extracted:
         sys.exit(1)
     
-    # Analyze the data
-    analysis = analyze_health_metrics(fitness_data)
+    # Generate recommendations, rendering each distinct combination once
+    recommendations = generate_recommendations_batch(analysis for _, _, analysis in extracted)
     
-    # Display analysis
-    display_analysis(analysis)
-    
-    # Generate recommendations
-    recommendations = generate_recommendations(analysis)
-    
-    # Display recommendations
-    display_recommendations(recommendations)
+    results = []
+    for (image_path, fitness_data, analysis), recs in zip(extracted, recommendations):
+        if len(extracted) > 1:
+            print(f"\n##### {image_path} #####")
+        
+        # Display extracted data, analysis and recommendations
+        display_fitness_data(fitness_data)
+        display_analysis(analysis)
+        display_recommendations(recs)
+        results.append(make_result(fitness_data, analysis, recs))
     
     # Save results if requested
     if args.save:
-        save_results(args.save, fitness_data, analysis, recommendations)
+        save_results(args.save, results)
+    
+    # Fail when any image could not be read
+    if len(extracted) < len(args.image_path):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,246 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# OpenCV and numpy are optional, just like for the OCR fallback
+try:
+    import cv2
+    import numpy as np
+    DIGITS_AVAILABLE = True
+except ImportError:
+    DIGITS_AVAILABLE = False
+    logger.warning("OpenCV not available. Built-in digit recognizer will not be used.")
+
+# Characters the recognizer knows about. Fitness values only ever need these.
+DIGIT_CHARS = "0123456789"
+PUNCTUATION_CHARS = ",."
+
+# Size of the normalized glyph bitmap fed to the kNN classifier
+GLYPH_SIZE = 20
+
+# Fonts, scales and stroke widths used to render the synthetic training corpus
+if DIGITS_AVAILABLE:
+    TRAINING_FONTS = [
+        cv2.FONT_HERSHEY_SIMPLEX,
+        cv2.FONT_HERSHEY_DUPLEX,
+        cv2.FONT_HERSHEY_COMPLEX,
+        cv2.FONT_HERSHEY_TRIPLEX,
+        cv2.FONT_HERSHEY_PLAIN,
+    ]
+else:
+    TRAINING_FONTS = []
+TRAINING_SCALES = [1.5, 2.5]
+TRAINING_THICKNESSES = [1, 2, 3, 4]
+
+# TrueType fonts common in fitness apps, rendered with PIL when installed
+TRAINING_TRUETYPE_FONTS = ["DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "Arial.ttf", "Roboto-Regular.ttf", "SF-Pro-Display-Regular.otf"]
+
+# Squared distance at which a glyph match is considered worthless
+MAX_MATCH_DISTANCE = 120.0
+
+
+def _normalize_glyph(mask):
+    """
+    Crop a binary glyph to its bounding box and scale it into a square bitmap.
+
+    The aspect ratio is preserved by padding, so that "1" and "7" don't end up
+    looking alike after stretching.
+
+    Args:
+        mask (numpy.ndarray): Binary image with the glyph in white (255)
+
+    Returns:
+        numpy.ndarray: Flattened float32 feature vector with values in [0, 1]
+    """
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return np.zeros(GLYPH_SIZE * GLYPH_SIZE, dtype=np.float32)
+
+    crop = mask[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    h, w = crop.shape
+    side = max(h, w)
+    square = np.zeros((side, side), dtype=np.uint8)
+    y0 = (side - h) // 2
+    x0 = (side - w) // 2
+    square[y0:y0 + h, x0:x0 + w] = crop
+
+    inner = GLYPH_SIZE - 4
+    resized = cv2.resize(square, (inner, inner), interpolation=cv2.INTER_AREA)
+    padded = cv2.copyMakeBorder(resized, 2, 2, 2, 2, cv2.BORDER_CONSTANT, value=0)
+    return (padded.astype(np.float32) / 255.0).reshape(-1)
+
+
+def _render_training_corpus():
+    """Render every digit in every training font into normalized feature vectors"""
+    samples = []
+    labels = []
+
+    for font in TRAINING_FONTS:
+        for scale in TRAINING_SCALES:
+            for thickness in TRAINING_THICKNESSES:
+                for index, char in enumerate(DIGIT_CHARS):
+                    canvas = np.zeros((120, 100), dtype=np.uint8)
+                    cv2.putText(canvas, char, (10, 90), font, scale, 255, thickness, cv2.LINE_AA)
+                    _, mask = cv2.threshold(canvas, 127, 255, cv2.THRESH_BINARY)
+                    samples.append(_normalize_glyph(mask))
+                    labels.append(index)
+
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        return np.array(samples, dtype=np.float32), np.array(labels, dtype=np.int64)
+
+    for font_name in TRAINING_TRUETYPE_FONTS:
+        try:
+            font = ImageFont.truetype(font_name, 64)
+        except OSError:
+            continue
+        for index, char in enumerate(DIGIT_CHARS):
+            canvas = Image.new('L', (100, 100), 0)
+            ImageDraw.Draw(canvas).text((10, 5), char, fill=255, font=font)
+            _, mask = cv2.threshold(np.array(canvas), 127, 255, cv2.THRESH_BINARY)
+            samples.append(_normalize_glyph(mask))
+            labels.append(index)
+
+    return np.array(samples, dtype=np.float32), np.array(labels, dtype=np.int64)
+
+
+class DigitRecognizer:
+    """
+    Lightweight digit-only recognizer for numeric regions of fitness screenshots.
+
+    Glyphs are segmented with OpenCV contours and classified by k nearest
+    neighbours against a synthetic corpus rendered from the Hershey fonts. Reading a
+    cropped value like "4,889" takes a few milliseconds, versus hundreds for a
+    full Tesseract pass.
+    """
+
+    _model = None
+    _model_lock = threading.Lock()
+
+    def __init__(self, k=3):
+        """
+        Initialize the digit recognizer
+
+        Args:
+            k (int): Number of neighbours consulted for each glyph
+        """
+        self.available = DIGITS_AVAILABLE
+        self.k = k
+
+    @classmethod
+    def _get_model(cls):
+        """Render the shared training corpus on first use"""
+        if cls._model is None:
+            with cls._model_lock:
+                if cls._model is None:
+                    samples, labels = _render_training_corpus()
+                    cls._model = (samples, (samples * samples).sum(axis=1), labels)
+                    logger.info(f"Digit recognizer trained on {len(samples)} synthetic glyphs")
+        return cls._model
+
+    def _binarize(self, image):
+        """Convert a PIL image, path or array into a white-on-black binary mask"""
+        if isinstance(image, str):
+            gray = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+        elif isinstance(image, np.ndarray):
+            gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = np.array(image.convert('L'))
+
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        # Text is the minority of pixels; invert dark-on-light screenshots
+        if cv2.countNonZero(mask) > mask.size // 2:
+            mask = cv2.bitwise_not(mask)
+        return mask
+
+    def read(self, image):
+        """
+        Read the number contained in a cropped numeric region.
+
+        Args:
+            image (PIL.Image, numpy.ndarray or str): The numeric region
+
+        Returns:
+            dict: ``text`` as read, parsed ``value`` (or None), overall
+            ``confidence`` (the weakest glyph) and per-glyph ``glyphs`` as
+            (char, confidence) pairs. None if the recognizer is unavailable.
+        """
+        if not self.available:
+            return None
+
+        mask = self._binarize(image)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = [cv2.boundingRect(c) for c in contours]
+        # Drop specks of noise
+        boxes = [b for b in boxes if b[2] * b[3] >= 4]
+        if not boxes:
+            return {"text": "", "value": None, "confidence": 0.0, "glyphs": []}
+
+        boxes.sort(key=lambda b: b[0])
+        line_height = max(b[3] for b in boxes)
+        baseline = max(b[1] + b[3] for b in boxes if b[3] >= line_height * 0.5)
+
+        digit_boxes = []
+        features = []
+        for box in boxes:
+            x, y, w, h = box
+            if h >= line_height * 0.5:
+                digit_boxes.append(box)
+                features.append(_normalize_glyph(mask[y:y + h, x:x + w]))
+
+        results = {}
+        if features:
+            samples, sample_norms, labels = self._get_model()
+            queries = np.array(features, dtype=np.float32)
+            # Squared euclidean distance of every glyph to every training sample
+            distances = (queries * queries).sum(axis=1)[:, None] + sample_norms[None, :] - 2.0 * queries @ samples.T
+            nearest = np.argsort(distances, axis=1)[:, :self.k]
+
+            for row, box in enumerate(digit_boxes):
+                votes = labels[nearest[row]]
+                prediction = np.bincount(votes).argmax()
+                agreement = float(np.mean(votes == prediction))
+                closeness = max(0.0, 1.0 - float(distances[row, nearest[row, 0]]) / MAX_MATCH_DISTANCE)
+                results[box] = (DIGIT_CHARS[prediction], round(agreement * closeness, 3))
+
+        glyphs = []
+        for box in boxes:
+            if box in results:
+                glyphs.append(results[box])
+                continue
+
+            # Small blobs are punctuation: commas hang below the baseline
+            x, y, w, h = box
+            if y + h > baseline + line_height * 0.08 or h > w * 1.5:
+                glyphs.append((",", 0.9))
+            else:
+                glyphs.append((".", 0.9))
+
+        text = "".join(char for char, _ in glyphs)
+        return {
+            "text": text,
+            "value": parse_number(text),
+            "confidence": min(conf for _, conf in glyphs),
+            "glyphs": glyphs
+        }
+
+
+def parse_number(text):
+    """
+    Parse a recognized numeric string such as "4,889" or "5.2".
+
+    Args:
+        text (str): Digits with optional thousands separators and decimal point
+
+    Returns:
+        int or float: The parsed number, or None if it isn't a valid number
+    """
+    cleaned = text.replace(",", "").strip(".")
+    if not cleaned or not cleaned.replace(".", "", 1).isdigit():
+        return None
+    if "." in cleaned:
+        return float(cleaned)
+    return int(cleaned)
@@ -1,5 +1,5 @@
-import React, { createContext, useState, useContext, useEffect } from 'react';
-import { getHistory, getMetricsSummary } from '../utils/api';
+import React, { createContext, useState, useContext, useEffect, useRef } from 'react';
+import { getHistoryChanges, getMetricsSummary } from '../utils/api';
 
 // Create context
 const AppContext = createContext();
@@ -11,14 +11,23 @@ export const AppProvider = ({ children }) => {
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const [lastRefresh, setLastRefresh] = useState(null);
+  // Entries by id and the change feed cursor they are synced to
+  const entriesRef = useRef(new Map());
+  const cursorRef = useRef(0);
 
-  // Load history from API
+  // Load history from API, fetching only what changed since the last load
   const loadHistory = async () => {
     setLoading(true);
     setError(null);
     try {
-      const data = await getHistory();
-      setHistory(data);
+      let page;
+      do {
+        page = await getHistoryChanges(cursorRef.current);
+        page.entries.forEach((entry) => entriesRef.current.set(entry.id, entry));
+        page.deleted.forEach((id) => entriesRef.current.delete(id));
+        cursorRef.current = page.cursor;
+      } while (page.has_more);
+      setHistory(Array.from(entriesRef.current.values()).sort((a, b) => b.id - a.id));
       setLastRefresh(new Date());
     } catch (err) {
       setError(err.toString());
@@ -17,17 +17,34 @@ import {
 } from '@mui/material';
 import ChevronRightIcon from '@mui/icons-material/ChevronRight';
 
+// Entries loaded per page, and the fields the list shows
+const PAGE_SIZE = 50;
+const LIST_FIELDS = 'date,steps,calories,activity_level';
+
 const HistoryPage = () => {
   const navigate = useNavigate();
   const [history, setHistory] = useState([]);
+  const [nextBeforeId, setNextBeforeId] = useState(null);
+  const [totalCount, setTotalCount] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState('');
 
+  const fetchPage = async (beforeId) => {
+    const params = { limit: PAGE_SIZE, fields: LIST_FIELDS };
+    if (beforeId) {
+      params.before_id = beforeId;
+    }
+    const response = await axios.get('/api/history', { params });
+    setHistory((previous) => (beforeId ? [...previous, ...response.data] : response.data));
+    setNextBeforeId(response.headers['x-next-before-id'] || null);
+    setTotalCount(Number(response.headers['x-total-count']) || response.data.length);
+  };
+
   useEffect(() => {
     const fetchHistory = async () => {
       try {
-        const response = await axios.get('/api/history');
-        setHistory(response.data);
+        await fetchPage(null);
       } catch (err) {
         setError('Failed to load history. Please try again.');
         console.error(err);
@@ -39,6 +56,18 @@ const HistoryPage = () => {
     fetchHistory();
   }, []);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await fetchPage(nextBeforeId);
+    } catch (err) {
+      setError('Failed to load more history. Please try again.');
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     try {
       return new Date(dateString).toLocaleString();
@@ -48,21 +77,20 @@ const HistoryPage = () => {
   };
 
   const getSummary = (entry) => {
-    const { fitness_data, analysis_results } = entry;
     let summary = '';
     
-    if (fitness_data.steps) {
-      summary += `${fitness_data.steps} steps`;
+    if (entry.steps) {
+      summary += `${entry.steps} steps`;
     }
     
-    if (fitness_data.calories || fitness_data.total_calories) {
+    if (entry.calories) {
       summary += summary ? ', ' : '';
-      summary += `${fitness_data.calories || fitness_data.total_calories} calories`;
+      summary += `${entry.calories} calories`;
     }
     
-    if (analysis_results.activity_level) {
+    if (entry.activity_level) {
       summary += summary ? ' • ' : '';
-      summary += `${analysis_results.activity_level}`;
+      summary += `${entry.activity_level}`;
     }
     
     return summary || 'No summary available';
@@ -108,7 +136,7 @@ const HistoryPage = () => {
       ) : (
         <Paper>
           <List>
-            {history.slice().reverse().map((entry, index) => (
+            {history.map((entry, index) => (
               <React.Fragment key={entry.id}>
                 <ListItem button onClick={() => viewEntry(entry.id)}>
                   <ListItemText 
@@ -125,6 +153,11 @@ const HistoryPage = () => {
               </React.Fragment>
             ))}
           </List>
+          {nextBeforeId && (
+            <Button fullWidth onClick={loadMore} disabled={loadingMore} sx={{ py: 2 }}>
+              {loadingMore ? 'Loading...' : `Load more (${history.length} of ${totalCount})`}
+            </Button>
+          )}
         </Paper>
       )}
     </Container>
@@ -38,6 +38,16 @@ export const getHistory = async () => {
   }
 };
 
+export const getHistoryChanges = async (since) => {
+  try {
+    const response = await api.get('/api/history/changes', { params: { since } });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching history changes:', error);
+    throw error.response?.data?.error || 'Error fetching history. Please try again.';
+  }
+};
+
 export const getHistoryEntry = async (id) => {
   try {
     const response = await api.get(`/api/history/${id}`);
@@ -15,7 +15,8 @@ load_dotenv()
 
 # Import core functionality
 from image_processor import extract_fitness_data_from_image
-from health_analyzer import analyze_health_metrics
+from health_analyzer import analyze_record
+from records import HistoryEntry
 from recommendations import generate_recommendations
 
 class FitnessAnalyzerApp:
@@ -37,6 +38,7 @@ class FitnessAnalyzerApp:
         self.current_image = None
         self.fitness_data = None
         self.analysis_results = None
+        self.analysis = None
         self.recommendations = None
         self.history = []
         
@@ -292,7 +294,8 @@ class FitnessAnalyzerApp:
                 return
             
             # Analyze the data
-            self.analysis_results = analyze_health_metrics(self.fitness_data)
+            self.analysis = analyze_record(self.fitness_data)
+            self.analysis_results = self.analysis.to_dict()
             
             # Generate recommendations
             self.recommendations = generate_recommendations(self.analysis_results)
@@ -408,12 +411,12 @@ class FitnessAnalyzerApp:
             return
         
         # Create history entry
-        entry = {
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "fitness_data": self.fitness_data,
-            "analysis_results": self.analysis_results,
-            "recommendations": self.recommendations
-        }
+        entry = HistoryEntry(
+            datetime.now().strftime("%Y-%m-%d %H:%M"),
+            self.analysis.fitness,
+            self.analysis,
+            self.recommendations
+        )
         
         # Add to history list
         self.history.append(entry)
@@ -435,7 +438,7 @@ class FitnessAnalyzerApp:
         
         # Add each history entry
         for i, entry in enumerate(reversed(self.history)):
-            frame = ttk.LabelFrame(self.scrollable_history_frame, text=f"Analysis from {entry['date']}")
+            frame = ttk.LabelFrame(self.scrollable_history_frame, text=f"Analysis from {entry.date}")
             frame.pack(fill=tk.X, expand=True, padx=10, pady=5)
             
             # Fitness data section
@@ -443,7 +446,7 @@ class FitnessAnalyzerApp:
                 row=0, column=0, sticky="w", padx=10, pady=5)
             
             data_text = ""
-            for key, value in entry["fitness_data"].items():
+            for key, value in entry.fitness.to_dict().items():
                 data_text += f"{key.title()}: {value}\n"
             
             data_label = ttk.Label(frame, text=data_text)
@@ -454,7 +457,7 @@ class FitnessAnalyzerApp:
                 row=0, column=1, sticky="w", padx=10, pady=5)
             
             analysis_text = ""
-            for key, value in entry["analysis_results"].items():
+            for key, value in entry.analysis.to_dict().items():
                 if key != "raw_data" and key not in ["food_recommendations", "exercise_recommendations", "insights"]:
                     analysis_text += f"{key.replace('_', ' ').title()}: {value}\n"
             
@@ -469,7 +472,7 @@ class FitnessAnalyzerApp:
     def view_history_entry(self, entry):
         """Show a popup with full details of a history entry"""
         dialog = tk.Toplevel(self.root)
-        dialog.title(f"Analysis from {entry['date']}")
+        dialog.title(f"Analysis from {entry.date}")
         dialog.geometry("800x600")
         dialog.minsize(600, 400)
         
@@ -484,7 +487,7 @@ class FitnessAnalyzerApp:
         data_text = scrolledtext.ScrolledText(data_frame, wrap=tk.WORD)
         data_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        for key, value in entry["fitness_data"].items():
+        for key, value in entry.fitness.to_dict().items():
             data_text.insert(tk.END, f"{key.replace('_', ' ').title()}: {value}\n")
         
         # Analysis tab
@@ -494,7 +497,7 @@ class FitnessAnalyzerApp:
         analysis_text = scrolledtext.ScrolledText(analysis_frame, wrap=tk.WORD)
         analysis_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        for key, value in entry["analysis_results"].items():
+        for key, value in entry.analysis.to_dict().items():
             if key != "raw_data" and key not in ["food_recommendations", "exercise_recommendations"]:
                 if key == "insights":
                     analysis_text.insert(tk.END, "Health Insights:\n")
@@ -511,7 +514,7 @@ class FitnessAnalyzerApp:
         rec_text = scrolledtext.ScrolledText(rec_frame, wrap=tk.WORD)
         rec_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        for category, text in entry["recommendations"].items():
+        for category, text in entry.recommendations.items():
             rec_text.insert(tk.END, f"--- {category.title()} ---\n\n")
             rec_text.insert(tk.END, f"{text}\n\n")
         
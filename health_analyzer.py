@@ -1,317 +1,482 @@
+import numpy as np
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+from health_rules import RULES
+from trend_engine import HistoryStore, compute_trends
+from running_stats import RunningAggregate, metric_values
+from records import FitnessRecord, AnalysisRecord
+
+# Robust z-score from which a metric value is flagged as an anomaly
+ANOMALY_Z_THRESHOLD = 4.0
+
+# Values a metric needs to have seen before its anomalies are flagged
+ANOMALY_MIN_HISTORY = 5
+
+# Turns a mean absolute deviation into a standard deviation estimate (sqrt(pi / 2))
+MAD_TO_STD = 1.2533
+
+# Smallest deviation scale, as a fraction of the EWMA, so a run of identical
+# days doesn't turn every small change into an anomaly
+ANOMALY_MIN_SCALE = 0.05
+
+# Food plans by activity, see HealthAnalyzer.food_plan
+FOOD_PLANS = {
+    # High activity recommendations
+    "high": {
+        'breakfast': (
+            "Protein smoothie with banana and berries",
+            "Whole grain toast with avocado and eggs",
+            "Greek yogurt with granola and nuts"
+        ),
+        'lunch': (
+            "Grilled chicken with quinoa and vegetables",
+            "Salmon salad with mixed greens",
+            "Turkey and hummus wrap"
+        ),
+        'dinner': (
+            "Lean beef with sweet potato and broccoli",
+            "Grilled fish with brown rice and asparagus",
+            "Chicken stir-fry with vegetables"
+        ),
+        'snacks': (
+            "Mixed nuts and dried fruit",
+            "Greek yogurt with berries",
+            "Apple with almond butter"
+        )
+    },
+    # Moderate activity recommendations
+    "moderate": {
+        'breakfast': (
+            "Oatmeal with fresh berries",
+            "Whole grain cereal with milk",
+            "Scrambled eggs with vegetables"
+        ),
+        'lunch': (
+            "Grilled chicken salad",
+            "Vegetable soup with whole grain bread",
+            "Tuna sandwich on whole wheat"
+        ),
+        'dinner': (
+            "Baked chicken with roasted vegetables",
+            "Fish with steamed broccoli and rice",
+            "Vegetable pasta with lean protein"
+        ),
+        'snacks': (
+            "Fresh fruit",
+            "Vegetable sticks with hummus",
+            "Low-fat yogurt"
+        )
+    }
+}
+
+# Exercise plans by activity, see HealthAnalyzer.exercise_plan
+EXERCISE_PLANS = {
+    # High activity - maintain and enhance
+    "high": {
+        'cardio': (
+            "30-minute moderate run",
+            "45-minute cycling session",
+            "HIIT workout (20 minutes)"
+        ),
+        'strength': (
+            "Full body weight training",
+            "Resistance band exercises",
+            "Bodyweight circuit training"
+        ),
+        'flexibility': (
+            "30-minute yoga session",
+            "Dynamic stretching routine",
+            "Pilates core workout"
+        )
+    },
+    # Low to moderate activity - build up gradually
+    "moderate": {
+        'cardio': (
+            "20-minute brisk walk",
+            "15-minute light cycling",
+            "Swimming for 20 minutes"
+        ),
+        'strength': (
+            "Basic bodyweight exercises",
+            "Light dumbbell workout",
+            "Wall push-ups and squats"
+        ),
+        'flexibility': (
+            "Gentle stretching routine",
+            "Beginner yoga poses",
+            "Simple mobility exercises"
+        )
+    }
+}
+
+def _copy_plan(plan):
+    """Return a plan as a fresh dict of lists that callers are free to modify"""
+    return {key: list(options) for key, options in plan.items()}
+
 class HealthAnalyzer:
-    def __init__(self):
-        """Initialize the health analyzer"""
-        pass
+    def __init__(self, sketches=None):
+        """
+        Initialize the health analyzer
+        
+        Args:
+            sketches (dict): Optional metric -> KLLSketch of the cohort to rank values against
+        """
+        self.sketches = sketches or {}
+    
+    def percentile_rank(self, metric, value):
+        """
+        Return the percentage of the cohort with a value at or below this one.
+        
+        Args:
+            metric (str): Metric name, e.g. "steps"
+            value (float): The value to rank
+        
+        Returns:
+            float: Percentile rank between 0 and 100, or None without cohort data
+        """
+        sketch = self.sketches.get(metric)
+        if sketch is None or not sketch.count:
+            return None
+        return round(sketch.rank(value) * 100, 1)
     
     def determine_fitness_level(self, steps, calories):
         """Determine fitness level based on steps and calories"""
         if not steps:
             return "unknown"
         
-        if steps >= 12000:
-            return "very_active"
-        elif steps >= 8000:
-            return "active"
-        elif steps >= 5000:
-            return "moderately_active"
-        elif steps >= 2500:
-            return "lightly_active"
-        else:
-            return "sedentary"
+        return RULES.band("fitness_level").classify(steps)
     
     def generate_health_insights(self, fitness_data):
         """Generate health insights based on fitness data"""
         insights = []
         
-        steps = fitness_data.get('steps', 0)
-        calories = fitness_data.get('total_calories', 0) or fitness_data.get('calories', 0)
-        distance = fitness_data.get('distance', 0)
+        record = FitnessRecord.coerce(fitness_data)
+        steps = record.steps or 0
+        calories = record.calories or 0
+        distance = record.distance or 0
         
         # Steps insights
-        if steps >= 10000:
-            insights.append("✅ Excellent! You've reached the recommended 10,000 daily steps.")
-        elif steps >= 7500:
-            insights.append("👍 Good job! You're close to the 10,000 step goal.")
-        elif steps >= 5000:
-            insights.append("🚶 Moderate activity level. Try to increase your daily steps.")
-        elif steps > 0:
-            insights.append("⚠️ Low activity level. Consider adding more walking to your routine.")
+        if steps > 0:
+            insights.append(RULES.band("steps_insight").classify(steps))
         
         # Calories insights
-        if calories >= 400:
-            insights.append("🔥 Great calorie burn! You're maintaining an active lifestyle.")
-        elif calories >= 200:
-            insights.append("💪 Good calorie burn. Keep up the activity!")
-        elif calories > 0:
-            insights.append("📈 Consider increasing your activity level to burn more calories.")
+        if calories > 0:
+            insights.append(RULES.band("calories_insight").classify(calories))
         
         # Distance insights
-        if distance >= 5:
-            insights.append(f"🏃 Impressive distance of {distance:.1f}km covered!")
-        elif distance >= 2:
-            insights.append(f"🚶 Good distance of {distance:.1f}km walked.")
-        elif distance > 0:
-            insights.append(f"🚶 You've covered {distance:.1f}km today.")
+        if distance > 0:
+            insights.append(RULES.band("distance_insight").classify(distance).format(distance=distance))
             
         return insights
     
     def calculate_meditation_time(self, fitness_data):
         """Calculate recommended meditation time based on activity"""
-        base_time = 10
+        base_time = RULES.meditation_base
         
-        steps = fitness_data.get('steps', 0)
-        calories = fitness_data.get('total_calories', 0) or fitness_data.get('calories', 0)
-        stairs = fitness_data.get('stairs', 0)
+        record = FitnessRecord.coerce(fitness_data)
+        steps = record.steps or 0
+        calories = record.calories or 0
         
         if steps:
-            if steps >= 10000:
-                base_time += 5
-            elif steps >= 5000:
-                base_time += 3
+            base_time += RULES.band("meditation_steps_bonus").classify(steps)
         
         if calories:
-            if calories >= 400:
-                base_time += 5
-            elif calories >= 200:
-                base_time += 3
+            base_time += RULES.band("meditation_calories_bonus").classify(calories)
         
-        return min(base_time, 20)  # Cap at 20 minutes
+        return min(base_time, RULES.meditation_max)
+    
+    def food_plan(self, fitness_data):
+        """Return which food plan ("high" or "moderate") suits the activity in fitness data"""
+        record = FitnessRecord.coerce(fitness_data)
+        steps = record.steps or 0
+        calories = record.calories or 0
+        
+        if (RULES.band("food_plan_steps").classify(steps) == "high"
+                or RULES.band("food_plan_calories").classify(calories) == "high"):
+            return "high"
+        return "moderate"
+    
+    def exercise_plan(self, fitness_data):
+        """Return which exercise plan ("high" or "moderate") suits the activity in fitness data"""
+        steps = FitnessRecord.coerce(fitness_data).steps or 0
+        return RULES.band("exercise_plan_steps").classify(steps)
     
     def generate_food_recommendations(self, fitness_data):
         """Generate food recommendations based on fitness data"""
-        steps = fitness_data.get('steps', 0)
-        calories = fitness_data.get('total_calories', 0) or fitness_data.get('calories', 0)
-        
-        if steps >= 8000 or calories >= 300:
-            # High activity recommendations
-            return {
-                'breakfast': [
-                    "Protein smoothie with banana and berries",
-                    "Whole grain toast with avocado and eggs",
-                    "Greek yogurt with granola and nuts"
-                ],
-                'lunch': [
-                    "Grilled chicken with quinoa and vegetables",
-                    "Salmon salad with mixed greens",
-                    "Turkey and hummus wrap"
-                ],
-                'dinner': [
-                    "Lean beef with sweet potato and broccoli",
-                    "Grilled fish with brown rice and asparagus",
-                    "Chicken stir-fry with vegetables"
-                ],
-                'snacks': [
-                    "Mixed nuts and dried fruit",
-                    "Greek yogurt with berries",
-                    "Apple with almond butter"
-                ]
-            }
-        else:
-            # Moderate activity recommendations
-            return {
-                'breakfast': [
-                    "Oatmeal with fresh berries",
-                    "Whole grain cereal with milk",
-                    "Scrambled eggs with vegetables"
-                ],
-                'lunch': [
-                    "Grilled chicken salad",
-                    "Vegetable soup with whole grain bread",
-                    "Tuna sandwich on whole wheat"
-                ],
-                'dinner': [
-                    "Baked chicken with roasted vegetables",
-                    "Fish with steamed broccoli and rice",
-                    "Vegetable pasta with lean protein"
-                ],
-                'snacks': [
-                    "Fresh fruit",
-                    "Vegetable sticks with hummus",
-                    "Low-fat yogurt"
-                ]
-            }
+        return _copy_plan(FOOD_PLANS[self.food_plan(fitness_data)])
     
     def generate_exercise_recommendations(self, fitness_data):
         """Generate exercise recommendations based on fitness data"""
-        steps = fitness_data.get('steps', 0)
+        return _copy_plan(EXERCISE_PLANS[self.exercise_plan(fitness_data)])
+
+class AnomalyDetector:
+    """
+    Streaming outlier detector for incoming fitness metrics.
+    
+    Each metric of a user is scored against its running aggregate with a
+    robust z-score, the distance from the EWMA in units of the EWMA of the
+    absolute deviation, so a single bad reading can't inflate the scale the
+    way it would a standard deviation. Scoring and updating are O(1) per metric.
+    """
+    
+    def __init__(self, aggregates=None, threshold=ANOMALY_Z_THRESHOLD, min_history=ANOMALY_MIN_HISTORY):
+        """
+        Initialize the detector
+        
+        Args:
+            aggregates (dict): metric -> RunningAggregate of the user; updated in place
+            threshold (float): Robust z-score from which a value is an anomaly
+            min_history (int): Values a metric needs before it is scored
+        """
+        self.aggregates = aggregates if aggregates is not None else {}
+        self.threshold = threshold
+        self.min_history = min_history
+    
+    def _scale(self, aggregate):
+        """Deviation scale of a metric, in the metric's own units"""
+        return max(MAD_TO_STD * aggregate.ewmad, ANOMALY_MIN_SCALE * abs(aggregate.ewma), 1e-9)
+    
+    def score(self, metric, value):
+        """Return the robust z-score of a value, or None while there is too little history"""
+        aggregate = self.aggregates.get(metric)
+        if aggregate is None or aggregate.count < self.min_history:
+            return None
+        return (value - aggregate.ewma) / self._scale(aggregate)
+    
+    def detect(self, fitness_data):
+        """
+        Find the metrics of an entry that are far outside the user's usual range.
+        
+        Args:
+            fitness_data (dict): Dictionary containing fitness metrics
+        
+        Returns:
+            dict: metric -> value, expected value, z-score and direction, for
+            every anomalous metric
+        """
+        anomalies = {}
+        for metric, value in metric_values(fitness_data).items():
+            z_score = self.score(metric, value)
+            if z_score is not None and abs(z_score) >= self.threshold:
+                anomalies[metric] = {
+                    "value": value,
+                    "expected": round(self.aggregates[metric].ewma, 2),
+                    "z_score": round(z_score, 2),
+                    "direction": "high" if z_score > 0 else "low"
+                }
+        return anomalies
+    
+    def update(self, day, fitness_data, anomalies=None):
+        """
+        Fold an entry into the aggregates.
+        
+        Anomalous values are left out of the statistics; only the baseline
+        moves towards them, clipped to the threshold, so a genuine change in
+        behaviour is picked up over a few days while a misread is not.
         
-        if steps >= 8000:
-            # High activity - maintain and enhance
-            return {
-                'cardio': [
-                    "30-minute moderate run",
-                    "45-minute cycling session",
-                    "HIIT workout (20 minutes)"
-                ],
-                'strength': [
-                    "Full body weight training",
-                    "Resistance band exercises",
-                    "Bodyweight circuit training"
-                ],
-                'flexibility': [
-                    "30-minute yoga session",
-                    "Dynamic stretching routine",
-                    "Pilates core workout"
-                ]
-            }
-        else:
-            # Low to moderate activity - build up gradually
-            return {
-                'cardio': [
-                    "20-minute brisk walk",
-                    "15-minute light cycling",
-                    "Swimming for 20 minutes"
-                ],
-                'strength': [
-                    "Basic bodyweight exercises",
-                    "Light dumbbell workout",
-                    "Wall push-ups and squats"
-                ],
-                'flexibility': [
-                    "Gentle stretching routine",
-                    "Beginner yoga poses",
-                    "Simple mobility exercises"
-                ]
-            }
+        Args:
+            day (str, datetime or date): Day the entry belongs to
+            fitness_data (dict): Dictionary containing fitness metrics
+            anomalies (dict): Result of detect for this entry
+        """
+        anomalies = anomalies or {}
+        for metric, value in metric_values(fitness_data).items():
+            if metric not in self.aggregates:
+                self.aggregates[metric] = RunningAggregate(metric)
+            aggregate = self.aggregates[metric]
+            
+            if metric in anomalies:
+                bound = self.threshold * self._scale(aggregate)
+                aggregate.update_baseline(min(max(value, aggregate.ewma - bound), aggregate.ewma + bound))
+            else:
+                aggregate.update(day, value)
 
-# Legacy function to maintain compatibility with existing code
-def analyze_health_metrics(fitness_data):
+def analysis_key(record):
     """
-    Analyze fitness metrics and categorize them into different health levels.
+    Compute the values an analysis is determined by.
+    
+    Everything in an analysis other than the analyzed metrics themselves
+    follows from these few values, so they serve as a cache key.
     
     Args:
-        fitness_data (dict): Dictionary containing fitness metrics
+        record (FitnessRecord or dict): Fitness metrics to analyze
     
     Returns:
-        dict: Dictionary with analysis results
+        tuple: activity level, calorie burn, fitness score, overall fitness,
+        insights, meditation time, food plan and exercise plan
     """
     analyzer = HealthAnalyzer()
+    record = FitnessRecord.coerce(record)
     
-    analysis_results = {
-        "activity_level": "Unknown",
-        "calorie_burn": "Unknown",
-        "fitness_score": 0,
-        "raw_data": fitness_data
-    }
-    
-    # Get steps and calories, accounting for different possible key names
-    steps = fitness_data.get("steps", 0)
-    calories = fitness_data.get("calories", 0) or fitness_data.get("total_calories", 0)
-    
-    # Generate insights
-    insights = analyzer.generate_health_insights(fitness_data)
-    analysis_results["insights"] = insights
+    steps = record.steps or 0
+    calories = record.calories or 0
     
-    # Add meditation recommendation
-    meditation_time = analyzer.calculate_meditation_time(fitness_data)
-    analysis_results["meditation_time"] = meditation_time
-    
-    # Analyze step count
-    if steps > 0:
-        if steps < 5000:
-            analysis_results["activity_level"] = "Sedentary"
-        elif 5000 <= steps < 7500:
-            analysis_results["activity_level"] = "Low Active"
-        elif 7500 <= steps < 10000:
-            analysis_results["activity_level"] = "Somewhat Active"
-        elif 10000 <= steps < 12500:
-            analysis_results["activity_level"] = "Active"
-        else:
-            analysis_results["activity_level"] = "Very Active"
-    
-    # Analyze calorie burn
-    if calories > 0:
-        if calories < 200:
-            analysis_results["calorie_burn"] = "Low"
-        elif 200 <= calories < 400:
-            analysis_results["calorie_burn"] = "Moderate"
-        elif 400 <= calories < 600:
-            analysis_results["calorie_burn"] = "High"
-        else:
-            analysis_results["calorie_burn"] = "Very High"
+    # Analyze step count and calorie burn
+    activity_level = RULES.band("activity_level").classify(steps) if steps > 0 else "Unknown"
+    calorie_burn = RULES.band("calorie_burn").classify(calories) if calories > 0 else "Unknown"
     
     # Calculate fitness score (a simple metric between 0-100)
     fitness_score = 0
     
     # Score based on steps
     if steps > 0:
-        step_score = min(steps / 15000 * 40, 40)  # 40% weight, max at 15000 steps
-        fitness_score += step_score
+        fitness_score += RULES.score("steps", steps)
     
     # Score based on calories
     if calories > 0:
-        calorie_score = min(calories / 600 * 30, 30)  # 30% weight, max at 600 calories
-        fitness_score += calorie_score
+        fitness_score += RULES.score("calories", calories)
     
     # Score based on active minutes
-    if "active_minutes" in fitness_data:
-        active_minutes = fitness_data["active_minutes"]
-        active_score = min(active_minutes / 60 * 20, 20)  # 20% weight, max at 60 minutes
-        fitness_score += active_score
+    if record.active_minutes is not None:
+        fitness_score += RULES.score("active_minutes", record.active_minutes)
     
     # Score based on distance
-    if "distance" in fitness_data:
-        distance = fitness_data["distance"]
-        distance_score = min(distance / 10 * 10, 10)  # 10% weight, max at 10 miles/km
-        fitness_score += distance_score
-    
-    analysis_results["fitness_score"] = round(fitness_score)
-    
-    # Determine overall fitness level
-    if fitness_score < 20:
-        analysis_results["overall_fitness"] = "Needs Improvement"
-    elif 20 <= fitness_score < 40:
-        analysis_results["overall_fitness"] = "Fair"
-    elif 40 <= fitness_score < 60:
-        analysis_results["overall_fitness"] = "Good"
-    elif 60 <= fitness_score < 80:
-        analysis_results["overall_fitness"] = "Very Good"
-    else:
-        analysis_results["overall_fitness"] = "Excellent"
-    
-    # Add food recommendations
-    food_recommendations = analyzer.generate_food_recommendations(fitness_data)
-    analysis_results["food_recommendations"] = food_recommendations
-    
-    # Add exercise recommendations
-    exercise_recommendations = analyzer.generate_exercise_recommendations(fitness_data)
-    analysis_results["exercise_recommendations"] = exercise_recommendations
-    
-    return analysis_results
+    if record.distance is not None:
+        fitness_score += RULES.score("distance", record.distance)
+    
+    return (
+        activity_level,
+        calorie_burn,
+        round(fitness_score),
+        # Overall fitness is classified on the unrounded score
+        RULES.band("overall_fitness").classify(fitness_score),
+        tuple(analyzer.generate_health_insights(record)),
+        analyzer.calculate_meditation_time(record),
+        analyzer.food_plan(record),
+        analyzer.exercise_plan(record)
+    )
+
+def analyze_record(record, detector=None):
+    """
+    Analyze a fitness record and categorize it into different health levels.
+    
+    Args:
+        record (FitnessRecord or dict): Fitness metrics to analyze
+        detector (AnomalyDetector): Optional detector of the user; anomalous
+            metrics are reported in the record's anomalies
+    
+    Returns:
+        AnalysisRecord: The analysis; a dict given is kept as its raw_data
+    """
+    raw_data = None if isinstance(record, FitnessRecord) else record
+    record = FitnessRecord.coerce(record)
+    (activity_level, calorie_burn, fitness_score, overall_fitness,
+     insights, meditation_time, food_plan, exercise_plan) = analysis_key(record)
+    
+    analysis = AnalysisRecord(
+        record,
+        activity_level=activity_level,
+        calorie_burn=calorie_burn,
+        fitness_score=fitness_score,
+        overall_fitness=overall_fitness,
+        insights=insights,
+        meditation_time=meditation_time,
+        food_recommendations=_copy_plan(FOOD_PLANS[food_plan]),
+        exercise_recommendations=_copy_plan(EXERCISE_PLANS[exercise_plan]),
+        raw_data=raw_data
+    )
+    
+    # Flag values far outside the user's usual range
+    if detector is not None:
+        analysis.anomalies = detector.detect(record)
+    
+    return analysis
+
+# Legacy function to maintain compatibility with existing code
+def analyze_health_metrics(fitness_data, detector=None):
+    """
+    Analyze fitness metrics and categorize them into different health levels.
+    
+    Args:
+        fitness_data (dict): Dictionary containing fitness metrics
+        detector (AnomalyDetector): Optional detector of the user; anomalous
+            metrics are reported under "anomalies"
+    
+    Returns:
+        dict: Dictionary with analysis results
+    """
+    return analyze_record(fitness_data, detector).to_dict()
+
+def _batch_column(data, name, length):
+    """Fetch a metric column as a float array, NaN where the metric is missing"""
+    if name not in data:
+        return np.full(length, np.nan)
+    return np.asarray(data[name], dtype=float)
+
+def analyze_health_metrics_batch(data):
+    """
+    Vectorized version of analyze_health_metrics for many records at once.
+    
+    Produces the same activity level, calorie burn, fitness score and overall
+    fitness as calling analyze_health_metrics on each record, without building
+    a dict per record.
+    
+    Args:
+        data (pandas.DataFrame or dict): Columns of equal length named "steps",
+            "calories" and/or "total_calories", "active_minutes" and "distance".
+            Missing values are NaN (or None).
+    
+    Returns:
+        pandas.DataFrame or dict: Columns "activity_level", "calorie_burn",
+        "fitness_score" and "overall_fitness"; a DataFrame with the same index
+        if a DataFrame was given, otherwise a dict of numpy arrays
+    """
+    length = len(data) if PANDAS_AVAILABLE and isinstance(data, pd.DataFrame) else len(next(iter(data.values())))
+    
+    steps = np.nan_to_num(_batch_column(data, "steps", length), nan=0.0)
+    calories = _batch_column(data, "calories", length)
+    total_calories = _batch_column(data, "total_calories", length)
+    active_minutes = _batch_column(data, "active_minutes", length)
+    distance = _batch_column(data, "distance", length)
+    
+    # "calories" wins over "total_calories" unless it is missing or zero
+    calories = np.where(np.isnan(calories) | (calories == 0), total_calories, calories)
+    calories = np.nan_to_num(calories, nan=0.0)
+    
+    has_steps = steps > 0
+    has_calories = calories > 0
+    
+    activity_level = np.where(has_steps, RULES.band("activity_level").classify_batch(steps), "Unknown").astype(object)
+    calorie_burn = np.where(has_calories, RULES.band("calorie_burn").classify_batch(calories), "Unknown").astype(object)
+    
+    # Same weights and caps as analyze_health_metrics
+    fitness_score = (
+        np.where(has_steps, RULES.score_batch("steps", steps), 0.0)
+        + np.where(has_calories, RULES.score_batch("calories", calories), 0.0)
+        + np.where(np.isnan(active_minutes), 0.0, RULES.score_batch("active_minutes", active_minutes))
+        + np.where(np.isnan(distance), 0.0, RULES.score_batch("distance", distance))
+    )
+    overall_fitness = RULES.band("overall_fitness").classify_batch(fitness_score)
+    
+    results = {
+        "activity_level": activity_level,
+        "calorie_burn": calorie_burn,
+        # np.round rounds half to even, like the built-in round
+        "fitness_score": np.round(fitness_score).astype(int),
+        "overall_fitness": overall_fitness
+    }
+    
+    if PANDAS_AVAILABLE and isinstance(data, pd.DataFrame):
+        return pd.DataFrame(results, index=data.index)
+    return results
 
 def get_health_trends(historical_data):
     """
     Analyze trends in fitness data over time.
     
     Args:
-        historical_data (list): List of fitness data dictionaries
+        historical_data (list): List of fitness data dictionaries, or history
+            entries with "date" and "fitness_data", oldest first
     
     Returns:
-        dict: Dictionary with trend analysis
+        dict: Dictionary with trend analysis, see trend_engine.compute_trends
     """
     if not historical_data or len(historical_data) < 2:
         return {"message": "Not enough data to analyze trends"}
     
-    # Extract metrics for trend analysis
-    trends = {}
-    
-    # Common metrics to track
-    metrics = ["steps", "calories", "total_calories", "distance", "active_minutes"]
-    
-    for metric in metrics:
-        values = [entry.get(metric) for entry in historical_data if metric in entry and entry[metric] is not None]
-        if len(values) >= 2:
-            current = values[-1]
-            previous = values[-2]
-            change = current - previous
-            percent_change = (change / previous) * 100 if previous != 0 else 0
-            
-            trends[metric] = {
-                "current": current,
-                "previous": previous,
-                "change": change,
-                "percent_change": round(percent_change, 2),
-                "direction": "up" if change > 0 else "down" if change < 0 else "stable"
-            }
-    
-    return trends
+    return compute_trends(HistoryStore.from_records(historical_data))
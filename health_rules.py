@@ -0,0 +1,105 @@
+import os
+import json
+import logging
+from bisect import bisect_right
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rule table shipped with the app; HEALTH_RULES_PATH points to a replacement
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'health_rules.json')
+
+
+class BandRule:
+    """
+    A classification rule compiled into sorted breakpoints.
+
+    A value falls into band i when it is at least edges[i - 1] and below
+    edges[i], so values equal to an edge belong to the band above it.
+    """
+
+    __slots__ = ("edges", "labels", "edges_array", "labels_array")
+
+    def __init__(self, edges, labels):
+        if len(labels) != len(edges) + 1:
+            raise ValueError(f"Expected {len(edges) + 1} labels for {len(edges)} edges, got {len(labels)}")
+        if list(edges) != sorted(edges):
+            raise ValueError(f"Band edges must be sorted: {edges}")
+
+        self.edges = tuple(edges)
+        self.labels = tuple(labels)
+        self.edges_array = np.array(edges, dtype=float)
+        self.labels_array = np.array(labels, dtype=object)
+
+    def classify(self, value):
+        """Return the label of the band holding value, in O(log n)"""
+        return self.labels[bisect_right(self.edges, value)]
+
+    def classify_batch(self, values):
+        """Return an object array with the band label of every value"""
+        return self.labels_array[np.searchsorted(self.edges_array, values, side='right')]
+
+
+class RuleSet:
+    """Health classification rules loaded from a JSON rule table"""
+
+    def __init__(self, config):
+        """
+        Compile a rule table
+
+        Args:
+            config (dict): Rule table with "scales", "bands", "goals", "meditation"
+                and "fitness_score". A band gives its own "edges", or names one
+                of the shared "scales" and labels each band of that scale
+        """
+        # Edges shared by every band of a metric, so they can't drift apart
+        self.scales = {name: tuple(edges) for name, edges in config.get("scales", {}).items()}
+        self.bands = {
+            name: BandRule(self.scales[band["scale"]] if "scale" in band else band["edges"], band["labels"])
+            for name, band in config["bands"].items()
+        }
+        # Daily targets a day has to reach to count towards a streak
+        self.goals = dict(config["goals"])
+        self.meditation_base = config["meditation"]["base_minutes"]
+        self.meditation_max = config["meditation"]["max_minutes"]
+        # metric -> (value at which the metric earns its full weight, weight)
+        self.score_weights = {
+            metric: (weight["full_score_at"], weight["weight"])
+            for metric, weight in config["fitness_score"].items()
+        }
+
+    def band(self, name):
+        """Return the compiled band rule with the given name"""
+        return self.bands[name]
+
+    def score(self, metric, value):
+        """Return the fitness score contribution of a metric value"""
+        full_score_at, weight = self.score_weights[metric]
+        return min(value / full_score_at * weight, weight)
+
+    def score_batch(self, metric, values):
+        """Return the fitness score contribution of an array of metric values"""
+        full_score_at, weight = self.score_weights[metric]
+        return np.minimum(values / full_score_at * weight, weight)
+
+
+def load_rules(path=None):
+    """
+    Load and compile a rule table.
+
+    Args:
+        path (str): JSON rule table; defaults to HEALTH_RULES_PATH or the bundled table
+
+    Returns:
+        RuleSet: The compiled rules
+    """
+    path = path or os.environ.get("HEALTH_RULES_PATH") or DEFAULT_RULES_PATH
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    logger.info(f"Loaded health rules from {path}")
+    return RuleSet(config)
+
+
+# Rules are loaded once per process
+RULES = load_rules()
@@ -0,0 +1,71 @@
+import io
+import csv
+import json
+import logging
+
+from storage import DEFAULT_USER_ID, ENTRY_FIELDS, iter_history_from_db
+
+logger = logging.getLogger(__name__)
+
+# Columns of a CSV export: the flat fields of an entry
+CSV_FIELDS = ("id", "date", "steps", "calories", "distance", "active_minutes", "stairs",
+              "fitness_score", "activity_level")
+
+# Content type and file extension of each export format
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+def ndjson_lines(entries):
+    """Yield each entry as one line of JSON"""
+    for entry in entries:
+        yield json.dumps(entry) + "\n"
+
+
+def csv_lines(entries, fields):
+    """
+    Yield a CSV header and one line per entry.
+
+    Fields holding dicts or lists, such as fitness_data, are written as JSON.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        writer.writerow(values)
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    yield line(fields)
+    for entry in entries:
+        yield line([
+            json.dumps(entry.get(field)) if isinstance(entry.get(field), (dict, list)) else entry.get(field)
+            for field in fields
+        ])
+
+
+def export_history(export_format, user_id=DEFAULT_USER_ID, fields=None, render=True):
+    """
+    Stream a user's history, oldest first, as NDJSON or CSV.
+
+    Args:
+        export_format (str): "ndjson" or "csv"
+        user_id (str): User whose history to export
+        fields (tuple): Fields to export; all fields of an entry for NDJSON
+            and CSV_FIELDS for CSV by default
+        render (bool): Render recommendations, rather than export template ids
+
+    Yields:
+        str: Lines of the export, each ending in a newline
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    if export_format == "csv":
+        fields = ("id",) + tuple(field for field in fields or CSV_FIELDS if field != "id")
+        return csv_lines(iter_history_from_db(user_id, render, fields), fields)
+    return ndjson_lines(iter_history_from_db(user_id, render, fields or ENTRY_FIELDS))
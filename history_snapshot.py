@@ -0,0 +1,201 @@
+import os
+import json
+import shutil
+import logging
+
+import numpy as np
+
+from storage import SNAPSHOT_COLUMNS, METRIC_COLUMNS, EXPORT_BATCH_SIZE, iter_snapshot_batches_from_db
+from trend_engine import HistoryStore, compute_trends
+
+logger = logging.getLogger(__name__)
+
+# pyarrow is optional; without it there are no snapshots
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from pyarrow.fs import LocalFileSystem
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+    logger.warning("pyarrow not available. History snapshots will not be written.")
+
+# File formats: Parquet is compressed, for pandas and other tools; Arrow IPC
+# is stored the way it sits in memory, so loading it maps the file in place
+SNAPSHOT_FORMATS = {
+    "parquet": "parquet",
+    "arrow": "arrow",
+}
+
+# Records what a snapshot directory holds and the last entry id it has
+STATE_FILE = "_snapshot.json"
+
+# Rows read from the database per batch
+SNAPSHOT_BATCH_SIZE = EXPORT_BATCH_SIZE * 20
+
+# Metrics of a HistoryStore loaded from a snapshot
+SNAPSHOT_TREND_METRICS = ["steps", "calories", "distance", "active_minutes"]
+
+
+def _require_pyarrow():
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("History snapshots need pyarrow. Install it with: pip install -r requirements-optional.txt")
+
+
+def snapshot_schema():
+    """Arrow schema of a snapshot: typed metric columns, null where an entry lacks a metric"""
+    _require_pyarrow()
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("user_id", pa.string()),
+            ("date", pa.timestamp("us")),
+        ]
+        + [(column, pa.float64()) for column in METRIC_COLUMNS]
+        + [
+            ("fitness_score", pa.float64()),
+            ("activity_level", pa.string()),
+        ]
+    )
+
+
+def _read_state(path):
+    state_path = os.path.join(path, STATE_FILE)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def _write_state(path, state):
+    """Replace the state file in one step, so a crash leaves the old one"""
+    state_path = os.path.join(path, STATE_FILE)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def _batch_table(rows, schema):
+    """Turn SNAPSHOT_COLUMNS row tuples into an Arrow table"""
+    columns = list(zip(*rows))
+    arrays = []
+    for name, values in zip(SNAPSHOT_COLUMNS, columns):
+        field = schema.field(name)
+        if name == "date":
+            arrays.append(pa.array(values, pa.string()).cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_snapshot(path, snapshot_format="parquet", rebuild=False):
+    """
+    Write the history table as a columnar snapshot, appending only new entries.
+
+    Entries go into one directory per month (path/month=2024-03/), the
+    Hive layout pandas, pyarrow and most query engines read as a partition
+    column. Each run adds one file per month it has entries for, holding
+    the entries added since the previous run. Entries deleted or changed
+    after they were written stay as they were until rebuild=True rewrites
+    the snapshot from scratch.
+
+    Args:
+        path (str): Snapshot directory
+        snapshot_format (str): "parquet" or "arrow"
+        rebuild (bool): Discard the existing snapshot and write all entries
+
+    Returns:
+        int: Number of entries written
+    """
+    _require_pyarrow()
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+
+    state = _read_state(path)
+    if state and (rebuild or state["format"] != snapshot_format):
+        shutil.rmtree(path)
+        state = None
+    os.makedirs(path, exist_ok=True)
+    last_id = state["last_id"] if state else 0
+
+    schema = snapshot_schema()
+    extension = SNAPSHOT_FORMATS[snapshot_format]
+    writers = {}
+    written = 0
+    try:
+        for rows in iter_snapshot_batches_from_db(last_id, SNAPSHOT_BATCH_SIZE):
+            table = _batch_table(rows, schema)
+            months = pc.strftime(table.column("date"), format="%Y-%m")
+            for month in pc.unique(months).to_pylist():
+                if month not in writers:
+                    directory = os.path.join(path, f"month={month}")
+                    os.makedirs(directory, exist_ok=True)
+                    # Named after the first id of the batch that opened this month's file in this run
+                    filename = os.path.join(directory, f"part-{rows[0][0]:012d}.{extension}")
+                    if snapshot_format == "parquet":
+                        writers[month] = pq.ParquetWriter(filename, schema)
+                    else:
+                        writers[month] = pa.ipc.new_file(filename, schema)
+                writers[month].write_table(table.filter(pc.equal(months, month)))
+            written += len(rows)
+            last_id = rows[-1][0]
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    # Only record the new rows once their files are complete
+    _write_state(path, {"format": snapshot_format, "last_id": last_id})
+    logger.info(f"Wrote {written} entries to the history snapshot at {path}")
+    return written
+
+
+def load_snapshot(path, user_id=None):
+    """
+    Load a snapshot as an Arrow table, memory-mapping its files.
+
+    The columns of an Arrow IPC snapshot point into the mapped files, so
+    loading one copies and decodes nothing; Parquet is decoded from the
+    mapped files. Selecting a user copies that user's rows.
+
+    Args:
+        path (str): Snapshot directory written by write_snapshot
+        user_id (str): Only this user's entries
+
+    Returns:
+        pyarrow.Table: The entries month by month, with a month column
+    """
+    _require_pyarrow()
+    state = _read_state(path)
+    if state is None:
+        raise FileNotFoundError(f"No history snapshot at {path}")
+
+    dataset = ds.dataset(
+        path,
+        format="parquet" if state["format"] == "parquet" else "ipc",
+        partitioning="hive",
+        filesystem=LocalFileSystem(use_mmap=True)
+    )
+    return dataset.to_table(filter=ds.field("user_id") == user_id if user_id is not None else None)
+
+
+def load_history_store(path, user_id=None):
+    """
+    Load a snapshot into a HistoryStore for the trend engine.
+
+    Returns:
+        HistoryStore: Entries of the snapshot, with the metrics of SNAPSHOT_TREND_METRICS
+    """
+    table = load_snapshot(path, user_id)
+    days = table.column("date").to_numpy().astype("datetime64[D]")
+    values = np.column_stack([
+        table.column(metric).to_numpy(zero_copy_only=False) for metric in SNAPSHOT_TREND_METRICS
+    ]) if len(table) else np.empty((0, len(SNAPSHOT_TREND_METRICS)))
+    order = np.argsort(days, kind="stable")
+    return HistoryStore(days[order], values[order], SNAPSHOT_TREND_METRICS)
+
+
+def snapshot_trends(path, user_id):
+    """Compute a user's trends, as get_health_trends does, from a snapshot"""
+    return compute_trends(load_history_store(path, user_id))
@@ -8,6 +8,9 @@ import json
 import logging
 import traceback
 
+from digit_recognizer import DigitRecognizer, parse_number
+from records import METRIC_ALIASES
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,9 +21,15 @@ genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
 # Try to import OpenCV and pytesseract for OCR fallback
 try:
     import cv2
-    import pytesseract
     import numpy as np
-    OCR_AVAILABLE = True
+    CV_AVAILABLE = True
+except ImportError:
+    CV_AVAILABLE = False
+    logger.warning("OpenCV not available. Video ingestion will not be used.")
+
+try:
+    import pytesseract
+    OCR_AVAILABLE = CV_AVAILABLE
     # Try to find tesseract automatically (for Windows)
     if os.name == 'nt':
         if os.path.exists(r'C:\Program Files\Tesseract-OCR\tesseract.exe'):
@@ -29,13 +38,79 @@ try:
             pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files (x86)\Tesseract-OCR\tesseract.exe'
 except ImportError:
     OCR_AVAILABLE = False
+
+if not OCR_AVAILABLE:
     logger.warning("OpenCV or pytesseract not available. OCR fallback will not be used.")
 
+# File extensions handled by extract_from_video_path
+VIDEO_EXTENSIONS = ['.mp4', '.mov', '.m4v', '.webm', '.avi', '.mkv']
+
+# Width of the grayscale thumbnails frames are compared on
+KEYFRAME_THUMB_WIDTH = 64
+
 
 class ImageProcessor:
-    def __init__(self):
-        """Initialize the image processor"""
+    def __init__(self, digit_confidence=0.8, ocr_max_dimension=2000):
+        """
+        Initialize the image processor
+
+        Args:
+            digit_confidence (float): Minimum confidence for a reading of the
+                built-in digit recognizer to be accepted without Tesseract
+            ocr_max_dimension (int): Longest side, in pixels, images are decoded
+                at for full-page OCR. Screen text stays well above the ~20 px
+                glyph height Tesseract needs at this size, so larger photos are
+                decoded at reduced resolution instead.
+        """
         self.ocr_available = OCR_AVAILABLE
+        self.ocr_max_dimension = ocr_max_dimension
+        self.digit_recognizer = DigitRecognizer()
+        self.digit_confidence = digit_confidence
+    
+    def _load_ocr_gray(self, image):
+        """
+        Decode an image as grayscale at no more than the resolution OCR needs.
+        
+        JPEGs opened from a path are decoded with PIL's draft mode, which lets
+        libjpeg scale the DCT by 1/2, 1/4 or 1/8 while decoding, so the full
+        resolution image is never materialized. Images that are already decoded
+        are shrunk with Image.reduce.
+        
+        Returns:
+            tuple: Grayscale numpy array and the factor to scale its coordinates
+            by to get back to the original image
+        """
+        if isinstance(image, str):
+            # If image is a file path
+            with Image.open(image) as img:
+                original_width = img.size[0]
+                if img.format == 'JPEG':
+                    scale = min(1.0, self.ocr_max_dimension / max(img.size))
+                    img.draft('L', (int(img.size[0] * scale), int(img.size[1] * scale)))
+                gray, _ = self._load_ocr_gray(img)
+                return gray, original_width / gray.shape[1]
+        
+        # If image is a PIL Image
+        factor = max(1, int(max(image.size) / self.ocr_max_dimension))
+        # Convert first: reduce only supports some modes, not P, 1 or I;16
+        image = image.convert('L')
+        if factor > 1:
+            image = image.reduce(factor)
+        gray = np.array(image)
+        return gray, factor
+    
+    def _prepare_ocr_image(self, image):
+        """
+        Convert a PIL Image or file path into a thresholded image for Tesseract
+        
+        Returns:
+            tuple: Thresholded image and the factor to scale its coordinates by
+        """
+        gray, factor = self._load_ocr_gray(image)
+        
+        # Apply thresholding to get better text extraction
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return thresh, factor
     
     def extract_text(self, image):
         """Extract text from image using OCR"""
@@ -43,19 +118,7 @@ class ImageProcessor:
             return "OCR not available. Please install opencv-python and pytesseract."
         
         try:
-            # Convert PIL Image to OpenCV format
-            if isinstance(image, str):
-                # If image is a file path
-                cv_image = cv2.imread(image)
-            else:
-                # If image is a PIL Image
-                cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Preprocess image for better OCR
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Apply thresholding to get better text extraction
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            thresh, _ = self._prepare_ocr_image(image)
             
             # Use pytesseract to extract text
             text = pytesseract.image_to_string(thresh, config='--psm 6')
@@ -66,6 +129,86 @@ class ImageProcessor:
             logger.error(f"OCR Error: {e}")
             return f"Error extracting text: {e}"
     
+    def extract_words(self, image):
+        """
+        Extract words with their confidence and position using OCR
+        
+        Args:
+            image (PIL.Image or str): Image object or path
+            
+        Returns:
+            list: One dict per word with ``text``, ``confidence`` (0-1), ``box``
+            as [left, top, right, bottom] in original image pixels and ``line``
+            identifying its text line
+        """
+        thresh, factor = self._prepare_ocr_image(image)
+        data = pytesseract.image_to_data(thresh, config='--psm 6', output_type=pytesseract.Output.DICT)
+        
+        words = []
+        for i, text in enumerate(data['text']):
+            if not text.strip():
+                continue
+            left, top = data['left'][i], data['top'][i]
+            box = [left, top, left + data['width'][i], top + data['height'][i]]
+            words.append({
+                "text": text,
+                "confidence": max(float(data['conf'][i]), 0.0) / 100,
+                "box": [round(v * factor) for v in box],
+                "line": (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            })
+        return words
+    
+    def extract_number(self, image, region=None):
+        """
+        Read a single number from a numeric region of an image.
+
+        The built-in digit recognizer is tried first since it takes only a few
+        milliseconds; Tesseract restricted to digits is used when its reading
+        is not confident enough.
+
+        Args:
+            image (PIL.Image): Image containing the value
+            region (tuple): Optional (left, top, right, bottom) box to crop first
+
+        Returns:
+            dict: ``value``, ``text``, ``confidence`` and the ``tier`` that read
+            it ("digits" or "tesseract"), or None if nothing could be read
+        """
+        if region is not None:
+            image = image.crop(region)
+
+        reading = self.digit_recognizer.read(image)
+        if reading and reading["value"] is not None and reading["confidence"] >= self.digit_confidence:
+            return {
+                "value": reading["value"],
+                "text": reading["text"],
+                "confidence": reading["confidence"],
+                "tier": "digits"
+            }
+
+        if self.ocr_available:
+            try:
+                gray = np.array(image.convert('L'))
+                _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                text = pytesseract.image_to_string(
+                    thresh, config='--psm 7 -c tessedit_char_whitelist=0123456789,.'
+                ).strip()
+                value = parse_number(text)
+                if value is not None:
+                    return {"value": value, "text": text, "confidence": None, "tier": "tesseract"}
+            except Exception as e:
+                logger.error(f"OCR Error reading numeric region: {e}")
+
+        # Fall back to a low-confidence digit reading rather than nothing
+        if reading and reading["value"] is not None:
+            return {
+                "value": reading["value"],
+                "text": reading["text"],
+                "confidence": reading["confidence"],
+                "tier": "digits"
+            }
+        return None
+    
     def parse_fitness_data(self, text):
         """Parse fitness data from extracted text"""
         fitness_data = {}
@@ -159,39 +302,240 @@ class ImageProcessor:
         
         return fitness_data
     
-    def extract_fitness_data_from_image_ocr(self, image):
+    def extract_fitness_result_ocr(self, image):
         """
-        Extract fitness data from image using OCR as a fallback method
+        Extract fitness data with per-metric confidence using OCR
+        
+        Each metric's confidence is Tesseract's confidence in the word holding
+        its value, and the word's box is kept so the metric can be re-read later.
         
         Args:
             image (PIL.Image or str): Image object or path
             
         Returns:
-            dict: Extracted fitness data
+            dict: Extraction result (see make_extraction_result) or None
         """
         if not self.ocr_available:
             logger.warning("OCR not available for fallback extraction")
             return None
             
         try:
-            # Extract text from image
-            text = self.extract_text(image)
+            # Extract words and rebuild the text line by line
+            words = self.extract_words(image)
+            lines = {}
+            for word in words:
+                lines.setdefault(word["line"], []).append(word["text"])
+            text = "\n".join(" ".join(line) for line in lines.values())
             logger.info(f"OCR extracted text: {text[:100]}...")
             
             # Parse fitness data from text
             fitness_data = self.parse_fitness_data(text)
             
-            if fitness_data:
-                logger.info(f"OCR extracted fitness data: {fitness_data}")
-                return fitness_data
-            else:
+            if not fitness_data:
                 logger.warning("OCR could not extract any fitness data")
                 return None
+            
+            result = make_extraction_result()
+            for metric, value in fitness_data.items():
+                word = _find_value_word(words, value)
+                if word:
+                    set_metric(result, metric, value, word["confidence"], SOURCE_OCR, word["box"])
+                else:
+                    set_metric(result, metric, value, UNLOCATED_CONFIDENCE, SOURCE_OCR)
+            
+            logger.info(f"OCR extracted fitness data: {fitness_data}")
+            return result
                 
         except Exception as e:
             logger.error(f"OCR extraction error: {e}")
             logger.error(traceback.format_exc())
             return None
+    
+    def extract_fitness_data_from_image_ocr(self, image):
+        """
+        Extract fitness data from image using OCR as a fallback method
+        
+        Args:
+            image (PIL.Image or str): Image object or path
+            
+        Returns:
+            dict: Extracted fitness data
+        """
+        result = self.extract_fitness_result_ocr(image)
+        return result["data"] if result else None
+
+
+# Provenance of an extracted metric value
+SOURCE_GEMINI = "gemini"
+SOURCE_OCR = "ocr"
+SOURCE_TEMPLATE = "template"
+
+# Confidence assumed when Gemini doesn't report one for a metric
+DEFAULT_GEMINI_CONFIDENCE = 0.9
+
+# Confidence of an OCR value whose word could not be located in the image
+UNLOCATED_CONFIDENCE = 0.5
+
+# Metrics below this confidence are re-extracted from their region
+LOW_CONFIDENCE_THRESHOLD = 0.6
+
+
+def make_extraction_result():
+    """
+    Create an empty extraction result.
+    
+    ``data`` holds the metric values as returned by extract_fitness_data_from_image,
+    while ``confidence`` (0-1), ``source`` and ``regions`` ([left, top, right,
+    bottom] in pixels, when known) are keyed by the same metric names.
+    """
+    return {"data": {}, "confidence": {}, "source": {}, "regions": {}}
+
+
+def set_metric(result, metric, value, confidence, source, region=None):
+    """Record a metric value along with its confidence, provenance and region"""
+    result["data"][metric] = value
+    result["confidence"][metric] = round(float(confidence), 3)
+    result["source"][metric] = source
+    if region is not None:
+        result["regions"][metric] = [int(round(v)) for v in region]
+    else:
+        result["regions"].pop(metric, None)
+
+
+def normalize_extraction(result):
+    """
+    Rename the metrics of an extraction result to their canonical names.
+    
+    Gemini and the OCR parser use names like "total_calories"; after this the
+    data, confidence, source and regions are keyed like FitnessRecord.to_dict.
+    When a metric appears under several names the value FitnessRecord would
+    keep wins: a non-zero value under the canonical name, then the first
+    non-zero value under an alias.
+    
+    Returns:
+        dict: A new extraction result
+    """
+    normalized = make_extraction_result()
+    for key, value in result["data"].items():
+        metric = METRIC_ALIASES.get(key, key)
+        current = normalized["data"].get(metric)
+        if metric not in normalized["data"] or not current or (key == metric and value):
+            set_metric(normalized, metric, value, result["confidence"].get(key, 0),
+                       result["source"].get(key), result["regions"].get(key))
+    return normalized
+
+
+def low_confidence_metrics(result, threshold=LOW_CONFIDENCE_THRESHOLD):
+    """Return the metrics of an extraction result whose confidence is below threshold"""
+    return [metric for metric in result["data"] if result["confidence"].get(metric, 0) < threshold]
+
+
+def _find_value_word(words, value):
+    """Find the OCR word holding a parsed numeric value"""
+    for word in words:
+        if parse_number(re.sub(r'[^0-9,.]', '', word["text"])) == value:
+            return word
+    return None
+
+
+def _coerce_number(value):
+    """Convert string numbers like "1,234" to integers or floats where possible"""
+    if not isinstance(value, str):
+        return value
+    try:
+        # Try to convert to int first, then float if that fails
+        try:
+            return int(value)
+        except ValueError:
+            # Try to handle values with commas like "1,234"
+            cleaned_value = value.replace(',', '')
+            return int(cleaned_value) if cleaned_value.isdigit() else float(cleaned_value)
+    except ValueError:
+        # Keep as string if conversion fails
+        return value
+
+
+def _parse_gemini_metrics(data, image_size):
+    """
+    Convert a Gemini response into an extraction result.
+    
+    Metrics may be plain values or objects with ``value``, ``confidence`` and a
+    ``box_2d`` normalized to 0-1000 as [ymin, xmin, ymax, xmax].
+    """
+    width, height = image_size
+    result = make_extraction_result()
+    
+    for key, item in data.items():
+        confidence = DEFAULT_GEMINI_CONFIDENCE
+        region = None
+        
+        if isinstance(item, dict):
+            value = item.get("value")
+            if isinstance(item.get("confidence"), (int, float)):
+                confidence = min(max(item["confidence"], 0.0), 1.0)
+            box = item.get("box_2d")
+            if isinstance(box, list) and len(box) == 4 and all(isinstance(v, (int, float)) for v in box):
+                ymin, xmin, ymax, xmax = box
+                region = [xmin * width / 1000, ymin * height / 1000, xmax * width / 1000, ymax * height / 1000]
+        else:
+            value = item
+        
+        if value is None:
+            continue
+        set_metric(result, key, _coerce_number(value), confidence, SOURCE_GEMINI, region)
+    
+    return result
+
+
+def _pad_region(region, image_size, padding=0.15):
+    """Grow a [left, top, right, bottom] region a little, clamped to the image"""
+    left, top, right, bottom = region
+    pad = max(int((bottom - top) * padding), 2)
+    width, height = image_size
+    return (max(left - pad, 0), max(top - pad, 0), min(right + pad, width), min(bottom + pad, height))
+
+
+def reextract_metrics(image, result, metrics=None, threshold=LOW_CONFIDENCE_THRESHOLD, processor=None):
+    """
+    Re-read selected metrics from their region of the image instead of re-running
+    the whole extraction pipeline.
+    
+    Args:
+        image (PIL.Image): The image the result was extracted from
+        result (dict): Extraction result from extract_fitness_data_with_confidence
+        metrics (list): Metrics to re-read; defaults to those below threshold
+        threshold (float): Confidence below which a metric is considered unreliable
+        processor (ImageProcessor): Processor to use for reading regions
+    
+    Returns:
+        dict: A new extraction result. Automatically selected metrics are only
+        replaced by a more confident reading; explicitly requested metrics are
+        replaced by any reading at or above threshold.
+    """
+    targets = metrics if metrics is not None else low_confidence_metrics(result, threshold)
+    updated = {key: dict(value) for key, value in result.items()}
+    if not targets:
+        return updated
+    
+    processor = processor or ImageProcessor()
+    for metric in targets:
+        region = updated["regions"].get(metric)
+        if region is None:
+            logger.info(f"No region known for {metric}, cannot re-extract it")
+            continue
+        
+        reading = processor.extract_number(image, _pad_region(region, image.size))
+        if not reading:
+            continue
+        
+        source = SOURCE_TEMPLATE if reading["tier"] == "digits" else SOURCE_OCR
+        confidence = reading["confidence"] if reading["confidence"] is not None else threshold
+        current = updated["confidence"].get(metric, 0)
+        if confidence > current or (metrics is not None and confidence >= threshold):
+            logger.info(f"Re-extracted {metric}: {updated['data'].get(metric)} -> {reading['value']} ({source}, {confidence})")
+            set_metric(updated, metric, reading["value"], confidence, source, region)
+    
+    return updated
 
 
 def extract_fitness_data_from_image(image):
@@ -204,6 +548,29 @@ def extract_fitness_data_from_image(image):
     Returns:
         dict: A dictionary of extracted fitness metrics
     """
+    result = extract_fitness_data_with_confidence(image)
+    return result["data"] if result else None
+
+def _ocr_fallback(image):
+    """Run the OCR fallback extraction on an image"""
+    ocr_processor = ImageProcessor()
+    
+    # JPEGs still on disk are re-read so they can be decoded at reduced resolution
+    filename = getattr(image, 'filename', None)
+    if image.format == 'JPEG' and filename and os.path.exists(filename):
+        return ocr_processor.extract_fitness_result_ocr(filename)
+    return ocr_processor.extract_fitness_result_ocr(image)
+
+def extract_fitness_data_with_confidence(image):
+    """
+    Extract fitness data along with per-metric confidence and provenance.
+    
+    Args:
+        image (PIL.Image): The image containing fitness data
+    
+    Returns:
+        dict: Extraction result (see make_extraction_result) or None
+    """
     try:
         # Convert PIL image to bytes for Gemini API
         img_byte_arr = io.BytesIO()
@@ -236,9 +603,12 @@ def extract_fitness_data_from_image(image):
         - Sleep duration
         - Exercise duration
         
-        Format the response as a JSON object with the metrics as keys and values as numbers.
+        Format the response as a JSON object with the metrics as keys. For each metric give its
+        numeric "value", your "confidence" between 0 and 1 that the value was read correctly, and
+        the "box_2d" of the number as [ymin, xmin, ymax, xmax] normalized to 0-1000.
         Only include metrics that are clearly visible in the image.
-        Example: {"steps": 8500, "calories": 2100, "distance": 5.2}
+        Example: {"steps": {"value": 8500, "confidence": 0.95, "box_2d": [120, 80, 180, 400]},
+                  "distance": {"value": 5.2, "confidence": 0.9, "box_2d": [300, 80, 350, 260]}}
         
         If you cannot extract any fitness metrics from the image, respond with {"error": "No fitness data found in image"}
         """
@@ -278,8 +648,7 @@ def extract_fitness_data_from_image(image):
             
             # Try OCR fallback
             logger.info("Attempting OCR fallback extraction...")
-            ocr_processor = ImageProcessor()
-            return ocr_processor.extract_fitness_data_from_image_ocr(image)
+            return _ocr_fallback(image)
         
         # Check if the response indicates no fitness data was found
         if "error" in data:
@@ -287,41 +656,21 @@ def extract_fitness_data_from_image(image):
             
             # Try OCR fallback
             logger.info("Attempting OCR fallback extraction...")
-            ocr_processor = ImageProcessor()
-            ocr_data = ocr_processor.extract_fitness_data_from_image_ocr(image)
-            if ocr_data:
-                return ocr_data
-            return None
+            return _ocr_fallback(image)
             
-        # Convert string numbers to integers or floats where appropriate
-        for key, value in data.items():
-            if isinstance(value, str):
-                try:
-                    # Try to convert to int first, then float if that fails
-                    try:
-                        data[key] = int(value)
-                    except ValueError:
-                        # Try to handle values with commas like "1,234"
-                        cleaned_value = value.replace(',', '')
-                        data[key] = int(cleaned_value) if cleaned_value.isdigit() else float(cleaned_value)
-                except ValueError:
-                    # Keep as string if conversion fails
-                    pass
+        # Convert values to numbers and keep per-metric confidence and regions
+        result = _parse_gemini_metrics(data, image.size)
         
         # Validate that we have at least some fitness metrics
-        if not validate_fitness_data(data):
+        if not validate_fitness_data(result["data"]):
             logger.warning("Extracted data doesn't contain essential fitness metrics")
             
             # Try OCR fallback
             logger.info("Attempting OCR fallback extraction...")
-            ocr_processor = ImageProcessor()
-            ocr_data = ocr_processor.extract_fitness_data_from_image_ocr(image)
-            if ocr_data:
-                return ocr_data
-            return None
+            return _ocr_fallback(image)
             
-        logger.info(f"Successfully extracted fitness data: {data}")
-        return data
+        logger.info(f"Successfully extracted fitness data: {result['data']}")
+        return result
     
     except Exception as e:
         logger.error(f"Error extracting fitness data: {str(e)}")
@@ -330,8 +679,7 @@ def extract_fitness_data_from_image(image):
         # Try OCR fallback
         try:
             logger.info("Attempting OCR fallback extraction after error...")
-            ocr_processor = ImageProcessor()
-            return ocr_processor.extract_fitness_data_from_image_ocr(image)
+            return _ocr_fallback(image)
         except Exception as ocr_e:
             logger.error(f"OCR fallback also failed: {str(ocr_e)}")
             return None
@@ -374,3 +722,263 @@ def extract_from_image_path(image_path):
     except Exception as e:
         logger.error(f"Error opening image file {image_path}: {e}")
         return None
+
+
+def _frame_difference(a, b):
+    """Mean absolute difference between two grayscale thumbnails"""
+    return float(np.mean(np.abs(a - b)))
+
+
+def _scroll_offset(a, b, max_difference, step=8):
+    """
+    Vertical scroll between two keyframe strips of the same size.
+    
+    Rows at the top and bottom that are the same in both are left out.
+    Offsets are first searched every step rows on blurred strips, then the
+    best few are refined row by row, where a scroll by whole pixels matches.
+    
+    Returns:
+        int: Rows b is scrolled down from a, so b[y] matches a[y + offset], or
+        None if no offset leaving a quarter of the screen overlapping makes them match
+    """
+    # Headers and tab bars stay in place while the content scrolls; match without them
+    unchanged = np.mean(np.abs(a - b), axis=1) < max_difference
+    if unchanged.all():
+        return 0
+    top = int(np.argmin(unchanged))
+    bottom = len(a) - int(np.argmin(unchanged[::-1]))
+    a, b = a[top:bottom], b[top:bottom]
+    height = len(a)
+    min_overlap = max(1, height // 4)
+    
+    def difference(x, y, offset, rows=1):
+        if offset >= 0:
+            return _frame_difference(x[offset:][::rows], y[:height - offset][::rows])
+        return _frame_difference(x[:height + offset][::rows], y[-offset:][::rows])
+    
+    blurred_a = cv2.GaussianBlur(a.astype(np.float32), (0, 0), sigmaX=1, sigmaY=step / 2)
+    blurred_b = cv2.GaussianBlur(b.astype(np.float32), (0, 0), sigmaX=1, sigmaY=step / 2)
+    # Smallest offsets first, so flat areas that match anywhere don't jump ahead
+    coarse = sorted(range(-(height - min_overlap), height - min_overlap + 1, step), key=abs)
+    candidates = sorted(coarse, key=lambda offset: difference(blurred_a, blurred_b, offset, step))[:5]
+    
+    best_difference, best_offset = None, None
+    for candidate in candidates:
+        for offset in range(max(candidate - step, -(height - min_overlap)), min(candidate + step, height - min_overlap) + 1):
+            value = difference(a, b, offset)
+            if best_difference is None or value < best_difference:
+                best_difference, best_offset = value, offset
+    return best_offset if best_difference is not None and best_difference < max_difference else None
+
+
+def _keyframe_strip(frame):
+    """Grayscale frame narrowed to KEYFRAME_THUMB_WIDTH, keeping every row for scroll offsets"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (KEYFRAME_THUMB_WIDTH, gray.shape[0]), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def _covering_keyframes(strips, still_threshold, max_keyframes):
+    """
+    Pick the fewest keyframes that still show everything the others show.
+    
+    Consecutive keyframes that overlap after scrolling are placed on one
+    page, each covering the rows from its scroll position down one screen;
+    a keyframe matching no offset starts a new page. Per page, the greedy
+    interval cover keeps the keyframes reaching furthest down. If that is
+    still more than max_keyframes, the keyframes adding the fewest uncovered
+    rows are dropped and a warning says so.
+    
+    Args:
+        strips (list): Keyframes as returned by _keyframe_strip, in order
+        still_threshold (float): Difference below which scrolled keyframes match
+        max_keyframes (int): Upper bound on the number of keyframes kept
+    
+    Returns:
+        list: Indices of the keyframes to keep, in order
+    """
+    pages = []
+    for index, strip in enumerate(strips):
+        offset = _scroll_offset(strips[index - 1], strip, still_threshold) if index else None
+        if offset is None:
+            pages.append([(0, len(strip), index)])
+        else:
+            top = pages[-1][-1][0] + offset
+            pages[-1].append((top, top + len(strip), index))
+    
+    rows = {}
+    for page_number, intervals in enumerate(pages):
+        reach = None
+        remaining = sorted(intervals)
+        position = 0
+        while position < len(remaining):
+            # Past a gap the next keyframe starts a new stretch
+            limit = remaining[position][0] if reach is None or remaining[position][0] > reach else reach
+            best = None
+            while position < len(remaining) and remaining[position][0] <= limit:
+                if best is None or remaining[position][1] > best[1]:
+                    best = remaining[position]
+                position += 1
+            if reach is None or best[1] > reach:
+                rows[best[2]] = {(page_number, row) for row in range(best[0], best[1])}
+                reach = best[1]
+    
+    def unique_rows(index):
+        others = set().union(*(covered for other, covered in rows.items() if other != index))
+        return len(rows[index] - others)
+    
+    while len(rows) > max_keyframes:
+        dropped = min(rows, key=unique_rows)
+        logger.warning(f"More than {max_keyframes} keyframes needed to cover the recording; "
+                       f"dropping one with {unique_rows(dropped)} rows of its own")
+        del rows[dropped]
+    
+    return sorted(rows)
+
+
+def select_keyframes(video_path, sample_fps=4.0, change_threshold=10.0, still_threshold=2.0,
+                     max_keyframes=8):
+    """
+    Select a minimal set of frames covering the content of a screen recording.
+    
+    Frames are sampled at sample_fps and compared as small grayscale thumbnails.
+    A frame becomes a keyframe once it differs enough from the previous keyframe
+    to show new content, preferably when scrolling has paused so the text isn't
+    motion blurred. Only sampled frames are converted, the rest are just grabbed.
+    Keyframes whose content other keyframes already show are then dropped, see
+    _covering_keyframes.
+    
+    Args:
+        video_path (str): Path to the video file
+        sample_fps (float): How many frames per second of video to look at
+        change_threshold (float): Difference from the last keyframe (0-255 scale)
+            at which a frame is considered to show new content
+        still_threshold (float): Difference from the previous sample below which
+            the screen is considered to be at rest
+        max_keyframes (int): Upper bound on the number of frames returned; more
+            are only dropped with a warning once none is redundant
+    
+    Returns:
+        list: Keyframes as BGR numpy arrays
+    """
+    if not CV_AVAILABLE:
+        logger.warning("OpenCV not available for video ingestion")
+        return []
+    
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        logger.error(f"Could not open video file {video_path}")
+        return []
+    
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    stride = max(1, int(round(fps / sample_fps)))
+    
+    keyframes = []
+    last_key_thumb = None
+    previous_thumb = None
+    pending = None
+    index = 0
+    
+    try:
+        while capture.grab():
+            index += 1
+            if (index - 1) % stride:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+            
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            height = max(1, gray.shape[0] * KEYFRAME_THUMB_WIDTH // gray.shape[1])
+            thumb = cv2.resize(gray, (KEYFRAME_THUMB_WIDTH, height), interpolation=cv2.INTER_AREA).astype(np.int16)
+            
+            motion = _frame_difference(thumb, previous_thumb) if previous_thumb is not None else 0.0
+            previous_thumb = thumb
+            
+            novelty = _frame_difference(thumb, last_key_thumb) if last_key_thumb is not None else float('inf')
+            if novelty < change_threshold:
+                # Nothing new since the last keyframe
+                continue
+            
+            # Take the frame once scrolling pauses, or anyway if content is about
+            # to scroll past without the screen ever coming to rest
+            if motion <= still_threshold or novelty >= 3 * change_threshold:
+                keyframes.append(frame)
+                last_key_thumb = thumb
+                pending = None
+            else:
+                pending = (frame, thumb)
+    finally:
+        capture.release()
+    
+    # Content revealed while still scrolling at the very end of the recording
+    if pending is not None:
+        keyframes.append(pending[0])
+    
+    candidates = len(keyframes)
+    strips = [_keyframe_strip(frame) for frame in keyframes]
+    keyframes = [keyframes[i] for i in _covering_keyframes(strips, still_threshold, max_keyframes)]
+    
+    logger.info(f"Selected {len(keyframes)} of {candidates} keyframes from {index} frames of {video_path}")
+    return keyframes
+
+
+def merge_extraction_results(results):
+    """
+    Merge extraction results from several images of the same day's data.
+    
+    For each metric the most confident value wins. Regions are dropped, since
+    they refer to different images.
+    
+    Args:
+        results (list): Extraction results, None entries are skipped
+    
+    Returns:
+        dict: Merged extraction result, or None if there was nothing to merge
+    """
+    merged = make_extraction_result()
+    for result in results:
+        if not result:
+            continue
+        for metric, value in result["data"].items():
+            confidence = result["confidence"].get(metric, 0)
+            if metric not in merged["data"] or confidence > merged["confidence"][metric]:
+                set_metric(merged, metric, value, confidence, result["source"].get(metric))
+    
+    return merged if merged["data"] else None
+
+
+def extract_video_with_confidence(video_path, **keyframe_options):
+    """
+    Extract fitness data from a screen recording of a health app.
+    
+    Args:
+        video_path (str): Path to the video file
+        **keyframe_options: Passed on to select_keyframes
+    
+    Returns:
+        dict: Merged extraction result of all keyframes, or None
+    """
+    keyframes = select_keyframes(video_path, **keyframe_options)
+    results = []
+    for frame in keyframes:
+        image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        results.append(extract_fitness_data_with_confidence(image))
+    return merge_extraction_results(results)
+
+
+def extract_from_video_path(video_path):
+    """
+    Helper function to extract data from a video file path
+    
+    Args:
+        video_path (str): Path to the video file
+        
+    Returns:
+        dict: Extracted fitness data or None if extraction fails
+    """
+    try:
+        result = extract_video_with_confidence(video_path)
+        return result["data"] if result else None
+    except Exception as e:
+        logger.error(f"Error processing video file {video_path}: {e}")
+        return None
@@ -0,0 +1,160 @@
+import math
+import random
+from bisect import bisect_right
+
+# Size of the largest compactor; the rank error is roughly 1.7 / k
+DEFAULT_K = 200
+
+# Each lower compactor holds this fraction of the one above it
+CAPACITY_RATIO = 2 / 3
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty, 2016).
+
+    Values are kept in a stack of compactors. Items at level h stand for
+    2 ** h values; when a level fills up it is sorted and every other item
+    moves up a level. The sketch holds O(k log(n / k)) items, answers rank
+    queries with an error of about 1.7 / k, and two sketches merge into one
+    with the same guarantee, so sketches per user or per month can be
+    combined into any cohort.
+    """
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.count = 0
+        self.minimum = None
+        self.maximum = None
+        self.levels = [[]]
+        self.size = 0
+        self.max_size = self._capacity(0)
+        self._ranks = None
+
+    def _capacity(self, height):
+        """Items level height may hold before it is compacted"""
+        depth = len(self.levels) - height - 1
+        return int(math.ceil(self.k * CAPACITY_RATIO ** depth)) + 1
+
+    def _grow(self):
+        self.levels.append([])
+        self.max_size = sum(self._capacity(height) for height in range(len(self.levels)))
+
+    def _compress(self):
+        """Compact the lowest full level into the one above it"""
+        for height, level in enumerate(self.levels):
+            if len(level) >= self._capacity(height):
+                if height + 1 == len(self.levels):
+                    self._grow()
+                level.sort()
+                # An odd item out stays behind at this level
+                leftover = [level.pop()] if len(level) % 2 else []
+                self.levels[height + 1].extend(level[random.getrandbits(1)::2])
+                self.levels[height] = leftover
+                break
+        self.size = sum(len(level) for level in self.levels)
+
+    def update(self, value):
+        """Add a value to the sketch"""
+        value = float(value)
+        self.levels[0].append(value)
+        self.size += 1
+        self.count += 1
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if self.size >= self.max_size:
+            self._compress()
+        self._ranks = None
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+
+        Args:
+            other (KLLSketch): Sketch of another set of values
+
+        Returns:
+            KLLSketch: This sketch, now summarizing both sets
+        """
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for height, level in enumerate(other.levels):
+            self.levels[height].extend(level)
+        self.count += other.count
+        if other.minimum is not None:
+            self.minimum = other.minimum if self.minimum is None else min(self.minimum, other.minimum)
+            self.maximum = other.maximum if self.maximum is None else max(self.maximum, other.maximum)
+        self.size = sum(len(level) for level in self.levels)
+        while self.size >= self.max_size:
+            self._compress()
+        self._ranks = None
+        return self
+
+    def _cumulative(self):
+        """Sorted items with the cumulative weight up to each, built once per change"""
+        if self._ranks is None:
+            weighted = sorted((value, 1 << height) for height, level in enumerate(self.levels) for value in level)
+            values = [value for value, _ in weighted]
+            cumulative = []
+            total = 0
+            for _, weight in weighted:
+                total += weight
+                cumulative.append(total)
+            self._ranks = (values, cumulative, total)
+        return self._ranks
+
+    def rank(self, value):
+        """
+        Estimate the fraction of values less than or equal to value.
+
+        Returns:
+            float: Rank between 0 and 1, or None for an empty sketch
+        """
+        if not self.count:
+            return None
+        values, cumulative, total = self._cumulative()
+        index = bisect_right(values, value)
+        return cumulative[index - 1] / total if index else 0.0
+
+    def quantile(self, fraction):
+        """
+        Estimate the value at a given rank.
+
+        Args:
+            fraction (float): Rank between 0 and 1, e.g. 0.5 for the median
+
+        Returns:
+            float: The estimated value, or None for an empty sketch
+        """
+        if not self.count:
+            return None
+        values, cumulative, total = self._cumulative()
+        index = bisect_right(cumulative, fraction * total)
+        return values[min(index, len(values) - 1)]
+
+    def to_dict(self):
+        """Serialize the sketch for storage"""
+        return {
+            "k": self.k,
+            "count": self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+            "levels": self.levels
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Restore a sketch serialized with to_dict"""
+        sketch = cls(state["k"])
+        sketch.levels = [[]]
+        for _ in range(len(state["levels"]) - 1):
+            sketch._grow()
+        sketch.levels = [list(level) for level in state["levels"]]
+        sketch.count = state["count"]
+        sketch.minimum = state["min"]
+        sketch.maximum = state["max"]
+        sketch.size = sum(len(level) for level in sketch.levels)
+        return sketch
+
+    def __len__(self):
+        return self.count
@@ -1,80 +1,58 @@
-from health_analyzer import HealthAnalyzer
+from health_analyzer import FOOD_PLANS, EXERCISE_PLANS
 
-def generate_recommendations(analysis_results):
-    """
-    Generate personalized health recommendations based on analysis results.
-    
-    Args:
-        analysis_results (dict): Dictionary containing analyzed health metrics
-    
-    Returns:
-        dict: Dictionary with personalized recommendations
-    """
-    analyzer = HealthAnalyzer()
-    recommendations = {
-        "activity": "",
-        "nutrition": "",
-        "wellness": ""
-    }
-    
-    # Get the activity level and fitness score
-    activity_level = analysis_results.get("activity_level", "Unknown")
-    calorie_burn = analysis_results.get("calorie_burn", "Unknown")
-    fitness_score = analysis_results.get("fitness_score", 0)
-    overall_fitness = analysis_results.get("overall_fitness", "Unknown")
-    
-    # Get insights
-    insights = analysis_results.get("insights", [])
-    meditation_time = analysis_results.get("meditation_time", 10)
-    
-    # Activity recommendations based on activity level
-    if activity_level == "Sedentary":
-        recommendations["activity"] = """
+# Recommendations are stored as template ids plus the few parameters that vary
+# per analysis, and rendered into markdown only when they are displayed.
+#
+#   {"template_ids": {"activity": "sedentary", "exercise_plan": "plan_high",
+#                     "nutrition": "low", "meal_plan": "plan_high", "wellness": "building"},
+#    "params": {"meditation_time": 15, "insights": [...]}}
+#
+# Rows written before templates existed hold the rendered markdown under
+# "activity", "nutrition" and "wellness" and are returned as they are.
+
+# Activity recommendations based on activity level
+ACTIVITY_TEMPLATES = {
+    "sedentary": """
 ### Activity Recommendations
 - Start with a goal of 5,000 steps per day
 - Take short 5-10 minute walks throughout the day
 - Try gentle activities like yoga or swimming
 - Consider using a standing desk for part of your workday
 - Set a reminder to move for 5 minutes every hour
-        """
-    elif activity_level == "Low Active":
-        recommendations["activity"] = """
+        """,
+    "low_active": """
 ### Activity Recommendations
 - Aim to increase your daily steps to 7,500
 - Add a 20-minute brisk walk to your daily routine
 - Try bodyweight exercises like squats and push-ups
 - Consider joining a fitness class once a week
 - Take the stairs instead of elevators when possible
-        """
-    elif activity_level == "Somewhat Active":
-        recommendations["activity"] = """
+        """,
+    "somewhat_active": """
 ### Activity Recommendations
 - Push toward the 10,000 steps per day milestone
 - Incorporate 30 minutes of moderate exercise 5 days a week
 - Add strength training 2-3 times per week
 - Try interval training to boost cardiovascular fitness
 - Consider weekend hikes or longer recreational activities
-        """
-    elif activity_level == "Active":
-        recommendations["activity"] = """
+        """,
+    "active": """
 ### Activity Recommendations
 - Maintain your excellent activity level of 10,000+ steps
 - Add variety to your routine with different exercise modalities
 - Consider training for a 5K or 10K event
 - Incorporate active recovery days with light activity
 - Try more challenging strength training or HIIT workouts
-        """
-    elif activity_level == "Very Active":
-        recommendations["activity"] = """
+        """,
+    "very_active": """
 ### Activity Recommendations
 - Your activity level is exceptional - focus on quality and recovery
 - Consider periodization in your training to prevent plateaus
 - Add flexibility and mobility work to prevent injuries
 - Try new challenging activities like rock climbing or martial arts
 - Consider training for a half-marathon or other endurance event
-        """
-    else:
-        recommendations["activity"] = """
+        """,
+    "general": """
 ### Activity Recommendations
 - Aim for at least 30 minutes of moderate activity daily
 - Try to accumulate 150 minutes of exercise per week
@@ -82,28 +60,35 @@ def generate_recommendations(analysis_results):
 - Take regular breaks from sitting throughout the day
 - Find activities you enjoy to make exercise sustainable
         """
-    
-    # Nutrition recommendations based on calorie burn
-    if calorie_burn == "Low":
-        recommendations["nutrition"] = """
+}
+
+ACTIVITY_LEVEL_IDS = {
+    "Sedentary": "sedentary",
+    "Low Active": "low_active",
+    "Somewhat Active": "somewhat_active",
+    "Active": "active",
+    "Very Active": "very_active"
+}
+
+# Nutrition recommendations based on calorie burn
+NUTRITION_TEMPLATES = {
+    "low": """
 ### Nutrition Recommendations
 - Focus on nutrient-dense, lower-calorie foods
 - Ensure adequate protein intake (0.8g per kg of body weight)
 - Include plenty of vegetables and fruits for essential nutrients
 - Consider intermittent fasting or time-restricted eating
 - Stay hydrated with at least 8 glasses of water daily
-        """
-    elif calorie_burn == "Moderate":
-        recommendations["nutrition"] = """
+        """,
+    "moderate": """
 ### Nutrition Recommendations
 - Balance your macronutrients (protein, carbs, and fats)
 - Eat regular meals to maintain energy throughout the day
 - Include complex carbohydrates for sustained energy
 - Ensure adequate protein for muscle recovery
 - Consider a pre-workout snack for energy during exercise
-        """
-    elif calorie_burn == "High" or calorie_burn == "Very High":
-        recommendations["nutrition"] = """
+        """,
+    "high": """
 ### Nutrition Recommendations
 - Increase caloric intake to match your high activity level
 - Focus on post-workout nutrition for recovery
@@ -111,9 +96,8 @@ def generate_recommendations(analysis_results):
 - Ensure higher protein intake (1.2-1.6g per kg of body weight)
 - Include healthy fats for sustained energy
 - Stay extra hydrated and consider electrolyte replacement
-        """
-    else:
-        recommendations["nutrition"] = """
+        """,
+    "general": """
 ### Nutrition Recommendations
 - Eat a balanced diet with plenty of whole foods
 - Include protein with each meal for satiety and muscle health
@@ -121,10 +105,18 @@ def generate_recommendations(analysis_results):
 - Include healthy fats like avocados, nuts, and olive oil
 - Stay hydrated and limit sugary beverages
         """
-    
-    # Wellness recommendations based on overall fitness
-    if overall_fitness == "Needs Improvement" or overall_fitness == "Fair":
-        recommendations["wellness"] = f"""
+}
+
+CALORIE_BURN_IDS = {
+    "Low": "low",
+    "Moderate": "moderate",
+    "High": "high",
+    "Very High": "high"
+}
+
+# Wellness recommendations based on overall fitness
+WELLNESS_TEMPLATES = {
+    "building": """
 ### Wellness Recommendations
 - Focus on consistency rather than intensity
 - Celebrate small victories and progress
@@ -132,18 +124,16 @@ def generate_recommendations(analysis_results):
 - We recommend {meditation_time} minutes of meditation daily to manage stress
 - Find an accountability partner or group for motivation
 - Consider working with a fitness professional to create a personalized plan
-        """
-    elif overall_fitness == "Good":
-        recommendations["wellness"] = f"""
+        """,
+    "good": """
 ### Wellness Recommendations
 - Add variety to your routine to prevent plateaus
 - Focus on quality sleep and recovery
 - Practice mindfulness or meditation for {meditation_time} minutes daily
 - Track your progress to stay motivated
 - Set specific, measurable goals for the next month
-        """
-    elif overall_fitness == "Very Good" or overall_fitness == "Excellent":
-        recommendations["wellness"] = f"""
+        """,
+    "excellent": """
 ### Wellness Recommendations
 - Focus on recovery and preventing overtraining
 - Consider advanced recovery techniques like contrast therapy
@@ -151,9 +141,8 @@ def generate_recommendations(analysis_results):
 - Practice mindfulness and meditation for {meditation_time} minutes daily
 - Set challenging but realistic goals for continued improvement
 - Consider helping others by sharing your fitness journey
-        """
-    else:
-        recommendations["wellness"] = f"""
+        """,
+    "general": """
 ### Wellness Recommendations
 - Prioritize 7-9 hours of quality sleep
 - Practice stress management through meditation ({meditation_time} min/day) or deep breathing
@@ -161,43 +150,35 @@ def generate_recommendations(analysis_results):
 - Stay socially connected for mental well-being
 - Set realistic, achievable health goals
         """
-    
-    # Add health insights if available
-    if insights:
-        recommendations["wellness"] = recommendations["wellness"] + "\n\n### Health Insights\n" + "\n".join([f"- {insight}" for insight in insights])
-    
-    # Add a sample meal plan based on calorie burn and food recommendations
-    if "food_recommendations" in analysis_results:
-        food_recs = analysis_results["food_recommendations"]
-        recommendations["nutrition"] += """
-        
-#### Sample Meal Plan
-- **Breakfast**: """ + food_recs["breakfast"][0] + """
-- **Lunch**: """ + food_recs["lunch"][0] + """
-- **Dinner**: """ + food_recs["dinner"][0] + """
-- **Snacks**: """ + food_recs["snacks"][0]
-    else:
-        # Add a sample meal plan based on calorie burn
-        if calorie_burn == "Low":
-            recommendations["nutrition"] += """
+}
+
+OVERALL_FITNESS_IDS = {
+    "Needs Improvement": "building",
+    "Fair": "building",
+    "Good": "good",
+    "Very Good": "excellent",
+    "Excellent": "excellent"
+}
+
+# Sample meal plans for analyses without food recommendations, by calorie burn
+MEAL_PLAN_TEMPLATES = {
+    "low": """
             
 #### Sample Meal Plan (Low Calorie Burn)
 - **Breakfast**: Greek yogurt with berries and a sprinkle of granola
 - **Lunch**: Large salad with lean protein and light dressing
 - **Dinner**: Baked fish with roasted vegetables
 - **Snacks**: Apple slices with a small amount of nut butter
-            """
-        elif calorie_burn == "Moderate":
-            recommendations["nutrition"] += """
+            """,
+    "moderate": """
             
 #### Sample Meal Plan (Moderate Calorie Burn)
 - **Breakfast**: Oatmeal with fruit, nuts, and a scoop of protein powder
 - **Lunch**: Whole grain wrap with lean protein, veggies, and hummus
 - **Dinner**: Stir-fry with lean meat or tofu, plenty of vegetables, and brown rice
 - **Snacks**: Greek yogurt with honey, handful of nuts and seeds
-            """
-        elif calorie_burn == "High" or calorie_burn == "Very High":
-            recommendations["nutrition"] += """
+            """,
+    "high": """
             
 #### Sample Meal Plan (High Calorie Burn)
 - **Breakfast**: Eggs with whole grain toast, avocado, and fruit
@@ -205,25 +186,13 @@ def generate_recommendations(analysis_results):
 - **Dinner**: Lean protein with sweet potato, vegetables, and healthy fats
 - **Snacks**: Protein smoothie, trail mix, banana with nut butter
 - **Post-workout**: Protein shake with fruit and a source of carbohydrates
-            """
-    
-    # Add a weekly exercise plan based on activity level and exercise recommendations
-    if "exercise_recommendations" in analysis_results:
-        ex_recs = analysis_results["exercise_recommendations"]
-        recommendations["activity"] += """
-        
-#### Sample Weekly Exercise Plan
-- **Monday**: """ + ex_recs["cardio"][0] + """
-- **Tuesday**: """ + ex_recs["strength"][0] + """
-- **Wednesday**: Active recovery or """ + ex_recs["flexibility"][0] + """
-- **Thursday**: """ + ex_recs["strength"][1] + """
-- **Friday**: """ + ex_recs["cardio"][1] + """
-- **Weekend**: One longer workout and one recovery day
-        """
-    else:
-        # Add a weekly exercise plan based on activity level
-        if activity_level == "Sedentary" or activity_level == "Low Active":
-            recommendations["activity"] += """
+            """,
+    "none": ""
+}
+
+# Sample weekly exercise plans for analyses without exercise recommendations, by activity level
+EXERCISE_PLAN_TEMPLATES = {
+    "beginner": """
             
 #### Sample Weekly Exercise Plan (Beginner)
 - **Monday**: 15-minute walk
@@ -232,9 +201,8 @@ def generate_recommendations(analysis_results):
 - **Thursday**: Rest or gentle yoga
 - **Friday**: 20-minute walk
 - **Weekend**: One 30-minute recreational activity like swimming or cycling
-            """
-        elif activity_level == "Somewhat Active":
-            recommendations["activity"] += """
+            """,
+    "intermediate": """
             
 #### Sample Weekly Exercise Plan (Intermediate)
 - **Monday**: 30-minute brisk walk or jog
@@ -243,9 +211,8 @@ def generate_recommendations(analysis_results):
 - **Thursday**: Yoga or flexibility training
 - **Friday**: 30-minute interval training
 - **Weekend**: One longer (45-60 min) recreational activity
-            """
-        elif activity_level == "Active" or activity_level == "Very Active":
-            recommendations["activity"] += """
+            """,
+    "advanced": """
             
 #### Sample Weekly Exercise Plan (Advanced)
 - **Monday**: 45-minute run or high-intensity cardio
@@ -254,6 +221,249 @@ def generate_recommendations(analysis_results):
 - **Thursday**: Strength training focusing on lower body
 - **Friday**: 30-minute recovery cardio and mobility work
 - **Weekend**: One challenging workout (long run, hike, cycling) and one active recovery day
-            """
-    
-    return recommendations
+            """,
+    "none": ""
+}
+
+EXERCISE_PLAN_LEVELS = {
+    "Sedentary": "beginner",
+    "Low Active": "beginner",
+    "Somewhat Active": "intermediate",
+    "Active": "advanced",
+    "Very Active": "advanced"
+}
+
+# Template id prefix of plans rendered from the analysis' own food or exercise recommendations
+PLAN_PREFIX = "plan_"
+
+
+def render_meal_plan(food_recs):
+    """Render the sample meal plan of a food recommendations dict"""
+    return """
+        
+#### Sample Meal Plan
+- **Breakfast**: """ + food_recs["breakfast"][0] + """
+- **Lunch**: """ + food_recs["lunch"][0] + """
+- **Dinner**: """ + food_recs["dinner"][0] + """
+- **Snacks**: """ + food_recs["snacks"][0]
+
+
+def render_exercise_plan(ex_recs):
+    """Render the sample weekly exercise plan of an exercise recommendations dict"""
+    return """
+        
+#### Sample Weekly Exercise Plan
+- **Monday**: """ + ex_recs["cardio"][0] + """
+- **Tuesday**: """ + ex_recs["strength"][0] + """
+- **Wednesday**: Active recovery or """ + ex_recs["flexibility"][0] + """
+- **Thursday**: """ + ex_recs["strength"][1] + """
+- **Friday**: """ + ex_recs["cardio"][1] + """
+- **Weekend**: One longer workout and one recovery day
+        """
+
+
+def _plan_texts():
+    """Render the sample plans of every plan template id"""
+    meal_plans = dict(MEAL_PLAN_TEMPLATES)
+    meal_plans.update({PLAN_PREFIX + tier: render_meal_plan(plan) for tier, plan in FOOD_PLANS.items()})
+    exercise_plans = dict(EXERCISE_PLAN_TEMPLATES)
+    exercise_plans.update({PLAN_PREFIX + tier: render_exercise_plan(plan) for tier, plan in EXERCISE_PLANS.items()})
+    return meal_plans, exercise_plans
+
+
+# Sample plan texts by template id, including plans rendered from FOOD_PLANS and EXERCISE_PLANS
+MEAL_PLAN_TEXTS, EXERCISE_PLAN_TEXTS = _plan_texts()
+
+# Every activity and nutrition text, keyed by (section id, plan id); built once per process
+CATALOG = {
+    "activity": {
+        (section, plan): text + plan_text
+        for section, text in ACTIVITY_TEMPLATES.items()
+        for plan, plan_text in EXERCISE_PLAN_TEXTS.items()
+    },
+    "nutrition": {
+        (section, plan): text + plan_text
+        for section, text in NUTRITION_TEMPLATES.items()
+        for plan, plan_text in MEAL_PLAN_TEXTS.items()
+    }
+}
+
+
+def recommendation_templates():
+    """
+    Return every template by template id, for clients that render recommendations themselves.
+
+    Activity and nutrition are the section template followed by the sample
+    plan; a "custom" plan comes rendered in the params. Wellness templates
+    take {meditation_time} and are followed by the health insights.
+    """
+    return {
+        "activity": ACTIVITY_TEMPLATES,
+        "exercise_plan": EXERCISE_PLAN_TEXTS,
+        "nutrition": NUTRITION_TEMPLATES,
+        "meal_plan": MEAL_PLAN_TEXTS,
+        "wellness": WELLNESS_TEMPLATES
+    }
+
+
+def _plan_id(recs, plans):
+    """Template id of a food or exercise recommendations dict, or None for a custom plan"""
+    for tier, plan in plans.items():
+        if all(tuple(recs.get(key, ())) == options for key, options in plan.items()):
+            return PLAN_PREFIX + tier
+    return None
+
+
+def recommendation_ids(analysis_results):
+    """
+    Pick the recommendation templates for analysis results.
+
+    Args:
+        analysis_results (dict): Dictionary containing analyzed health metrics
+
+    Returns:
+        dict: ``template_ids`` of every section and the ``params`` they are
+        rendered with, see render_recommendations
+    """
+    activity_level = analysis_results.get("activity_level", "Unknown")
+    calorie_burn = analysis_results.get("calorie_burn", "Unknown")
+    overall_fitness = analysis_results.get("overall_fitness", "Unknown")
+
+    params = {
+        "meditation_time": analysis_results.get("meditation_time", 10),
+        "insights": list(analysis_results.get("insights", []))
+    }
+
+    # Sample plans follow the analysis' own food and exercise recommendations when it has them
+    if "food_recommendations" in analysis_results:
+        meal_plan = _plan_id(analysis_results["food_recommendations"], FOOD_PLANS)
+        if meal_plan is None:
+            meal_plan = "custom"
+            params["meal_plan"] = render_meal_plan(analysis_results["food_recommendations"])
+    else:
+        meal_plan = CALORIE_BURN_IDS.get(calorie_burn, "none")
+
+    if "exercise_recommendations" in analysis_results:
+        exercise_plan = _plan_id(analysis_results["exercise_recommendations"], EXERCISE_PLANS)
+        if exercise_plan is None:
+            exercise_plan = "custom"
+            params["exercise_plan"] = render_exercise_plan(analysis_results["exercise_recommendations"])
+    else:
+        exercise_plan = EXERCISE_PLAN_LEVELS.get(activity_level, "none")
+
+    return {
+        "template_ids": {
+            "activity": ACTIVITY_LEVEL_IDS.get(activity_level, "general"),
+            "exercise_plan": exercise_plan,
+            "nutrition": CALORIE_BURN_IDS.get(calorie_burn, "general"),
+            "meal_plan": meal_plan,
+            "wellness": OVERALL_FITNESS_IDS.get(overall_fitness, "general")
+        },
+        "params": params
+    }
+
+
+def is_recommendation_reference(recommendations):
+    """Whether stored recommendations are template ids rather than rendered markdown"""
+    return isinstance(recommendations, dict) and "template_ids" in recommendations
+
+
+def render_recommendations(recommendations):
+    """
+    Render recommendations stored as template ids into markdown.
+
+    Args:
+        recommendations (dict): Result of recommendation_ids, or already
+            rendered recommendations, which are returned as they are
+
+    Returns:
+        dict: Markdown for "activity", "nutrition" and "wellness"
+    """
+    if not is_recommendation_reference(recommendations):
+        return recommendations
+
+    ids = recommendations["template_ids"]
+    params = recommendations["params"]
+
+    if ids["exercise_plan"] == "custom":
+        activity = ACTIVITY_TEMPLATES[ids["activity"]] + params["exercise_plan"]
+    else:
+        activity = CATALOG["activity"][(ids["activity"], ids["exercise_plan"])]
+
+    if ids["meal_plan"] == "custom":
+        nutrition = NUTRITION_TEMPLATES[ids["nutrition"]] + params["meal_plan"]
+    else:
+        nutrition = CATALOG["nutrition"][(ids["nutrition"], ids["meal_plan"])]
+
+    wellness = WELLNESS_TEMPLATES[ids["wellness"]].format(meditation_time=params["meditation_time"])
+
+    # Add health insights if available
+    if params["insights"]:
+        wellness = wellness + "\n\n### Health Insights\n" + "\n".join([f"- {insight}" for insight in params["insights"]])
+
+    return {
+        "activity": activity,
+        "nutrition": nutrition,
+        "wellness": wellness
+    }
+
+
+def generate_recommendations(analysis_results):
+    """
+    Generate personalized health recommendations based on analysis results.
+
+    Args:
+        analysis_results (dict): Dictionary containing analyzed health metrics
+
+    Returns:
+        dict: Dictionary with personalized recommendations
+    """
+    return render_recommendations(recommendation_ids(analysis_results))
+
+
+def _group_key(analysis_results):
+    """
+    Hashable key of everything the recommendations of analysis results depend on.
+
+    Only the options of the food and exercise plans that end up in the
+    sample plans are part of the key.
+    """
+    food_recs = analysis_results.get("food_recommendations")
+    ex_recs = analysis_results.get("exercise_recommendations")
+    return (
+        analysis_results.get("activity_level", "Unknown"),
+        analysis_results.get("calorie_burn", "Unknown"),
+        analysis_results.get("overall_fitness", "Unknown"),
+        analysis_results.get("meditation_time", 10),
+        tuple(analysis_results.get("insights", [])),
+        (food_recs["breakfast"][0], food_recs["lunch"][0], food_recs["dinner"][0], food_recs["snacks"][0])
+        if food_recs is not None else None,
+        (ex_recs["cardio"][0], ex_recs["cardio"][1], ex_recs["strength"][0], ex_recs["strength"][1],
+         ex_recs["flexibility"][0])
+        if ex_recs is not None else None
+    )
+
+
+def generate_recommendations_batch(analyses):
+    """
+    Generate recommendations for many analyses, rendering each distinct combination once.
+
+    Analyses are grouped by the values their recommendations depend on, which
+    take few distinct values across a history.
+
+    Args:
+        analyses (iterable): Analysis results dicts
+
+    Returns:
+        list: Recommendations for each analysis, in order. Analyses with the
+        same recommendations share one dict, so copy it before modifying it.
+    """
+    rendered = {}
+    results = []
+    for analysis_results in analyses:
+        key = _group_key(analysis_results)
+        recommendations = rendered.get(key)
+        if recommendations is None:
+            recommendations = rendered[key] = generate_recommendations(analysis_results)
+        results.append(recommendations)
+    return results
@@ -0,0 +1,231 @@
+import json
+
+# Canonical name of every metric key seen from Gemini and the OCR parser
+METRIC_ALIASES = {
+    "steps": "steps",
+    "step_count": "steps",
+    "calories": "calories",
+    "total_calories": "calories",
+    "calories_burned": "calories",
+    "distance": "distance",
+    "active_minutes": "active_minutes",
+    "exercise_duration": "active_minutes",
+    "stairs": "stairs",
+    "floors": "stairs",
+    "heart_rate": "heart_rate",
+    "sleep": "sleep",
+    "sleep_duration": "sleep",
+}
+
+
+def _number(value):
+    """Return value as an int or float, or None if it isn't a number"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        cleaned = value.replace(",", "").strip()
+        try:
+            number = float(cleaned)
+        except ValueError:
+            return None
+        return int(number) if number.is_integer() and "." not in cleaned else number
+    return None
+
+
+class FitnessRecord:
+    """
+    Fitness metrics of one reading with normalized field names.
+
+    Known metrics are slots holding a number or None, so "calories" and
+    "total_calories" are the same field and a record costs a fraction of the
+    dict it replaces. Unrecognized keys are kept in ``extra``.
+    """
+
+    __slots__ = ("steps", "calories", "distance", "active_minutes", "stairs", "heart_rate", "sleep", "extra")
+
+    FIELDS = ("steps", "calories", "distance", "active_minutes", "stairs", "heart_rate", "sleep")
+
+    def __init__(self, steps=None, calories=None, distance=None, active_minutes=None,
+                 stairs=None, heart_rate=None, sleep=None, extra=None):
+        self.steps = steps
+        self.calories = calories
+        self.distance = distance
+        self.active_minutes = active_minutes
+        self.stairs = stairs
+        self.heart_rate = heart_rate
+        self.sleep = sleep
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a fitness data dict.
+
+        Args:
+            data (dict): Fitness metrics as extracted from an image
+
+        Returns:
+            FitnessRecord: The normalized record. When a metric appears under
+            several names a non-zero value under the canonical name wins, then
+            the first non-zero value under an alias.
+        """
+        record = cls()
+        extra = None
+        for key, value in data.items():
+            field = METRIC_ALIASES.get(key)
+            number = value if type(value) in (int, float) else _number(value)
+            if field is None or number is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            current = getattr(record, field)
+            if not current or (key == field and number):
+                setattr(record, field, number)
+        record.extra = extra
+        return record
+
+    @classmethod
+    def coerce(cls, data):
+        """Return data as a FitnessRecord, converting dicts"""
+        return data if isinstance(data, cls) else cls.from_dict(data)
+
+    def to_dict(self):
+        """Return the metrics that are present as a plain dict"""
+        data = {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def __bool__(self):
+        """A record is empty when it holds no metrics at all"""
+        return any(getattr(self, name) is not None for name in self.__slots__)
+
+    def __eq__(self, other):
+        if not isinstance(other, FitnessRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"FitnessRecord({self.to_dict()})"
+
+
+class AnalysisRecord:
+    """
+    Result of analyzing one FitnessRecord.
+
+    to_dict produces the analysis_results dict the API and UIs have always
+    used, with the analyzed metrics under "raw_data": the fitness data dict
+    as it was given, or the record's own metrics when there was none.
+    """
+
+    __slots__ = ("fitness", "activity_level", "calorie_burn", "fitness_score", "overall_fitness",
+                 "insights", "meditation_time", "food_recommendations", "exercise_recommendations",
+                 "anomalies", "raw_data")
+
+    def __init__(self, fitness, activity_level="Unknown", calorie_burn="Unknown", fitness_score=0,
+                 overall_fitness="Unknown", insights=(), meditation_time=None,
+                 food_recommendations=None, exercise_recommendations=None, anomalies=None,
+                 raw_data=None):
+        self.fitness = fitness
+        self.raw_data = raw_data
+        self.activity_level = activity_level
+        self.calorie_burn = calorie_burn
+        self.fitness_score = fitness_score
+        self.overall_fitness = overall_fitness
+        self.insights = tuple(insights)
+        self.meditation_time = meditation_time
+        self.food_recommendations = food_recommendations
+        self.exercise_recommendations = exercise_recommendations
+        self.anomalies = anomalies
+
+    def to_dict(self):
+        """Return the analysis as an analysis_results dict"""
+        results = {
+            "activity_level": self.activity_level,
+            "calorie_burn": self.calorie_burn,
+            "fitness_score": self.fitness_score,
+            "raw_data": dict(self.raw_data) if self.raw_data is not None else self.fitness.to_dict(),
+            "insights": list(self.insights),
+            "meditation_time": self.meditation_time,
+            "overall_fitness": self.overall_fitness,
+            "food_recommendations": self.food_recommendations,
+            "exercise_recommendations": self.exercise_recommendations
+        }
+        if self.anomalies is not None:
+            results["anomalies"] = self.anomalies
+        return results
+
+    @classmethod
+    def from_dict(cls, results):
+        """
+        Build a record from an analysis_results dict.
+
+        Args:
+            results (dict): Analysis results, as stored in the history table
+
+        Returns:
+            AnalysisRecord: The record
+        """
+        raw_data = results.get("raw_data")
+        return cls(
+            FitnessRecord.from_dict(raw_data or {}),
+            activity_level=results.get("activity_level", "Unknown"),
+            calorie_burn=results.get("calorie_burn", "Unknown"),
+            fitness_score=results.get("fitness_score", 0),
+            overall_fitness=results.get("overall_fitness", "Unknown"),
+            insights=results.get("insights", ()),
+            meditation_time=results.get("meditation_time"),
+            food_recommendations=results.get("food_recommendations"),
+            exercise_recommendations=results.get("exercise_recommendations"),
+            anomalies=results.get("anomalies"),
+            raw_data=raw_data
+        )
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+
+class HistoryEntry:
+    """One analysis kept in a history list"""
+
+    __slots__ = ("date", "fitness", "analysis", "recommendations", "id")
+
+    def __init__(self, date, fitness, analysis, recommendations, id=None):
+        self.date = date
+        self.fitness = fitness
+        self.analysis = analysis
+        self.recommendations = recommendations
+        self.id = id
+
+    @classmethod
+    def from_dict(cls, entry):
+        """Build an entry from a history dict with fitness_data, analysis_results and recommendations"""
+        analysis = AnalysisRecord.from_dict(entry["analysis_results"])
+        analysis.fitness = FitnessRecord.from_dict(entry["fitness_data"])
+        return cls(entry["date"], analysis.fitness, analysis, entry["recommendations"], entry.get("id"))
+
+    def to_dict(self):
+        """Return the entry as a history dict"""
+        entry = {
+            "date": self.date,
+            "fitness_data": self.fitness.to_dict(),
+            "analysis_results": self.analysis.to_dict(),
+            "recommendations": self.recommendations
+        }
+        if self.id is not None:
+            entry["id"] = self.id
+        return entry
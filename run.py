@@ -3,20 +3,32 @@ import os
 import sys
 import traceback
 import logging
-from flask import Flask, request, jsonify, send_from_directory, abort
+from flask import Flask, request, jsonify, send_from_directory, abort, Response, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from PIL import Image
 import io
-import json
-from datetime import datetime
-import sqlite3
+from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 
 # Import core functionality
-from image_processor import extract_fitness_data_from_image
-from health_analyzer import analyze_health_metrics
-from recommendations import generate_recommendations
+from image_processor import (
+    extract_fitness_data_with_confidence, normalize_extraction, low_confidence_metrics, reextract_metrics
+)
+from health_analyzer import HealthAnalyzer, get_health_trends
+from analysis_cache import cached_analysis_and_recommendations, cache_info as analysis_cache_info
+from recommendations import recommendation_ids, recommendation_templates
+from upload_validator import validate_upload, get_rejection_counts, content_hash
+from running_stats import AGGREGATE_METRICS, metric_values
+from records import FitnessRecord
+from history_export import export_history, EXPORT_FORMATS
+from storage import (
+    DEFAULT_USER_ID, init_db, get_detector_from_db, get_sketches_from_db, get_aggregates_from_db,
+    get_history_from_db, iter_history_from_db, add_entry_to_db, get_entry_from_db, get_metric_buckets_from_db, has_entries_in_db,
+    SUMMARY_BUCKETS, HISTORY_FIELDS, ENTRY_FIELDS, count_history_in_db, get_changes_from_db, change_time, delete_entry_from_db,
+    find_entry_by_hash_in_db, claim_idempotency_key, complete_idempotency_key, release_idempotency_key,
+    IDEMPOTENCY_CLAIMED, IDEMPOTENCY_DONE, IDEMPOTENCY_MISMATCH
+)
 
 # Configure logging
 logging.basicConfig(
@@ -41,7 +53,7 @@ if not os.environ.get("GEMINI_API_KEY"):
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='frontend/build')
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=['X-Total-Count', 'X-Next-Before-Id', 'Idempotent-Replayed', 'Retry-After'])  # Enable CORS for all routes
 
 # Configure upload folder for temporary image storage
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_uploads')
@@ -50,92 +62,58 @@ if not os.path.exists(UPLOAD_FOLDER):
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit uploads to 16MB
 
-# Initialize database
-def init_db():
-    conn = sqlite3.connect('fitness_analyzer.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT NOT NULL,
-        fitness_data TEXT NOT NULL,
-        analysis_results TEXT NOT NULL,
-        recommendations TEXT NOT NULL
-    )
-    ''')
-    conn.commit()
-    conn.close()
-    logger.info("Database initialized")
-
-# Get history from database
-def get_history_from_db():
-    try:
-        conn = sqlite3.connect('fitness_analyzer.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, date, fitness_data, analysis_results, recommendations FROM history ORDER BY id DESC')
-        rows = cursor.fetchall()
-        history_items = []
-        for row in rows:
-            history_items.append({
-                "id": row[0],
-                "date": row[1],
-                "fitness_data": json.loads(row[2]),
-                "analysis_results": json.loads(row[3]),
-                "recommendations": json.loads(row[4])
-            })
-        conn.close()
-        return history_items
-    except Exception as e:
-        logger.error(f"Error retrieving history: {str(e)}")
-        return []
-
-# Add entry to database
-def add_entry_to_db(entry):
-    try:
-        conn = sqlite3.connect('fitness_analyzer.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO history (date, fitness_data, analysis_results, recommendations) VALUES (?, ?, ?, ?)',
-            (
-                entry["date"],
-                json.dumps(entry["fitness_data"]),
-                json.dumps(entry["analysis_results"]),
-                json.dumps(entry["recommendations"])
-            )
-        )
-        entry_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return entry_id
-    except Exception as e:
-        logger.error(f"Error adding entry to database: {str(e)}")
-        return None
+def current_user_id():
+    """Return the id of the user making the current request"""
+    return request.headers.get('X-User-Id') or DEFAULT_USER_ID
 
-# Get entry from database
-def get_entry_from_db(entry_id):
-    try:
-        conn = sqlite3.connect('fitness_analyzer.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, date, fitness_data, analysis_results, recommendations FROM history WHERE id = ?', (entry_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                "id": row[0],
-                "date": row[1],
-                "fitness_data": json.loads(row[2]),
-                "analysis_results": json.loads(row[3]),
-                "recommendations": json.loads(row[4])
-            }
-        return None
-    except Exception as e:
-        logger.error(f"Error retrieving entry from database: {str(e)}")
-        return None
+# Seconds a retry is told to wait (Retry-After) while the request holding
+# its Idempotency-Key still runs. Retries aren't held open: a sync worker
+# waiting on another request would be killed at the gunicorn timeout.
+IDEMPOTENCY_RETRY_AFTER = 5
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_image():
-    """API endpoint to analyze fitness image"""
+    """
+    API endpoint to analyze fitness image.
+    
+    With an Idempotency-Key header, a retry of a request returns the first
+    response, with an Idempotent-Replayed header, instead of analyzing the
+    image again. A retry that arrives while the first request still runs
+    gets a 409 with a Retry-After header.
+    """
+    key = request.headers.get('Idempotency-Key')
+    if not key:
+        return run_analysis()
+    if len(key) > 255:
+        return jsonify({'error': 'Idempotency-Key must be at most 255 characters'}), 400
+    
+    user_id = current_user_id()
+    upload = request.files.get('image')
+    fingerprint = content_hash(upload.stream) if upload else ''
+    state, status, body = claim_idempotency_key(key, fingerprint, user_id)
+    if state == IDEMPOTENCY_MISMATCH:
+        return jsonify({'error': 'Idempotency-Key was already used for a different image'}), 422
+    if state == IDEMPOTENCY_DONE:
+        logger.info(f"Replaying response for Idempotency-Key {key}")
+        return Response(body, status=status, mimetype='application/json', headers={'Idempotent-Replayed': 'true'})
+    if state != IDEMPOTENCY_CLAIMED:
+        return (jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409,
+                {'Retry-After': str(IDEMPOTENCY_RETRY_AFTER)})
+    
+    try:
+        response, status = run_analysis()
+    except Exception:
+        release_idempotency_key(key, user_id)
+        raise
+    # Server errors may pass on a retry, so only other responses are kept
+    if status >= 500:
+        release_idempotency_key(key, user_id)
+    else:
+        complete_idempotency_key(key, status, response.get_data(as_text=True), user_id)
+    return response, status
+
+def run_analysis():
+    """Analyze the uploaded fitness image; returns the JSON response and status code"""
     logger.info("Received image analysis request")
     if 'image' not in request.files:
         logger.warning("No image provided in request")
@@ -147,11 +125,25 @@ def analyze_image():
         return jsonify({'error': 'No image selected'}), 400
     
     try:
-        # Check file extension
+        # Check extension, format and dimensions from the image header before touching the disk
         filename = secure_filename(file.filename.lower())
-        if not any(filename.endswith(ext) for ext in ['.png', '.jpg', '.jpeg']):
-            logger.warning(f"Unsupported file format: {filename}")
-            return jsonify({'error': 'Unsupported file format. Please use JPG or PNG images'}), 400
+        validation = validate_upload(file.stream, filename)
+        if not validation["valid"]:
+            return jsonify({'error': validation["message"]}), 400
+        
+        # The same image uploaded again gets its existing entry back, without extracting anything
+        image_hash = content_hash(file.stream)
+        existing_id = find_entry_by_hash_in_db(image_hash, current_user_id())
+        existing = get_entry_from_db(existing_id, current_user_id()) if existing_id else None
+        if existing:
+            logger.info(f"Image already analyzed as entry {existing_id}")
+            return jsonify({
+                'fitness_data': existing["fitness_data"],
+                'analysis_results': existing["analysis_results"],
+                'recommendations': existing["recommendations"],
+                'id': existing_id,
+                'duplicate': True
+            }), 200
             
         # Save file temporarily
         temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
@@ -161,12 +153,6 @@ def analyze_image():
         # Open and process the image
         try:
             image = Image.open(temp_path)
-            
-            # Check image dimensions
-            if max(image.size) < 200:
-                logger.warning(f"Image too small: {image.size}")
-                return jsonify({'error': 'Image is too small. Please upload a larger image with clear text.'}), 400
-            
             logger.info(f"Processing image of size {image.size}")
         except Exception as e:
             logger.error(f"Error opening image: {str(e)}")
@@ -174,7 +160,23 @@ def analyze_image():
         
         # Extract fitness data
         logger.info("Extracting fitness data...")
-        fitness_data = extract_fitness_data_from_image(image)
+        extraction = extract_fitness_data_with_confidence(image)
+        if extraction:
+            # Key everything by canonical metric names, as the detector and fitness_data are
+            extraction = normalize_extraction(extraction)
+        
+        # Re-read only the metrics we are unsure about from their region of the image
+        if extraction and low_confidence_metrics(extraction):
+            logger.info(f"Re-extracting low confidence metrics: {low_confidence_metrics(extraction)}")
+            extraction = reextract_metrics(image, extraction)
+        
+        # Values far outside the user's usual range are often misreads; read them again
+        detector = get_detector_from_db(current_user_id())
+        anomalies = detector.detect(extraction["data"]) if extraction else {}
+        if anomalies:
+            logger.info(f"Re-extracting anomalous metrics: {list(anomalies)}")
+            extraction = reextract_metrics(image, extraction, metrics=list(anomalies))
+        record = FitnessRecord.from_dict(extraction["data"]) if extraction else None
         
         # Clean up temporary file
         try:
@@ -183,7 +185,7 @@ def analyze_image():
         except Exception as e:
             logger.warning(f"Failed to remove temporary file: {str(e)}")
         
-        if not fitness_data:
+        if not record:
             logger.warning("No fitness data extracted from image")
             return jsonify({
                 'error': 'Could not extract fitness data from the image. Please try a clearer image showing fitness metrics.'
@@ -191,23 +193,28 @@ def analyze_image():
         
         # Analyze the data
         logger.info("Analyzing fitness data...")
-        analysis_results = analyze_health_metrics(fitness_data)
+        fitness_data = record.to_dict()
+        shared_analysis, recommendations = cached_analysis_and_recommendations(record)
+        anomalies = detector.detect(record)
+        if anomalies:
+            logger.warning(f"Anomalous metrics after re-extraction: {anomalies}")
         
-        # Generate recommendations
-        logger.info("Generating recommendations...")
-        recommendations = generate_recommendations(analysis_results)
+        # The cached analysis is shared between requests; add this entry's own data to a copy
+        analysis_results = dict(shared_analysis, raw_data=fitness_data, anomalies=anomalies)
         
         # Create entry
         entry = {
             "date": datetime.now().isoformat(),
             "fitness_data": fitness_data,
             "analysis_results": analysis_results,
-            "recommendations": recommendations
+            # Only template ids are stored; the markdown is rendered when the entry is read
+            "recommendations": recommendation_ids(analysis_results),
+            "content_hash": image_hash
         }
         
         # Add to database
         logger.info("Adding entry to database...")
-        entry_id = add_entry_to_db(entry)
+        entry_id = add_entry_to_db(entry, current_user_id())
         if entry_id:
             entry["id"] = entry_id
         else:
@@ -218,6 +225,8 @@ def analyze_image():
         logger.info(f"Analysis completed successfully for entry {entry_id}")
         return jsonify({
             'fitness_data': fitness_data,
+            'confidence': extraction["confidence"],
+            'sources': extraction["source"],
             'analysis_results': analysis_results,
             'recommendations': recommendations,
             'id': entry_id
@@ -228,58 +237,294 @@ def analyze_image():
         logger.error(traceback.format_exc())
         return jsonify({'error': f'Error analyzing image: {str(e)}'}), 500
 
+@app.route('/api/uploads/rejections', methods=['GET'])
+def get_upload_rejections():
+    """API endpoint to get counts of rejected uploads by reason"""
+    return jsonify(get_rejection_counts()), 200
+
+@app.route('/api/analysis/cache', methods=['GET'])
+def get_analysis_cache_stats():
+    """API endpoint to get hit rates of the analysis and recommendation caches"""
+    return jsonify(analysis_cache_info()), 200
+
+# Most history entries returned per page
+HISTORY_MAX_LIMIT = 500
+
+def parse_fields(args):
+    """
+    Read the fields query parameter, e.g. fields=date,steps,activity_level.
+
+    Returns:
+        tuple: Names from HISTORY_FIELDS, all fields of an entry by default
+
+    Raises:
+        ValueError: If a field is unknown
+    """
+    if not args.get('fields'):
+        return ENTRY_FIELDS
+    fields = tuple(field.strip() for field in args['fields'].split(','))
+    unknown = [field for field in fields if field not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return fields
+
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """API endpoint to retrieve analysis history"""
+    """
+    API endpoint to retrieve analysis history, newest first.
+    
+    limit pages through the history: the X-Next-Before-Id header holds the
+    before_id of the next page. fields=date,steps,... returns only those
+    fields, and X-Total-Count holds the number of entries.
+    """
     logger.info("Retrieving analysis history")
-    history = get_history_from_db()
-    return jsonify(history), 200
+    # render=false returns recommendation template ids for clients that render them
+    render = request.args.get('render', 'true').lower() not in ('false', '0')
+    try:
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+        before_id = int(request.args['before_id']) if 'before_id' in request.args else None
+        if (limit is not None and limit < 1) or (before_id is not None and before_id < 1):
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'limit and before_id must be positive integers'}), 400
+    
+    try:
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    user_id = current_user_id()
+    if limit is None:
+        history = get_history_from_db(user_id, render=render, before_id=before_id, fields=fields)
+        next_before_id = None
+    else:
+        # Fetch one extra entry to know whether there is a next page
+        limit = min(limit, HISTORY_MAX_LIMIT)
+        history = get_history_from_db(user_id, render=render, limit=limit + 1, before_id=before_id, fields=fields)
+        next_before_id = history[limit - 1]["id"] if len(history) > limit else None
+        history = history[:limit]
+    
+    response = jsonify(history)
+    response.headers['X-Total-Count'] = str(count_history_in_db(user_id))
+    if next_before_id is not None:
+        response.headers['X-Next-Before-Id'] = str(next_before_id)
+    return response, 200
+
+@app.route('/api/recommendations/templates', methods=['GET'])
+def get_recommendation_templates():
+    """API endpoint to get the recommendation templates referenced by template ids"""
+    return jsonify(recommendation_templates()), 200
 
 @app.route('/api/history/<int:entry_id>', methods=['GET'])
 def get_history_entry(entry_id):
-    """API endpoint to retrieve a specific history entry"""
+    """API endpoint to retrieve a history entry of the current user"""
     logger.info(f"Retrieving history entry {entry_id}")
-    entry = get_entry_from_db(entry_id)
+    entry = get_entry_from_db(entry_id, current_user_id())
     if entry:
         return jsonify(entry), 200
     logger.warning(f"Entry not found: {entry_id}")
     return jsonify({'error': 'Entry not found'}), 404
 
+@app.route('/api/history/<int:entry_id>', methods=['DELETE'])
+def delete_history_entry(entry_id):
+    """API endpoint to delete a history entry of the current user"""
+    logger.info(f"Deleting history entry {entry_id}")
+    deleted = delete_entry_from_db(entry_id, current_user_id())
+    if deleted is None:
+        return jsonify({'error': 'Failed to delete entry'}), 500
+    if not deleted:
+        logger.warning(f"Entry not found: {entry_id}")
+        return jsonify({'error': 'Entry not found'}), 404
+    return jsonify({'deleted': entry_id}), 200
+
+@app.route('/api/history/export', methods=['GET'])
+def export_history_file():
+    """
+    API endpoint to download the whole history, oldest first.
+    
+    format=ndjson (default) writes one JSON entry per line, format=csv the
+    flat metrics. Rows are streamed from the database as they are written,
+    so memory use doesn't grow with the history. fields works as for
+    /api/history.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Invalid format: {export_format}. Use one of {", ".join(EXPORT_FORMATS)}'}), 400
+    try:
+        fields = parse_fields(request.args) if request.args.get('fields') else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    render = request.args.get('render', 'true').lower() not in ('false', '0')
+    
+    logger.info(f"Exporting history as {export_format}")
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    lines = export_history(export_format, current_user_id(), fields, render)
+    return Response(
+        stream_with_context(lines),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=history.{extension}'}
+    )
+
+@app.route('/api/history/changes', methods=['GET'])
+def get_history_changes():
+    """
+    API endpoint to sync history incrementally.
+    
+    Returns the entries added or changed and the ids of entries deleted
+    after since, which is the cursor of the previous response or an ISO
+    timestamp (UTC); without since, the whole history. A client stores
+    the returned cursor and asks again while has_more is true. limit and
+    fields work as for /api/history.
+    """
+    logger.info("Retrieving history changes")
+    render = request.args.get('render', 'true').lower() not in ('false', '0')
+    since = request.args.get('since', '0')
+    try:
+        # A timestamp is normalized, and so is the cursor echoed back for it
+        since = int(since) if since.isdigit() else change_time(since)
+        limit = min(int(request.args.get('limit', HISTORY_MAX_LIMIT)), HISTORY_MAX_LIMIT)
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        fields = parse_fields(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+    
+    user_id = current_user_id()
+    # Fetch one extra change to know whether there are more
+    changes = get_changes_from_db(user_id, since, limit + 1)
+    if changes is None:
+        return jsonify({'error': 'Failed to retrieve history changes'}), 500
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    
+    updated = [entry_id for _, entry_id, op in changes if op == 'upsert']
+    entries = get_history_from_db(user_id, render=render, fields=fields, entry_ids=updated) if updated else []
+    return jsonify({
+        "cursor": changes[-1][0] if changes else since,
+        "has_more": has_more,
+        "entries": entries,
+        "deleted": [entry_id for _, entry_id, op in changes if op == 'delete']
+    }), 200
+
+def parse_date_range(args):
+    """
+    Read the from and to query parameters, ISO dates or date-times.
+
+    Both ends are inclusive: to=2024-03-31 covers the whole of that day.
+
+    Returns:
+        tuple: (start, end) strings for start <= date < end, either of
+        which may be None
+
+    Raises:
+        ValueError: If a parameter isn't an ISO date
+    """
+    start = args.get('from')
+    end = args.get('to')
+    if start:
+        datetime.fromisoformat(start)
+    if end:
+        parsed = datetime.fromisoformat(end)
+        # A bare date means up to the end of that day
+        end = (parsed + timedelta(days=1)).date().isoformat() if len(end) == 10 else (parsed + timedelta(microseconds=1)).isoformat()
+    return start, end
+
 @app.route('/api/metrics/summary', methods=['GET'])
 def get_metrics_summary():
-    """API endpoint to get summary statistics of user metrics"""
+    """
+    API endpoint to get summary statistics of user metrics.
+    
+    Points are per day by default; bucket=week or bucket=month aggregates
+    them further, and from/to (ISO dates) limit the range.
+    """
     logger.info("Retrieving metrics summary")
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in SUMMARY_BUCKETS:
+        return jsonify({'error': f'Invalid bucket: {bucket}. Use one of {", ".join(SUMMARY_BUCKETS)}'}), 400
     try:
-        history = get_history_from_db()
-        if not history:
+        start, end = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {str(e)}'}), 400
+    
+    try:
+        if not has_entries_in_db(current_user_id()):
             return jsonify({"message": "No data available yet"}), 200
         
-        # Extract metrics for analysis
-        steps_data = []
-        calories_data = []
-        distance_data = []
-        
-        for entry in history:
-            fitness_data = entry["fitness_data"]
-            if "steps" in fitness_data:
-                steps_data.append({"date": entry["date"], "value": fitness_data["steps"]})
-            
-            calories = fitness_data.get("calories") or fitness_data.get("total_calories")
-            if calories:
-                calories_data.append({"date": entry["date"], "value": calories})
-            
-            if "distance" in fitness_data:
-                distance_data.append({"date": entry["date"], "value": fitness_data["distance"]})
+        series = get_metric_buckets_from_db(current_user_id(), bucket, start, end)
+        if series is None:
+            return jsonify({'error': 'Failed to generate metrics summary'}), 500
         
         return jsonify({
-            "steps": steps_data,
-            "calories": calories_data,
-            "distance": distance_data
+            "bucket": bucket,
+            "steps": series["steps"],
+            "calories": series["calories"],
+            "distance": series["distance"],
+            "aggregates": get_aggregates_from_db(current_user_id())
         }), 200
     except Exception as e:
         logger.error(f"Error generating metrics summary: {str(e)}")
         return jsonify({'error': 'Failed to generate metrics summary'}), 500
 
+@app.route('/api/metrics/trends', methods=['GET'])
+def get_metrics_trends():
+    """
+    API endpoint to get trends of user metrics.
+    
+    Served from the running aggregates kept up to date on every insert;
+    pass detailed=true for medians and slopes computed over the full history.
+    """
+    logger.info("Retrieving metrics trends")
+    try:
+        if request.args.get('detailed', 'false').lower() in ('true', '1'):
+            # The trend engine takes entries oldest first; listings are newest first
+            history = list(iter_history_from_db(current_user_id(), render=False, fields=("date", "fitness_data")))
+            return jsonify(get_health_trends(history)), 200
+        return jsonify(get_aggregates_from_db(current_user_id())), 200
+    except Exception as e:
+        logger.error(f"Error generating metrics trends: {str(e)}")
+        return jsonify({'error': 'Failed to generate metrics trends'}), 500
+
+@app.route('/api/metrics/percentiles', methods=['GET'])
+def get_metrics_percentiles():
+    """
+    API endpoint to rank the user's latest values against all users.
+    
+    Values to rank can also be passed as query parameters, e.g. ?steps=9000,
+    for the metrics in AGGREGATE_METRICS; other parameters are ignored.
+    since=YYYY-MM limits the cohort to entries from that month on.
+    """
+    logger.info("Retrieving metric percentiles")
+    try:
+        values = {}
+        for metric in AGGREGATE_METRICS:
+            value = request.args.get(metric)
+            if value is not None:
+                try:
+                    values[metric] = float(value)
+                except ValueError:
+                    return jsonify({'error': f'Invalid value for {metric}: {value}'}), 400
+        
+        if not values:
+            # Only the latest entry's metrics are needed
+            history = get_history_from_db(current_user_id(), render=False, limit=1, fields=("fitness_data",))
+            if not history:
+                return jsonify({"message": "No data available yet"}), 200
+            values = metric_values(history[0]["fitness_data"])
+        
+        sketches = get_sketches_from_db(request.args.get('since'))
+        analyzer = HealthAnalyzer(sketches)
+        return jsonify({
+            metric: {
+                "value": value,
+                "percentile": analyzer.percentile_rank(metric, value),
+                "cohort_size": sketches[metric].count if metric in sketches else 0
+            }
+            for metric, value in values.items()
+        }), 200
+    except Exception as e:
+        logger.error(f"Error generating metric percentiles: {str(e)}")
+        return jsonify({'error': 'Failed to generate metric percentiles'}), 500
+
 # Serve static files from React build
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
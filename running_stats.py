@@ -0,0 +1,226 @@
+import math
+from datetime import date, datetime
+
+from health_rules import RULES
+from records import FitnessRecord
+
+# Metrics running aggregates are kept for
+AGGREGATE_METRICS = ["steps", "calories", "distance", "active_minutes", "stairs"]
+
+# Weight of the newest value in the exponentially weighted moving average
+EWMA_ALPHA = 0.2
+
+# Rolling windows, in days
+ROLLING_WINDOWS = (7, 30)
+
+
+def metric_values(fitness_data):
+    """
+    Pick the aggregated metrics out of a fitness data dict or FitnessRecord.
+
+    Metric names are normalized, so "total_calories" counts as "calories".
+    """
+    record = FitnessRecord.coerce(fitness_data)
+    values = {}
+    for metric in AGGREGATE_METRICS:
+        value = getattr(record, metric)
+        if value is not None:
+            values[metric] = value
+    return values
+
+
+def _to_date(day):
+    """Convert an ISO date string, datetime or date into a date"""
+    if isinstance(day, str):
+        day = datetime.fromisoformat(day)
+    return day.date() if isinstance(day, datetime) else day
+
+
+class RollingWindow:
+    """
+    Ring buffer of the last few days' values with a running sum.
+
+    Each slot holds one day's value (the latest entry of that day wins), so
+    moving to a new day only clears the slots of the days skipped over.
+    """
+
+    def __init__(self, days, slots=None, total=0.0, filled=0):
+        self.days = days
+        self.slots = slots if slots is not None else [None] * days
+        self.total = total
+        self.filled = filled
+
+    def _set(self, index, value):
+        """Replace the value in a slot, keeping the running sum in step"""
+        old = self.slots[index]
+        if old is not None:
+            self.total -= old
+            self.filled -= 1
+        if value is not None:
+            self.total += value
+            self.filled += 1
+        self.slots[index] = value
+
+    def update(self, head, gap, value):
+        """
+        Record a day's value.
+
+        Args:
+            head (int): Day number of the latest day seen so far
+            gap (int): Days between the latest day seen and this value's day
+            value (float): The day's value
+
+        Returns:
+            int: Day number of the latest day after the update
+        """
+        if gap > 0:
+            # Clear the days skipped over; bounded by the window size
+            for day in range(head + 1, head + min(gap, self.days) + 1):
+                self._set(day % self.days, None)
+            head += gap
+            self._set(head % self.days, value)
+        elif -gap < self.days:
+            # Same day, or a late entry for a day still inside the window
+            self._set((head + gap) % self.days, value)
+        return head
+
+    def mean(self):
+        """Mean of the days in the window that have a value"""
+        return self.total / self.filled if self.filled else None
+
+    def to_dict(self):
+        return {"days": self.days, "slots": self.slots, "total": self.total, "filled": self.filled}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["days"], state["slots"], state["total"], state["filled"])
+
+
+class RunningAggregate:
+    """
+    Running statistics of one metric for one user, updated in O(1) per entry.
+
+    Keeps count, sum, sum of squares, min/max, an EWMA and mean absolute
+    deviation around it, the current goal streak and rolling-window means.
+    """
+
+    def __init__(self, metric):
+        self.metric = metric
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.ewma = None
+        self.ewmad = 0.0
+        self.last_day = None
+        self.day_number = 0
+        self.last_day_met = False
+        self.streak_before_last_day = 0
+        self.windows = [RollingWindow(days) for days in ROLLING_WINDOWS]
+
+    def update(self, day, value):
+        """
+        Add an entry's value.
+
+        Args:
+            day (str, datetime or date): Day the entry belongs to
+            value (float): The metric value
+        """
+        day = _to_date(day)
+        value = float(value)
+
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        self.minimum = value if self.minimum is None else min(self.minimum, value)
+        self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+        self.update_baseline(value)
+
+        goal = RULES.goals.get(self.metric)
+        met = goal is not None and value >= goal
+
+        if self.last_day is None:
+            gap = 0
+            self.last_day = day
+        else:
+            gap = (day - self.last_day).days
+
+        if gap > 0:
+            self.streak_before_last_day = self.current_streak if gap == 1 else 0
+            self.last_day = day
+            self.last_day_met = met
+        elif gap == 0:
+            # A later entry for the same day replaces that day's value
+            self.last_day_met = met
+        # Late entries for earlier days don't change the streak
+
+        head = self.day_number
+        for window in self.windows:
+            self.day_number = window.update(head, gap, value)
+
+    def update_baseline(self, value):
+        """Fold a value into the EWMA and its mean absolute deviation only"""
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            self.ewmad = EWMA_ALPHA * abs(value - self.ewma) + (1 - EWMA_ALPHA) * self.ewmad
+            self.ewma = EWMA_ALPHA * value + (1 - EWMA_ALPHA) * self.ewma
+
+    @property
+    def current_streak(self):
+        """Consecutive days, up to the latest day, on which the goal was met"""
+        return self.streak_before_last_day + 1 if self.last_day_met else 0
+
+    def summary(self):
+        """Return the aggregate as a JSON-friendly dict"""
+        mean = self.total / self.count if self.count else None
+        variance = self.total_sq / self.count - mean * mean if self.count else None
+        summary = {
+            "count": self.count,
+            "mean": _round(mean),
+            "std": _round(math.sqrt(max(variance, 0.0))) if variance is not None else None,
+            "min": _round(self.minimum),
+            "max": _round(self.maximum),
+            "ewma": _round(self.ewma),
+            "current_streak": self.current_streak,
+            "last_day": self.last_day.isoformat() if self.last_day else None
+        }
+        for window in self.windows:
+            summary[f"mean_{window.days}d"] = _round(window.mean())
+        return summary
+
+    def to_dict(self):
+        """Serialize the aggregate for storage"""
+        return {
+            "metric": self.metric,
+            "count": self.count,
+            "total": self.total,
+            "total_sq": self.total_sq,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "ewma": self.ewma,
+            "ewmad": self.ewmad,
+            "last_day": self.last_day.isoformat() if self.last_day else None,
+            "day_number": self.day_number,
+            "last_day_met": self.last_day_met,
+            "streak_before_last_day": self.streak_before_last_day,
+            "windows": [window.to_dict() for window in self.windows]
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Restore an aggregate serialized with to_dict"""
+        aggregate = cls(state["metric"])
+        for key in ("count", "total", "total_sq", "minimum", "maximum", "ewma", "ewmad",
+                    "day_number", "last_day_met", "streak_before_last_day"):
+            setattr(aggregate, key, state[key])
+        aggregate.last_day = date.fromisoformat(state["last_day"]) if state["last_day"] else None
+        aggregate.windows = [RollingWindow.from_dict(window) for window in state["windows"]]
+        return aggregate
+
+
+def _round(value):
+    """Round a statistic for display, keeping None as is"""
+    return round(value, 2) if value is not None else None
@@ -0,0 +1,960 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from health_analyzer import AnomalyDetector
+from running_stats import RunningAggregate, metric_values
+from quantile_sketch import KLLSketch
+from recommendations import render_recommendations
+from records import FitnessRecord
+
+logger = logging.getLogger(__name__)
+
+# SQLite database file; DATABASE_PATH points to another one
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "fitness_analyzer.db")
+
+# User that entries without a user belong to
+DEFAULT_USER_ID = 'default'
+
+# Applied to every new connection. WAL lets readers run alongside the single
+# writer, and with synchronous=NORMAL a commit doesn't wait for an fsync
+# (a power cut can lose the last commits, never corrupt the database).
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",      # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # read the first 256 MB through mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",      # wait up to 5 s for another writer
+    "PRAGMA foreign_keys = ON",
+)
+
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 128
+
+_local = threading.local()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, isolation_level=None, cached_statements=CACHED_STATEMENTS)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection():
+    """
+    Return this thread's connection to the database, opening it on first use.
+
+    Connections stay open for the life of the thread, so requests don't pay
+    for connecting and re-reading the schema. A process forked by a server
+    like gunicorn opens its own connection instead of sharing its parent's.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid() or _local.path != DATABASE_PATH:
+        conn = _connect(DATABASE_PATH)
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = DATABASE_PATH
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection, if it has one"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block of statements as one write transaction.
+
+    BEGIN IMMEDIATE takes the write lock up front, so read-modify-write
+    updates such as the running aggregates can't interleave with another
+    worker's.
+
+    Yields:
+        sqlite3.Cursor: Cursor on this thread's connection
+    """
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _create_history(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        fitness_data TEXT NOT NULL,
+        analysis_results TEXT NOT NULL,
+        recommendations TEXT NOT NULL
+    )
+    ''')
+
+
+def _add_history_user(cursor):
+    # Databases created before entries had a user
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(history)')]
+    if 'user_id' not in columns:
+        cursor.execute("ALTER TABLE history ADD COLUMN user_id TEXT NOT NULL DEFAULT 'default'")
+
+
+def _create_metric_aggregates(cursor):
+    # Running aggregates per user and metric, updated on every insert
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metric_aggregates (
+        user_id TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (user_id, metric)
+    )
+    ''')
+    rebuild_aggregates(cursor)
+
+
+def _create_metric_sketches(cursor):
+    # Quantile sketches of every user's values, per metric and month
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metric_sketches (
+        metric TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        state TEXT NOT NULL,
+        PRIMARY KEY (metric, bucket)
+    )
+    ''')
+    rebuild_sketches(cursor)
+
+
+def _create_metrics(cursor):
+    # The core metrics of every entry as typed columns, so summaries and
+    # date ranges are SQL aggregates instead of decoding JSON per row.
+    # NUMERIC columns keep whole numbers as integers.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metrics (
+        entry_id INTEGER PRIMARY KEY REFERENCES history (id) ON DELETE CASCADE,
+        user_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        steps INTEGER,
+        calories NUMERIC,
+        distance NUMERIC,
+        active_minutes INTEGER,
+        stairs INTEGER,
+        fitness_score NUMERIC
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_user_date ON metrics (user_id, date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_user ON history (user_id, id)')
+
+    cursor.execute('SELECT id, user_id, date, fitness_data, analysis_results FROM history')
+    rows = [
+        metric_row(entry_id, user_id, date, json.loads(fitness_data), json.loads(analysis_results).get("fitness_score"))
+        for entry_id, user_id, date, fitness_data, analysis_results in cursor.fetchall()
+    ]
+    cursor.executemany(INSERT_METRICS, rows)
+    logger.info(f"Copied the metrics of {len(rows)} entries into the metrics table")
+
+
+def _create_history_counts(cursor):
+    # Entries per user, kept by triggers so a total count doesn't scan the index
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS history_counts (
+        user_id TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS history_count_insert AFTER INSERT ON history
+    BEGIN
+        INSERT INTO history_counts (user_id, count) VALUES (NEW.user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET count = count + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS history_count_delete AFTER DELETE ON history
+    BEGIN
+        UPDATE history_counts SET count = count - 1 WHERE user_id = OLD.user_id;
+    END
+    ''')
+    cursor.execute('DELETE FROM history_counts')
+    cursor.execute('INSERT INTO history_counts (user_id, count) SELECT user_id, COUNT(*) FROM history GROUP BY user_id')
+
+
+def _create_history_changes(cursor):
+    # The latest change of every entry, in order, for clients syncing
+    # incrementally. Triggers record inserts, updates and deletes; a newer
+    # change replaces an entry's older one, so the log stays one row per
+    # entry or tombstone.
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS history_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entry_id INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        op TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_changes_user ON history_changes (user_id, seq)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_changes_entry ON history_changes (entry_id)')
+    for event, op, row in (('INSERT', 'upsert', 'NEW'), ('UPDATE', 'upsert', 'NEW'), ('DELETE', 'delete', 'OLD')):
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS history_change_{event.lower()} AFTER {event} ON history
+        BEGIN
+            DELETE FROM history_changes WHERE entry_id = {row}.id;
+            INSERT INTO history_changes (entry_id, user_id, op) VALUES ({row}.id, {row}.user_id, '{op}');
+        END
+        ''')
+    cursor.execute('DELETE FROM history_changes')
+    cursor.execute("INSERT INTO history_changes (entry_id, user_id, op) SELECT id, user_id, 'upsert' FROM history ORDER BY id")
+
+
+def _add_history_content_hash(cursor):
+    # SHA-256 of the uploaded image, unique per user. Entries from before
+    # have none; NULLs never collide in a unique index.
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(history)')]
+    if 'content_hash' not in columns:
+        cursor.execute('ALTER TABLE history ADD COLUMN content_hash TEXT')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_history_user_hash ON history (user_id, content_hash)')
+
+
+def _create_idempotency_keys(cursor):
+    # Results of requests made with an Idempotency-Key, so retries get the
+    # first response instead of running again
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        user_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        state TEXT NOT NULL,
+        status INTEGER,
+        response TEXT,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (user_id, key)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_created ON idempotency_keys (created_at)')
+
+
+def _create_payloads(cursor):
+    # Plans, insights and recommendation templates stored once per distinct
+    # content and referenced by hash from history, instead of in every row
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS payloads (
+        hash TEXT PRIMARY KEY,
+        body TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    # The entries' content doesn't change, so keep them out of the change feed
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'history_change_update'")
+    trigger = cursor.fetchone()
+    cursor.execute('DROP TRIGGER IF EXISTS history_change_update')
+    cursor.execute('SELECT id, analysis_results, recommendations FROM history')
+    rows = cursor.fetchall()
+    for entry_id, analysis_results, recommendations in rows:
+        cursor.execute(
+            'UPDATE history SET analysis_results = ?, recommendations = ? WHERE id = ?',
+            (
+                store_payloads(cursor, json.loads(analysis_results), ENTRY_ANALYSIS_FIELDS),
+                store_payloads(cursor, json.loads(recommendations)),
+                entry_id
+            )
+        )
+    if trigger:
+        cursor.execute(trigger[0])
+    logger.info(f"Moved the analyses and recommendations of {len(rows)} entries into the payloads table")
+
+
+# Schema migrations in order; PRAGMA user_version records how many have run.
+# Each one also copes with databases that predate the version counter.
+MIGRATIONS = [
+    _create_history,
+    _add_history_user,
+    _create_metric_aggregates,
+    _create_metric_sketches,
+    _create_metrics,
+    _create_history_counts,
+    _create_history_changes,
+    _add_history_content_hash,
+    _create_idempotency_keys,
+    _create_payloads,
+]
+
+
+def init_db():
+    """Create the database or bring its schema up to date"""
+    with transaction() as cursor:
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"Applying database migration {number}: {migration.__name__}")
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {number}')
+    logger.info("Database initialized")
+
+
+def rebuild_aggregates(cursor, user_id=None):
+    """Recompute the running aggregates of one user, or all users, by replaying the history table"""
+    if user_id is None:
+        cursor.execute('DELETE FROM metric_aggregates')
+        cursor.execute('SELECT user_id, date, fitness_data, analysis_results FROM history ORDER BY id')
+    else:
+        cursor.execute('DELETE FROM metric_aggregates WHERE user_id = ?', (user_id,))
+        cursor.execute(
+            'SELECT user_id, date, fitness_data, analysis_results FROM history WHERE user_id = ? ORDER BY id',
+            (user_id,)
+        )
+    detectors = {}
+    for user_id, date, fitness_data, analysis_results in cursor.fetchall():
+        if user_id not in detectors:
+            detectors[user_id] = AnomalyDetector()
+        anomalies = json.loads(analysis_results).get("anomalies")
+        detectors[user_id].update(date, json.loads(fitness_data), anomalies)
+
+    rows = [
+        (user_id, metric, json.dumps(aggregate.to_dict()))
+        for user_id, detector in detectors.items()
+        for metric, aggregate in detector.aggregates.items()
+    ]
+    cursor.executemany('INSERT INTO metric_aggregates (user_id, metric, state) VALUES (?, ?, ?)', rows)
+    logger.info(f"Rebuilt {len(rows)} metric aggregates from history")
+
+
+def load_aggregates(cursor, user_id):
+    """Load the running aggregates of a user, keyed by metric"""
+    cursor.execute('SELECT metric, state FROM metric_aggregates WHERE user_id = ?', (user_id,))
+    return {metric: RunningAggregate.from_dict(json.loads(state)) for metric, state in cursor.fetchall()}
+
+
+def update_aggregates(cursor, user_id, date, fitness_data, anomalies=None):
+    """Fold a new entry into the user's running aggregates, in O(1) per metric"""
+    detector = AnomalyDetector(load_aggregates(cursor, user_id))
+    detector.update(date, fitness_data, anomalies)
+    cursor.executemany(
+        'INSERT OR REPLACE INTO metric_aggregates (user_id, metric, state) VALUES (?, ?, ?)',
+        [(user_id, metric, json.dumps(aggregate.to_dict())) for metric, aggregate in detector.aggregates.items()]
+    )
+
+
+def sketch_bucket(date):
+    """Time bucket of the cohort sketches an entry's values go into: its month"""
+    return date[:7]
+
+
+def rebuild_sketches(cursor):
+    """Recompute all cohort sketches from the history table"""
+    cursor.execute('DELETE FROM metric_sketches')
+    sketches = {}
+    cursor.execute('SELECT date, fitness_data, analysis_results FROM history ORDER BY id')
+    for date, fitness_data, analysis_results in cursor.fetchall():
+        anomalies = json.loads(analysis_results).get("anomalies") or {}
+        for metric, value in metric_values(json.loads(fitness_data)).items():
+            if metric in anomalies:
+                continue
+            key = (metric, sketch_bucket(date))
+            if key not in sketches:
+                sketches[key] = KLLSketch()
+            sketches[key].update(value)
+
+    cursor.executemany(
+        'INSERT INTO metric_sketches (metric, bucket, state) VALUES (?, ?, ?)',
+        [(metric, bucket, json.dumps(sketch.to_dict())) for (metric, bucket), sketch in sketches.items()]
+    )
+    logger.info(f"Rebuilt {len(sketches)} metric sketches from history")
+
+
+def update_sketches(cursor, date, fitness_data, anomalies=None):
+    """Add a new entry's values to the cohort sketches of its month"""
+    anomalies = anomalies or {}
+    bucket = sketch_bucket(date)
+    for metric, value in metric_values(fitness_data).items():
+        # Values flagged as anomalies would skew everyone's ranks
+        if metric in anomalies:
+            continue
+        cursor.execute('SELECT state FROM metric_sketches WHERE metric = ? AND bucket = ?', (metric, bucket))
+        row = cursor.fetchone()
+        sketch = KLLSketch.from_dict(json.loads(row[0])) if row else KLLSketch()
+        sketch.update(value)
+        cursor.execute(
+            'INSERT OR REPLACE INTO metric_sketches (metric, bucket, state) VALUES (?, ?, ?)',
+            (metric, bucket, json.dumps(sketch.to_dict()))
+        )
+
+
+# Columns of the metrics table besides entry_id, user_id, date and fitness_score
+METRIC_COLUMNS = ("steps", "calories", "distance", "active_minutes", "stairs")
+
+INSERT_METRICS = (
+    'INSERT OR REPLACE INTO metrics (entry_id, user_id, date, steps, calories, distance, '
+    'active_minutes, stairs, fitness_score) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+)
+
+
+def metric_row(entry_id, user_id, date, fitness_data, fitness_score):
+    """Values of an entry's metrics table row, in INSERT_METRICS order"""
+    record = FitnessRecord.coerce(fitness_data)
+    return (entry_id, user_id, date) + tuple(getattr(record, column) for column in METRIC_COLUMNS) + (fitness_score,)
+
+
+def get_detector_from_db(user_id=DEFAULT_USER_ID):
+    """Get the anomaly detector of a user from database"""
+    try:
+        return AnomalyDetector(load_aggregates(get_connection().cursor(), user_id))
+    except Exception as e:
+        logger.error(f"Error loading anomaly detector: {str(e)}")
+        return AnomalyDetector()
+
+
+def get_sketches_from_db(since=None):
+    """Get the cohort sketches from database, merged over time buckets"""
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute('SELECT metric, state FROM metric_sketches WHERE bucket >= ?', (since or '',))
+        sketches = {}
+        for metric, state in cursor.fetchall():
+            sketch = KLLSketch.from_dict(json.loads(state))
+            sketches[metric] = sketches[metric].merge(sketch) if metric in sketches else sketch
+        return sketches
+    except Exception as e:
+        logger.error(f"Error retrieving metric sketches: {str(e)}")
+        return {}
+
+
+def get_aggregates_from_db(user_id=DEFAULT_USER_ID):
+    """Get running aggregates from database"""
+    try:
+        aggregates = load_aggregates(get_connection().cursor(), user_id)
+        return {metric: aggregate.summary() for metric, aggregate in aggregates.items()}
+    except Exception as e:
+        logger.error(f"Error retrieving aggregates: {str(e)}")
+        return {}
+
+
+# SQL expression of the period an entry falls into, as the date the period
+# starts. Dates are stored as ISO strings, so days and months are prefixes.
+SUMMARY_BUCKETS = {
+    "day": "substr(date, 1, 10)",
+    "week": "date(date, 'weekday 0', '-6 days')",
+    "month": "substr(date, 1, 7) || '-01'",
+}
+
+# Charted metrics; a calorie count of 0 means the screenshot didn't show one
+SUMMARY_METRICS = {
+    "steps": "steps",
+    "calories": "NULLIF(calories, 0)",
+    "distance": "distance",
+}
+
+
+def get_metric_buckets_from_db(user_id=DEFAULT_USER_ID, bucket="day", start=None, end=None):
+    """
+    Get the charted metrics of a user from database, aggregated per period.
+
+    Args:
+        user_id (str): User whose entries to summarize
+        bucket (str): "day", "week" or "month"
+        start (str): Only entries dated on or after this ISO date
+        end (str): Only entries dated before this ISO date
+
+    Returns:
+        dict: Per metric, a list of {"date", "value", "min", "max", "count"}
+        points, newest first. "date" is the first day of the period and
+        "value" the average.
+    """
+    try:
+        columns = ", ".join(
+            f"COUNT({expr}), AVG({expr}), MIN({expr}), MAX({expr})" for expr in SUMMARY_METRICS.values()
+        )
+        conditions = ['user_id = ?']
+        params = [user_id]
+        if start:
+            conditions.append('date >= ?')
+            params.append(start)
+        if end:
+            conditions.append('date < ?')
+            params.append(end)
+        cursor = get_connection().cursor()
+        cursor.execute(
+            f'SELECT {SUMMARY_BUCKETS[bucket]} AS period, {columns} FROM metrics '
+            f'WHERE {" AND ".join(conditions)} GROUP BY period ORDER BY period DESC',
+            params
+        )
+        series = {metric: [] for metric in SUMMARY_METRICS}
+        for row in cursor.fetchall():
+            for index, metric in enumerate(SUMMARY_METRICS):
+                count, average, minimum, maximum = row[1 + 4 * index:5 + 4 * index]
+                if count:
+                    series[metric].append({
+                        "date": row[0],
+                        "value": round(average, 2),
+                        "min": minimum,
+                        "max": maximum,
+                        "count": count
+                    })
+        return series
+    except Exception as e:
+        logger.error(f"Error retrieving metric summary: {str(e)}")
+        return None
+
+
+def has_entries_in_db(user_id=DEFAULT_USER_ID):
+    """Check whether a user has any entries"""
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute('SELECT 1 FROM metrics WHERE user_id = ? LIMIT 1', (user_id,))
+        return cursor.fetchone() is not None
+    except Exception as e:
+        logger.error(f"Error checking for entries: {str(e)}")
+        return False
+
+
+# Key under which a history row lists the hashes of its payloads
+PAYLOAD_KEY = "_payloads"
+
+# Fields of an analysis that differ per entry, so stay in the history row
+ENTRY_ANALYSIS_FIELDS = ("raw_data", "anomalies")
+
+# Payload bodies kept in memory; a hash always names the same content
+PAYLOAD_CACHE_SIZE = 4096
+
+
+def store_payloads(cursor, value, inline=()):
+    """
+    Store the nested dicts and lists of a JSON object once each in the payloads table.
+
+    Meal and exercise plans, insights and recommendation templates repeat
+    across entries with only a handful of variations, so each is kept once
+    under the hash of its content and the history row holds the hash.
+
+    Args:
+        cursor: Cursor of an open transaction
+        value: JSON value of a history column
+        inline (tuple): Fields to keep in the row
+
+    Returns:
+        str: JSON for the history row, see load_payloads
+    """
+    if not isinstance(value, dict):
+        return json.dumps(value)
+    row = {}
+    hashes = {}
+    for field, item in value.items():
+        if item and isinstance(item, (dict, list, tuple)) and field not in inline:
+            body = json.dumps(item, sort_keys=True, separators=(",", ":"))
+            digest = hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+            cursor.execute('INSERT OR IGNORE INTO payloads (hash, body) VALUES (?, ?)', (digest, body))
+            hashes[field] = digest
+        else:
+            row[field] = item
+    if hashes:
+        row[PAYLOAD_KEY] = hashes
+    return json.dumps(row)
+
+
+@lru_cache(maxsize=PAYLOAD_CACHE_SIZE)
+def _payload_body(digest):
+    cursor = get_connection().cursor()
+    cursor.execute('SELECT body FROM payloads WHERE hash = ?', (digest,))
+    row = cursor.fetchone()
+    if row is None:
+        raise KeyError(f"Missing payload {digest}")
+    return row[0]
+
+
+def load_payloads(text):
+    """Decode a history column stored with store_payloads, filling in its payloads"""
+    value = json.loads(text)
+    if isinstance(value, dict) and PAYLOAD_KEY in value:
+        # Decode the cached body each time so every caller gets its own copy
+        for field, digest in value.pop(PAYLOAD_KEY).items():
+            value[field] = json.loads(_payload_body(digest))
+    return value
+
+
+# Fields a history listing can return, as SQL over history h and metrics m
+HISTORY_FIELDS = {
+    "id": "h.id",
+    "date": "h.date",
+    "fitness_data": "h.fitness_data",
+    "analysis_results": "h.analysis_results",
+    "recommendations": "h.recommendations",
+    "activity_level": "json_extract(h.analysis_results, '$.activity_level')",
+    "steps": "m.steps",
+    "calories": "m.calories",
+    "distance": "m.distance",
+    "active_minutes": "m.active_minutes",
+    "stairs": "m.stairs",
+    "fitness_score": "m.fitness_score",
+}
+
+# Fields of a full history entry
+ENTRY_FIELDS = ("id", "date", "fitness_data", "analysis_results", "recommendations")
+
+# Rows read at a time when streaming history
+EXPORT_BATCH_SIZE = 500
+
+
+def _entry_from_row(fields, row, render):
+    """Build a history entry from a row of the given fields, decoding the JSON columns"""
+    entry = dict(zip(fields, row))
+    if "fitness_data" in entry:
+        entry["fitness_data"] = json.loads(entry["fitness_data"])
+    if "analysis_results" in entry:
+        entry["analysis_results"] = load_payloads(entry["analysis_results"])
+    if "recommendations" in entry:
+        recommendations = load_payloads(entry["recommendations"])
+        entry["recommendations"] = render_recommendations(recommendations) if render else recommendations
+    return entry
+
+
+def _history_query(user_id, fields, before_id=None, entry_ids=None, limit=None, order='DESC'):
+    """Build the query of a history listing; returns the fields with "id" first, the SQL and its parameters"""
+    fields = ("id",) + tuple(field for field in fields if field != "id")
+    columns = ", ".join(HISTORY_FIELDS[field] for field in fields)
+    query = f'SELECT {columns} FROM history h'
+    if any(HISTORY_FIELDS[field].startswith("m.") for field in fields):
+        query += ' LEFT JOIN metrics m ON m.entry_id = h.id'
+    query += ' WHERE h.user_id = ?'
+    params = [user_id]
+    # Keyset pagination: seeking on the (user_id, id) index costs the
+    # same however deep the page is, unlike OFFSET
+    if before_id is not None:
+        query += ' AND h.id < ?'
+        params.append(before_id)
+    if entry_ids is not None:
+        query += f' AND h.id IN ({", ".join("?" * len(entry_ids))})'
+        params.extend(entry_ids)
+    query += f' ORDER BY h.id {order}'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return fields, query, params
+
+
+def get_history_from_db(user_id=DEFAULT_USER_ID, render=True, limit=None, before_id=None, fields=ENTRY_FIELDS,
+                        entry_ids=None):
+    """
+    Get history from database, newest first.
+
+    Args:
+        user_id (str): User whose history to get
+        render (bool): Render recommendations, rather than return template ids
+        limit (int): At most this many entries
+        before_id (int): Only entries older than this one, to page through
+            the history by the last id of the previous page
+        fields (tuple): Names from HISTORY_FIELDS to return; "id" is always included
+        entry_ids (list): Only these entries
+
+    Returns:
+        list: History entries as dicts
+    """
+    try:
+        fields, query, params = _history_query(user_id, fields, before_id, entry_ids, limit)
+        cursor = get_connection().cursor()
+        cursor.execute(query, params)
+        return [_entry_from_row(fields, row, render) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Error retrieving history: {str(e)}")
+        return []
+
+
+def iter_history_from_db(user_id=DEFAULT_USER_ID, render=True, fields=ENTRY_FIELDS, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield history entries from database, oldest first.
+
+    Rows are fetched batch_size at a time, so memory stays the same however
+    long the history is.
+
+    Args:
+        user_id (str): User whose history to get
+        render (bool): Render recommendations, rather than return template ids
+        fields (tuple): Names from HISTORY_FIELDS to return; "id" is always included
+        batch_size (int): Rows fetched at a time
+
+    Yields:
+        dict: History entries
+    """
+    fields, query, params = _history_query(user_id, fields, order='ASC')
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _entry_from_row(fields, row, render)
+    except Exception as e:
+        logger.error(f"Error streaming history: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+
+# Columns of the rows read for analytics snapshots
+SNAPSHOT_COLUMNS = ("id", "user_id", "date") + METRIC_COLUMNS + ("fitness_score", "activity_level")
+
+
+def iter_snapshot_batches_from_db(after_id=0, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield the typed metrics of every user's entries after after_id, oldest first.
+
+    Yields:
+        list: Up to batch_size row tuples in SNAPSHOT_COLUMNS order
+    """
+    columns = ", ".join(f"m.{column}" for column in METRIC_COLUMNS)
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute(
+            f'SELECT m.entry_id, m.user_id, m.date, {columns}, m.fitness_score, '
+            "json_extract(h.analysis_results, '$.activity_level') "
+            'FROM metrics m JOIN history h ON h.id = m.entry_id WHERE m.entry_id > ? ORDER BY m.entry_id',
+            (after_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    except Exception as e:
+        logger.error(f"Error reading snapshot rows: {str(e)}")
+        raise
+    finally:
+        cursor.close()
+
+
+def count_history_in_db(user_id=DEFAULT_USER_ID):
+    """Count the history entries of a user"""
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute('SELECT count FROM history_counts WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+    except Exception as e:
+        logger.error(f"Error counting history: {str(e)}")
+        return 0
+
+
+def change_time(value):
+    """
+    Turn an ISO timestamp into the form history_changes.changed_at is stored in.
+
+    changed_at is compared as text, so "2024-03-01 10:00", "...Z" and
+    "...+02:00" must first become UTC "2024-03-01T08:00:00.000". Times
+    without an offset are taken to be UTC.
+
+    Raises:
+        ValueError: If value isn't an ISO timestamp
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    # changed_at keeps milliseconds
+    return parsed.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+
+
+def get_changes_from_db(user_id=DEFAULT_USER_ID, since=0, limit=None):
+    """
+    Get the changes to a user's history after a point in the change log.
+
+    Args:
+        user_id (str): User whose changes to get
+        since (int or str): Change sequence number from a previous call, or
+            an ISO timestamp (UTC) to get the entries changed after it
+        limit (int): At most this many changes
+
+    Returns:
+        list: (seq, entry_id, op) tuples in order, op being "upsert" or
+        "delete", or None on error
+    """
+    try:
+        column = 'seq'
+        if isinstance(since, str):
+            column = 'changed_at'
+            since = change_time(since)
+        query = f'SELECT seq, entry_id, op FROM history_changes WHERE user_id = ? AND {column} > ? ORDER BY seq'
+        params = [user_id, since]
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        cursor = get_connection().cursor()
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Error retrieving history changes: {str(e)}")
+        return None
+
+
+def delete_entry_from_db(entry_id, user_id=DEFAULT_USER_ID):
+    """
+    Delete an entry of a user from database.
+
+    The metrics row goes with it and the user's running aggregates are
+    rebuilt without it. The cohort sketches keep its values: they can't
+    remove one, and one value hardly moves a percentile.
+
+    Returns:
+        bool: True if the entry was deleted, False if the user has no such
+        entry, None on error
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute('DELETE FROM history WHERE id = ? AND user_id = ?', (entry_id, user_id))
+            if not cursor.rowcount:
+                return False
+            rebuild_aggregates(cursor, user_id)
+        return True
+    except Exception as e:
+        logger.error(f"Error deleting entry from database: {str(e)}")
+        return None
+
+
+def find_entry_by_hash_in_db(content_hash, user_id=DEFAULT_USER_ID):
+    """Get the id of the user's entry for an image content hash, or None"""
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute('SELECT id FROM history WHERE user_id = ? AND content_hash = ?', (user_id, content_hash))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Error looking up entry by content hash: {str(e)}")
+        return None
+
+
+# How long the response to an idempotency key is kept, in seconds
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# A request still in progress after this many seconds is taken to have died,
+# and a retry may run it again; twice the gunicorn worker timeout, after
+# which a worker stuck in a request has been killed
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+IDEMPOTENCY_CLAIMED = "claimed"
+IDEMPOTENCY_IN_PROGRESS = "in_progress"
+IDEMPOTENCY_DONE = "done"
+IDEMPOTENCY_MISMATCH = "mismatch"
+
+
+def claim_idempotency_key(key, fingerprint, user_id=DEFAULT_USER_ID):
+    """
+    Claim an idempotency key for a request, or find the request that has it.
+
+    Args:
+        key (str): Idempotency-Key sent by the client
+        fingerprint (str): Hash of the request, to catch a key reused for a
+            different request
+        user_id (str): User making the request
+
+    Returns:
+        tuple: (state, status, response). state is IDEMPOTENCY_CLAIMED when
+        this request should run, IDEMPOTENCY_IN_PROGRESS while another one
+        with the key runs, IDEMPOTENCY_DONE with the stored status and
+        response body once it has finished, and IDEMPOTENCY_MISMATCH if the
+        key was used for a different request.
+    """
+    now = time.time()
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (now - IDEMPOTENCY_TTL,))
+        cursor.execute(
+            'DELETE FROM idempotency_keys WHERE user_id = ? AND key = ? AND state = ? AND created_at < ?',
+            (user_id, key, IDEMPOTENCY_IN_PROGRESS, now - IDEMPOTENCY_LOCK_TIMEOUT)
+        )
+        cursor.execute(
+            'SELECT fingerprint, state, status, response FROM idempotency_keys WHERE user_id = ? AND key = ?',
+            (user_id, key)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(
+                'INSERT INTO idempotency_keys (user_id, key, fingerprint, state, created_at) VALUES (?, ?, ?, ?, ?)',
+                (user_id, key, fingerprint, IDEMPOTENCY_IN_PROGRESS, now)
+            )
+            return IDEMPOTENCY_CLAIMED, None, None
+    stored_fingerprint, state, status, response = row
+    if stored_fingerprint != fingerprint:
+        return IDEMPOTENCY_MISMATCH, None, None
+    return state, status, response
+
+
+def complete_idempotency_key(key, status, response, user_id=DEFAULT_USER_ID):
+    """Store the response of a request that claimed an idempotency key"""
+    with transaction() as cursor:
+        cursor.execute(
+            'UPDATE idempotency_keys SET state = ?, status = ?, response = ? WHERE user_id = ? AND key = ?',
+            (IDEMPOTENCY_DONE, status, response, user_id, key)
+        )
+
+
+def release_idempotency_key(key, user_id=DEFAULT_USER_ID):
+    """Give up a claimed idempotency key, so a retry runs the request again"""
+    with transaction() as cursor:
+        cursor.execute('DELETE FROM idempotency_keys WHERE user_id = ? AND key = ?', (user_id, key))
+
+
+def add_entry_to_db(entry, user_id=DEFAULT_USER_ID):
+    """
+    Add entry to database, updating the aggregates and sketches in the same transaction.
+
+    An entry may carry the "content_hash" of its image. If the user already
+    has an entry for that image, nothing is added and that entry's id is
+    returned.
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute(
+                'INSERT INTO history (date, fitness_data, analysis_results, recommendations, user_id, content_hash) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    entry["date"],
+                    json.dumps(entry["fitness_data"]),
+                    store_payloads(cursor, entry["analysis_results"], ENTRY_ANALYSIS_FIELDS),
+                    store_payloads(cursor, entry["recommendations"]),
+                    user_id,
+                    entry.get("content_hash")
+                )
+            )
+            entry_id = cursor.lastrowid
+            cursor.execute(INSERT_METRICS, metric_row(
+                entry_id, user_id, entry["date"], entry["fitness_data"], entry["analysis_results"].get("fitness_score")
+            ))
+            anomalies = entry["analysis_results"].get("anomalies")
+            update_aggregates(cursor, user_id, entry["date"], entry["fitness_data"], anomalies)
+            update_sketches(cursor, entry["date"], entry["fitness_data"], anomalies)
+        return entry_id
+    except sqlite3.IntegrityError as e:
+        # The same image may have been added by a concurrent request
+        existing_id = find_entry_by_hash_in_db(entry["content_hash"], user_id) if entry.get("content_hash") else None
+        if existing_id is None:
+            logger.error(f"Error adding entry to database: {str(e)}")
+        return existing_id
+    except Exception as e:
+        logger.error(f"Error adding entry to database: {str(e)}")
+        return None
+
+
+def get_entry_from_db(entry_id, user_id=DEFAULT_USER_ID, render=True):
+    """Get an entry of a user from database; None if it belongs to another user"""
+    try:
+        cursor = get_connection().cursor()
+        cursor.execute(
+            'SELECT id, date, fitness_data, analysis_results, recommendations FROM history WHERE id = ? AND user_id = ?',
+            (entry_id, user_id)
+        )
+        row = cursor.fetchone()
+        return _entry_from_row(ENTRY_FIELDS, row, render) if row else None
+    except Exception as e:
+        logger.error(f"Error retrieving entry from database: {str(e)}")
+        return None
@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pytest
+
+from health_analyzer import RULES, analyze_health_metrics, analyze_health_metrics_batch
+
+BATCH_FIELDS = ("activity_level", "calorie_burn", "fitness_score", "overall_fitness")
+
+METRICS = ("steps", "calories", "total_calories", "active_minutes", "distance")
+
+# Values where the bands change, and either side of them
+EDGE_VALUES = sorted({
+    value + delta
+    for name in ("activity_level", "calorie_burn")
+    for edge in RULES.band(name).edges
+    for value, delta in ((edge, -1), (edge, 0), (edge, 1), (edge, -0.5), (edge, 0.5))
+})
+
+
+def random_value(rng, metric):
+    """A value for a metric: usually plausible, sometimes an edge, zero, negative or None"""
+    choice = rng.random()
+    if choice < 0.15:
+        return None
+    if choice < 0.3:
+        return rng.choice(EDGE_VALUES)
+    if choice < 0.4:
+        return rng.choice([0, -1, -250.5])
+    if metric == "distance":
+        return round(rng.uniform(0, 25), 2)
+    if metric == "active_minutes":
+        return rng.randint(0, 300)
+    return rng.choice([rng.randint(0, 30000), round(rng.uniform(0, 30000), 1)])
+
+
+def random_record(rng):
+    """A fitness data dict with a random subset of metrics"""
+    return {metric: random_value(rng, metric) for metric in METRICS if rng.random() < 0.7}
+
+
+def batch_columns(records):
+    """Columns for analyze_health_metrics_batch; metrics a record lacks are None"""
+    columns = {}
+    for metric in METRICS:
+        if any(metric in record for record in records):
+            columns[metric] = [record.get(metric) for record in records]
+    return columns
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_batch_matches_scalar(seed):
+    rng = random.Random(seed)
+    records = [random_record(rng) for _ in range(500)]
+    # Records without any metric can't go into a batch of columns
+    records = [record for record in records if record] or [{"steps": 1}]
+
+    batch = analyze_health_metrics_batch(batch_columns(records))
+
+    for index, record in enumerate(records):
+        expected = analyze_health_metrics(dict(record))
+        for field in BATCH_FIELDS:
+            value = batch[field][index]
+            assert (value.item() if isinstance(value, np.generic) else value) == expected[field], (record, field)
+
+
+def test_batch_dataframe_keeps_index():
+    pd = pytest.importorskip("pandas")
+    records = [{"steps": 12000, "calories": 650}, {"steps": None, "total_calories": 250}, {"distance": 3.2}]
+    frame = pd.DataFrame(batch_columns(records), index=[10, 20, 30])
+
+    batch = analyze_health_metrics_batch(frame)
+
+    assert list(batch.index) == [10, 20, 30]
+    for (_, row), record in zip(batch.iterrows(), records):
+        expected = analyze_health_metrics(dict(record))
+        assert {field: row[field] for field in BATCH_FIELDS} == {field: expected[field] for field in BATCH_FIELDS}
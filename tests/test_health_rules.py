@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from health_rules import DEFAULT_RULES_PATH, RULES, RuleSet
+
+STEP_BANDS = ("fitness_level", "activity_level", "steps_insight", "meditation_steps_bonus",
+              "food_plan_steps", "exercise_plan_steps")
+
+
+def test_step_bands_share_one_scale():
+    for name in STEP_BANDS:
+        assert RULES.band(name).edges == RULES.scales["steps"], name
+
+
+@pytest.mark.parametrize("steps, fitness_level, activity_level", [
+    (2499, "sedentary", "Sedentary"),
+    (7500, "active", "Somewhat Active"),
+    (12499, "active", "Active"),
+    (12500, "very_active", "Very Active"),
+])
+def test_step_levels_agree(steps, fitness_level, activity_level):
+    assert RULES.band("fitness_level").classify(steps) == fitness_level
+    assert RULES.band("activity_level").classify(steps) == activity_level
+
+
+def test_changing_a_scale_moves_every_band():
+    with open(DEFAULT_RULES_PATH, encoding='utf-8') as f:
+        config = json.load(f)
+    config["scales"]["steps"] = [3000, 6000, 9000, 12000, 15000]
+    rules = RuleSet(config)
+
+    assert rules.band("activity_level").classify(14999) == "Active"
+    assert rules.band("fitness_level").classify(15000) == "very_active"
+    assert rules.band("exercise_plan_steps").classify(8999) == "moderate"
+
+
+def test_scale_band_needs_a_label_per_band():
+    config = {"scales": {"steps": [5000]}, "bands": {"level": {"scale": "steps", "labels": ["low"]}},
+              "goals": {}, "meditation": {"base_minutes": 10, "max_minutes": 20}, "fitness_score": {}}
+    with pytest.raises(ValueError):
+        RuleSet(config)
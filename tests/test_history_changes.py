@@ -0,0 +1,57 @@
+import pytest
+
+import storage
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DATABASE_PATH", str(tmp_path / "history.db"))
+    storage.init_db()
+    yield
+    storage.close_connection()
+
+
+def add_entry(changed_at):
+    """Add an entry of the default user and set when its change was logged"""
+    entry_id = storage.add_entry_to_db({
+        "date": "2026-10-19T08:00:00",
+        "fitness_data": {"steps": 8000},
+        "analysis_results": {},
+        "recommendations": {}
+    })
+    with storage.transaction() as cursor:
+        cursor.execute('UPDATE history_changes SET changed_at = ? WHERE entry_id = ?', (changed_at, entry_id))
+    return entry_id
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2026-10-19", "2026-10-19T00:00:00.000"),
+    ("2026-10-19 10:00:00", "2026-10-19T10:00:00.000"),
+    ("2026-10-19T09:00:00Z", "2026-10-19T09:00:00.000"),
+    ("2026-10-19T11:00:00+02:00", "2026-10-19T09:00:00.000"),
+    ("2026-10-19T09:00:00.123456", "2026-10-19T09:00:00.123"),
+])
+def test_change_time_matches_stored_format(value, expected):
+    assert storage.change_time(value) == expected
+
+
+def test_change_time_rejects_garbage():
+    with pytest.raises(ValueError):
+        storage.change_time("yesterday")
+
+
+@pytest.mark.parametrize("since", [
+    "2026-10-19 09:00:00",
+    "2026-10-19T09:00:00Z",
+    "2026-10-19T11:00:00+02:00",
+])
+def test_changes_since_timestamp(database, since):
+    before = add_entry("2026-10-19T08:59:59.999")
+    add_entry("2026-10-19T09:00:00.000")
+    later = add_entry("2026-10-19T09:00:00.500")
+    next_hour = add_entry("2026-10-19T10:00:00.000")
+
+    changes = storage.get_changes_from_db(since=since)
+
+    assert [entry_id for _, entry_id, _ in changes] == [later, next_hour]
+    assert before not in [entry_id for _, entry_id, _ in changes]
@@ -0,0 +1,231 @@
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+from health_rules import RULES
+
+# Metrics tracked by the trend engine
+TREND_METRICS = ["steps", "calories", "total_calories", "distance", "active_minutes"]
+
+# Rolling windows, in days
+SHORT_WINDOW = 7
+LONG_WINDOW = 30
+
+# Day used as the first day of histories that carry no dates
+UNDATED_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def _to_day(date):
+    """Convert an ISO date string or datetime into a numpy day"""
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    return np.datetime64(date.date() if isinstance(date, datetime) else date, "D")
+
+
+class HistoryStore:
+    """
+    Columnar store of fitness history.
+
+    Entries are held as a sorted array of days plus a 2-D float array with one
+    column per metric, NaN where an entry doesn't have the metric, so trends
+    for all metrics can be computed with whole-array operations.
+    """
+
+    def __init__(self, days, values, metrics=None):
+        """
+        Initialize the store
+
+        Args:
+            days (numpy.ndarray): datetime64[D] day of each entry, in order
+            values (numpy.ndarray): Float array of shape (entries, metrics)
+            metrics (list): Metric name of each column
+        """
+        self.days = np.asarray(days, dtype="datetime64[D]")
+        self.values = np.asarray(values, dtype=float).reshape(len(self.days), -1)
+        self.metrics = list(metrics or TREND_METRICS)
+
+    def __len__(self):
+        return len(self.days)
+
+    @classmethod
+    def from_records(cls, records, metrics=None):
+        """
+        Build a store from history entries or plain fitness data dicts.
+
+        Entries with a "date" and "fitness_data" are placed on their day;
+        plain fitness data dicts are taken to be one day apart, in order.
+
+        Args:
+            records (list): History entries or fitness data dicts, oldest first
+            metrics (list): Metrics to keep; defaults to TREND_METRICS
+
+        Returns:
+            HistoryStore: The columnar store
+        """
+        metrics = list(metrics or TREND_METRICS)
+        values = np.full((len(records), len(metrics)), np.nan)
+        days = np.empty(len(records), dtype="datetime64[D]")
+
+        for row, record in enumerate(records):
+            if "fitness_data" in record and "date" in record:
+                days[row] = _to_day(record["date"])
+                data = record["fitness_data"]
+            else:
+                days[row] = UNDATED_EPOCH + row
+                data = record
+            for col, metric in enumerate(metrics):
+                value = data.get(metric)
+                if isinstance(value, (int, float)):
+                    values[row, col] = value
+
+        order = np.argsort(days, kind="stable")
+        return cls(days[order], values[order], metrics)
+
+    def daily(self):
+        """
+        Resample the history onto a calendar of consecutive days.
+
+        When a day has several entries, the latest value of each metric wins.
+
+        Returns:
+            tuple: datetime64[D] array of days and a (days, metrics) float array
+        """
+        if not len(self.days):
+            return self.days, self.values
+
+        offsets = (self.days - self.days[0]).astype(int)
+        calendar = self.days[0] + np.arange(offsets[-1] + 1)
+
+        # Latest row holding each metric, per day with entries
+        rows = np.where(~np.isnan(self.values), np.arange(len(self.values))[:, None], -1)
+        starts = np.flatnonzero(np.r_[True, offsets[1:] != offsets[:-1]])
+        latest = np.maximum.reduceat(rows, starts, axis=0)
+
+        grid = np.full((len(calendar), len(self.metrics)), np.nan)
+        day_index, col = np.nonzero(latest >= 0)
+        grid[offsets[starts][day_index], col] = self.values[latest[day_index, col], col]
+        return calendar, grid
+
+
+def rolling_mean(grid, window):
+    """
+    Trailing mean over the last window days for every day and metric.
+
+    Days without a value are skipped, so the mean is over the days that have one.
+    """
+    valid = ~np.isnan(grid)
+    sums = np.cumsum(np.where(valid, grid, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _window_slope(window):
+    """Least-squares slope per day of each column of a window, ignoring NaNs"""
+    valid = ~np.isnan(window)
+    x = np.arange(len(window), dtype=float)[:, None]
+    n = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = np.where(valid, x, 0.0).sum(axis=0) / n
+        y_mean = np.nansum(window, axis=0) / n
+        dx = np.where(valid, x - x_mean, 0.0)
+        dy = np.where(valid, window - y_mean, 0.0)
+        slope = (dx * dy).sum(axis=0) / (dx * dx).sum(axis=0)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def _streaks(meets):
+    """Current and longest run of consecutive True days for each column"""
+    counts = np.cumsum(meets, axis=0)
+    last_reset = np.maximum.accumulate(np.where(~meets, counts, 0), axis=0)
+    runs = counts - last_reset
+    if not len(runs):
+        zeros = np.zeros(meets.shape[1], dtype=int)
+        return zeros, zeros
+    return runs[-1], runs.max(axis=0)
+
+
+def _as_number(value):
+    """Convert a numpy float to a plain int or float for JSON"""
+    if value is None or np.isnan(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 2)
+
+
+def compute_trends(store):
+    """
+    Compute trends for every metric of a history store in one pass.
+
+    For each metric with at least two values this reports the latest and
+    previous values and their change (like the original get_health_trends),
+    plus 7 and 30 day rolling means and medians, least-squares slopes per day,
+    week-over-week change and current and longest goal streaks.
+
+    Args:
+        store (HistoryStore): The history to analyze
+
+    Returns:
+        dict: Trend analysis keyed by metric
+    """
+    values = store.values
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=0)
+
+    # Latest and previous entry holding each metric
+    rows = np.arange(len(values))[:, None]
+    last = np.where(valid, rows, -1).max(axis=0, initial=-1)
+    previous = np.where(valid & (rows < last), rows, -1).max(axis=0, initial=-1)
+
+    calendar, grid = store.daily()
+    means_short = rolling_mean(grid, SHORT_WINDOW)[-1]
+    means_long = rolling_mean(grid, LONG_WINDOW)[-1]
+    prior_week = grid[-2 * SHORT_WINDOW:-SHORT_WINDOW]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # nanmedian warns about all-NaN columns; those give NaN, which is fine
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            medians_short = np.nanmedian(grid[-SHORT_WINDOW:], axis=0)
+            medians_long = np.nanmedian(grid[-LONG_WINDOW:], axis=0)
+            prior_means = np.nanmean(prior_week, axis=0) if len(prior_week) else np.full(len(store.metrics), np.nan)
+        week_over_week = np.where(prior_means != 0, (means_short - prior_means) / prior_means * 100, np.nan)
+
+    slopes_short = _window_slope(grid[-SHORT_WINDOW:])
+    slopes_long = _window_slope(grid[-LONG_WINDOW:])
+
+    goals = np.array([RULES.goals.get(metric, np.inf) for metric in store.metrics], dtype=float)
+    with np.errstate(invalid="ignore"):
+        current_streaks, longest_streaks = _streaks(grid >= goals)
+
+    trends = {}
+    for col, metric in enumerate(store.metrics):
+        if counts[col] < 2:
+            continue
+
+        current = values[last[col], col]
+        prior = values[previous[col], col]
+        change = current - prior
+        percent_change = (change / prior) * 100 if prior != 0 else 0
+
+        trends[metric] = {
+            "current": _as_number(current),
+            "previous": _as_number(prior),
+            "change": _as_number(change),
+            "percent_change": round(float(percent_change), 2),
+            "direction": "up" if change > 0 else "down" if change < 0 else "stable",
+            "mean_7d": _as_number(means_short[col]),
+            "mean_30d": _as_number(means_long[col]),
+            "median_7d": _as_number(medians_short[col]),
+            "median_30d": _as_number(medians_long[col]),
+            "slope_7d": _as_number(slopes_short[col]),
+            "slope_30d": _as_number(slopes_long[col]),
+            "week_over_week": _as_number(week_over_week[col]),
+            "current_streak": int(current_streaks[col]),
+            "longest_streak": int(longest_streaks[col])
+        }
+
+    return trends
@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Image formats we accept, as reported by PIL from the file header
+ALLOWED_FORMATS = ["PNG", "JPEG"]
+
+# File extensions matching the allowed formats
+ALLOWED_EXTENSIONS = ['.png', '.jpg', '.jpeg']
+
+# Images smaller than this on their longest side rarely have readable text
+MIN_IMAGE_DIMENSION = 200
+
+# Largest image we are willing to decode (a 12000 x 4000 panorama is 48 MP)
+MAX_IMAGE_PIXELS = 50_000_000
+
+# Rejection reasons, used as keys of the rejection counters
+REJECT_EMPTY = "empty"
+REJECT_UNSUPPORTED_FORMAT = "unsupported_format"
+REJECT_UNREADABLE = "unreadable"
+REJECT_TOO_SMALL = "too_small"
+REJECT_DECOMPRESSION_BOMB = "decompression_bomb"
+
+REJECT_MESSAGES = {
+    REJECT_EMPTY: "The uploaded file is empty.",
+    REJECT_UNSUPPORTED_FORMAT: "Unsupported file format. Please use JPG or PNG images",
+    REJECT_UNREADABLE: "Invalid image file. The file could not be read as an image.",
+    REJECT_TOO_SMALL: "Image is too small. Please upload a larger image with clear text.",
+    REJECT_DECOMPRESSION_BOMB: "Image dimensions are too large. Please upload a smaller image.",
+}
+
+_rejection_counts = Counter()
+_rejection_lock = threading.Lock()
+
+
+def _reject(reason, detail=None):
+    """Count a rejection and build the validation result for it"""
+    with _rejection_lock:
+        _rejection_counts[reason] += 1
+    logger.warning(f"Upload rejected ({reason}){': ' + detail if detail else ''}")
+    return {"valid": False, "reason": reason, "message": REJECT_MESSAGES[reason]}
+
+
+def validate_upload(stream, filename=None):
+    """
+    Validate an uploaded image by reading only its header.
+
+    PIL's Image.open parses the header lazily without decoding any pixels, so
+    format, dimensions and decompression-bomb limits can be checked on the
+    in-memory upload before it is written to disk or decoded.
+
+    Args:
+        stream (file-like): Seekable stream holding the uploaded file
+        filename (str): Optional name of the uploaded file to check the extension of
+
+    Returns:
+        dict: ``valid`` flag, and either ``format`` and ``size`` of the image or
+        the rejection ``reason`` and a user facing ``message``. The stream is
+        rewound to the start either way.
+    """
+    try:
+        if filename is not None and not any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS):
+            return _reject(REJECT_UNSUPPORTED_FORMAT, filename)
+
+        stream.seek(0, 2)
+        if stream.tell() == 0:
+            return _reject(REJECT_EMPTY)
+        stream.seek(0)
+
+        try:
+            image = Image.open(stream, formats=ALLOWED_FORMATS)
+        except Image.DecompressionBombError as e:
+            return _reject(REJECT_DECOMPRESSION_BOMB, str(e))
+        except Image.UnidentifiedImageError:
+            return _reject(REJECT_UNSUPPORTED_FORMAT)
+        except Exception as e:
+            return _reject(REJECT_UNREADABLE, str(e))
+
+        width, height = image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            return _reject(REJECT_DECOMPRESSION_BOMB, f"{width}x{height}")
+        if max(width, height) < MIN_IMAGE_DIMENSION:
+            return _reject(REJECT_TOO_SMALL, f"{width}x{height}")
+
+        return {"valid": True, "format": image.format, "size": (width, height)}
+    finally:
+        stream.seek(0)
+
+
+def content_hash(stream, chunk_size=1 << 16):
+    """
+    Return the SHA-256 hex digest of an uploaded file.
+
+    The same image gets the same hash whatever it was named. The stream is
+    read in chunks and rewound to the start afterwards.
+    """
+    digest = hashlib.sha256()
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            digest.update(chunk)
+    finally:
+        stream.seek(0)
+    return digest.hexdigest()
+
+
+def get_rejection_counts():
+    """Return how many uploads were rejected for each reason in this process"""
+    with _rejection_lock:
+        return dict(_rejection_counts)
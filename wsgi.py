@@ -9,7 +9,10 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from run import app
+from run import app, init_db
+
+# Create or migrate the database before serving requests
+init_db()
 
 if __name__ == "__main__":
     app.run()